@@ -0,0 +1,102 @@
+import threading
+from collections import Counter
+
+
+def _rating(row):
+    try:
+        value = float(row.get('Rating'))
+    except (TypeError, ValueError):
+        return None
+    return value if value == value else None
+
+
+class BookingAggregates:
+    """
+    Booking statistics kept up to date from BookingStore change events.
+
+    Each change subtracts the old row's contribution and adds the new
+    one, so reads never touch the bookings themselves. `rebuild` recounts
+    everything from scratch for recovery. `refresh`, if given, is called
+    before each read so changes journalled by other workers are folded in.
+    """
+
+    def __init__(self, refresh=None):
+        self._lock = threading.Lock()
+        self._refresh = refresh or (lambda: None)
+        self._reset()
+
+    def _reset(self):
+        self.total = 0
+        self.attended = 0
+        self.rating_count = 0
+        self.rating_sum = 0.0
+        self.rating_histogram = Counter()
+        self.by_type = Counter()
+        self.by_museum = Counter()
+
+    def _add(self, row, sign):
+        self.total += sign
+        if row.get('Attended') == 'Yes':
+            self.attended += sign
+        rating = _rating(row)
+        if rating is not None:
+            self.rating_count += sign
+            self.rating_sum += sign * rating
+            self.rating_histogram[rating] += sign
+            if self.rating_histogram[rating] <= 0:
+                del self.rating_histogram[rating]
+        for counter, key in ((self.by_type, row.get('MuseumType')), (self.by_museum, row.get('Museum'))):
+            if key:
+                counter[key] += sign
+                if counter[key] <= 0:
+                    del counter[key]
+
+    def apply(self, old, new):
+        with self._lock:
+            if old is not None:
+                self._add(old, -1)
+            if new is not None:
+                self._add(new, +1)
+
+    def rebuild(self, rows):
+        with self._lock:
+            self._reset()
+            for row in rows:
+                self._add(row, +1)
+
+    def booking_stats(self):
+        self._refresh()
+        with self._lock:
+            return {
+                "total_bookings": self.total,
+                "attended_bookings": self.attended,
+                "avg_rating": self.rating_sum / self.rating_count if self.rating_count else 0.0,
+            }
+
+    def rating_counts(self):
+        """[{Rating, Count}] most common first, like value_counts() on the Rating column."""
+        self._refresh()
+        with self._lock:
+            return [{"Rating": r, "Count": n} for r, n in self.rating_histogram.most_common()]
+
+    def top_types(self, n):
+        self._refresh()
+        with self._lock:
+            return [t for t, _ in self.by_type.most_common(n)]
+
+    def top_museums(self, n):
+        self._refresh()
+        with self._lock:
+            return [m for m, _ in self.by_museum.most_common(n)]
+
+    def snapshot(self):
+        self._refresh()
+        with self._lock:
+            return {
+                "total_bookings": self.total,
+                "attended_bookings": self.attended,
+                "rating_count": self.rating_count,
+                "rating_histogram": {str(k): v for k, v in self.rating_histogram.items()},
+                "by_museum_type": dict(self.by_type),
+                "by_museum": dict(self.by_museum),
+            }
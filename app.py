@@ -1,13 +1,10 @@
-from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for, flash, Response, stream_with_context
 import pandas as pd
 import os
-import csv
-from datetime import datetime
-import qrcode
+import json
+from datetime import datetime, timedelta
 import uuid
-from sklearn.preprocessing import LabelEncoder
-import random
-from ml_recommendations import personalized_suggestions, popular_exhibits, nearby_museums
+from ml_recommendations import nearby_museums, nearest_museums, museums_in_bbox, popular_exhibits, similar_museums
 from werkzeug.security import generate_password_hash, check_password_hash
 from bson.objectid import ObjectId
 import smtplib
@@ -30,7 +27,22 @@ except Exception as e:
     print(f"Chatbot initialization failed: {e}")
     CHATBOT_AVAILABLE = False
 
-from db_utils import create_user, verify_user, get_user_by_id, get_db
+from db_utils import create_user, verify_user, get_user_by_id, get_db, on_mongo_up, mongo_status
+from booking_store import BookingStore, BOOKING_COLUMNS
+from catalog import museum_catalog
+from capacity import SlotCapacity, HELD_STATUSES
+from aggregates import BookingAggregates
+from collaborative import ItemItemRecommender
+from popularity import museum_popularity
+from search_index import museum_search
+from catalog_payloads import catalog_payloads
+from outbox import Outbox
+from db_indexes import ensure_indexes
+from pagination import (encode_cursor, decode_cursor, parse_limit, InvalidCursor, cached_count, invalidate_count,
+                        cursor_page, mongo_keyset_page, sequence_page)
+from exports import export_stream, EXPORT_MIMETYPES
+from qr_tickets import render_ticket_qr, ticket_qr_etag, qr_cache_stats, QR_MIMETYPES
+from recommendation_service import recommendations as cached_recommendations, recommendation_cache_stats
 
 
 app = Flask(__name__)
@@ -40,32 +52,33 @@ BOOKING_FILE = "bookings_DBS.csv"
 BOOKING_DB_FILE = "bookingDB"
 MUSEUM_FILE = "final_museums.csv"
 FOREIGN_FILE = "foreign.csv"
-QR_DIR = "static/qrcodes"
-os.makedirs(QR_DIR, exist_ok=True)
 ADMIN_MUSEUMS_FILE = "admin_museums.json"
 
-if not os.path.exists(BOOKING_DB_FILE):
-    with open(BOOKING_DB_FILE, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            'TicketID', 'Museum', 'Date', 'Time', 'People', 'TourType',
-            'VisitorName', 'VisitorEmail', 'VisitorPhone', 'VisitorAge',
-            'SpecialRequests', 'EmergencyContact', 'MuseumType', 'Attended', 'Rating', 'Review'
-        ])
+booking_store = BookingStore(BOOKING_DB_FILE)
+slot_capacity = SlotCapacity(get_db)
+slot_capacity.attach(booking_store)
+booking_aggregates = BookingAggregates(refresh=booking_store.refresh)
+booking_store.subscribe(booking_aggregates)
+booking_recommender = ItemItemRecommender(refresh=booking_store.refresh)
+booking_store.subscribe(booking_recommender)
+museum_popularity.attach(booking_store)
 
-try:
-    museum_df = pd.read_csv(MUSEUM_FILE, on_bad_lines='skip')
-    museum_df.columns = museum_df.columns.str.strip()
-    
-    essential_columns = ['Name', 'City', 'State', 'Type']
-    museum_df = museum_df.dropna(subset=essential_columns)
-    
-    if not museum_df.empty:
-        museum_df['CityEncoded'] = LabelEncoder().fit_transform(museum_df['City'])
-        museum_df['TypeEncoded'] = LabelEncoder().fit_transform(museum_df['Type'])
-except Exception as e:
-    print(f"Error loading museums: {e}")
-    museum_df = pd.DataFrame()
+
+def _outbox_flushed(collections):
+    # Reviews reach Mongo through the outbox; drop the cached total once they land.
+    if "ratings" in collections:
+        invalidate_count('ratings')
+
+
+mongo_outbox = Outbox(f"{BOOKING_DB_FILE}.outbox", get_db, natural_keys={"bookings": "TicketID"},
+                      on_flush=_outbox_flushed)
+mongo_outbox.start()
+on_mongo_up(ensure_indexes)
+# Seats taken while MongoDB was down (or before `slots` existed) only live in the booking store.
+on_mongo_up(slot_capacity.reconcile)
+# Switch the catalog from the CSV to MongoDB (or pick up changes) whenever it (re)connects.
+on_mongo_up(lambda db: museum_catalog.refresh())
+museum_catalog.start()
 
 
 def recommend_museums(query, top_n=5):
@@ -73,30 +86,9 @@ def recommend_museums(query, top_n=5):
     if not q:
         return []
     try:
-        db = get_db()
-        museums_col = db.museums
-        regex = {"$regex": q, "$options": "i"}
-        cursor = museums_col.find(
-            {"$or": [{"Name": regex}, {"City": regex}, {"Type": regex}]},
-            {"_id": 0, "Name": 1, "City": 1, "Type": 1}
-        )
-        results = list(cursor)
-        random.shuffle(results)
-        return results[:top_n]
-    except Exception as e:
-        try:
-            query_lower = q.lower()
-            matches = museum_df[
-                museum_df['Name'].str.lower().str.contains(query_lower) |
-                museum_df['City'].str.lower().str.contains(query_lower) |
-                museum_df['Type'].str.lower().str.contains(query_lower)
-            ]
-            if matches.empty:
-                return []
-            shuffled = matches.sample(frac=1).reset_index(drop=True)
-            return shuffled[['Name', 'City', 'Type']].head(top_n).to_dict(orient='records')
-        except Exception:
-            return []
+        return [{k: m[k] for k in ('Name', 'City', 'Type')} for m in museum_search.search_or_fuzzy(q, top_n)]
+    except Exception:
+        return []
 
 def _load_admin_museums_file():
     try:
@@ -151,6 +143,7 @@ def visitor_login():
         if result['success']:
             session['user_id'] = result['user']['id']
             session['username'] = result['user']['username']
+            session['email'] = result['user']['email']
             flash('Login successful!', 'success')
             return redirect(url_for('visitor_home'))
         else:
@@ -189,15 +182,46 @@ def recommendations():
     lon = payload.get("lon", None)
     radius_km = float(payload.get("radius_km", 25))
 
-    personalized = personalized_suggestions(interests, top_n=10)
-    popular = popular_exhibits(top_n=10)
-    nearby = nearby_museums(float(lat), float(lon), radius_km=radius_km, top_n=12) if lat is not None and lon is not None else []
-
-    return jsonify({
-        "personalized": personalized,
-        "popular": popular,
-        "nearby": nearby
-    })
+    debug = bool(payload.get("debug")) or request.args.get("debug") in ("1", "true")
+
+    return jsonify(cached_recommendations(
+        interests,
+        float(lat) if lat is not None else None,
+        float(lon) if lon is not None else None,
+        radius_km=radius_km,
+        debug=debug
+    ))
+
+
+@app.route('/api/museums/nearby')
+def museums_nearby():
+    """
+    Spatial museum lookup. One of:
+      ?lat=&lon=&radius_km=[&limit=]   museums within a radius, closest first
+      ?lat=&lon=&k=                    the k nearest museums
+      ?bbox=min_lat,min_lon,max_lat,max_lon
+    """
+    try:
+        if request.args.get('bbox'):
+            min_lat, min_lon, max_lat, max_lon = (float(x) for x in request.args['bbox'].split(','))
+            return jsonify(museums_in_bbox(min_lat, min_lon, max_lat, max_lon))
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+        if request.args.get('k'):
+            return jsonify(nearest_museums(lat, lon, k=min(int(request.args['k']), 100)))
+        radius_km = float(request.args.get('radius_km', 25))
+        return jsonify(nearby_museums(lat, lon, radius_km=radius_km, top_n=parse_limit(request.args.get('limit'), 12)))
+    except (KeyError, ValueError):
+        return jsonify({"error": "Provide lat and lon (with radius_km or k), or bbox=min_lat,min_lon,max_lat,max_lon"}), 400
+
+
+@app.route('/api/museums/similar')
+def museums_similar():
+    """'More like this' for ?name=<museum name>[&limit=]."""
+    name = (request.args.get('name') or '').strip()
+    if not name:
+        return jsonify({"error": "Provide name"}), 400
+    return jsonify(similar_museums(name, top_n=parse_limit(request.args.get('limit'), 8)))
 
 
 @app.route('/visitor/museum-recommend')
@@ -307,6 +331,17 @@ def enhanced_museum_search():
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
+@app.route('/api/autocomplete')
+def autocomplete():
+    """
+    Type-ahead museum search: ?q=<partial text>[&limit=]. The last word may
+    be incomplete; typo-tolerant matches fill up a short list.
+    """
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify([])
+    return jsonify(museum_search.search_or_fuzzy(q, parse_limit(request.args.get('limit'), 8, maximum=20)))
+
 @app.route('/api/recommend', methods=['POST'])
 def recommend():
     data = request.get_json()
@@ -365,23 +400,41 @@ def api_contact():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+def _museum_locations(snapshot):
+    df = snapshot.frame.drop(columns=['_id'], errors='ignore')
+    if 'Latitude' not in df.columns or 'Longitude' not in df.columns:
+        return []
+    df = df.assign(Latitude=pd.to_numeric(df['Latitude'], errors='coerce'),
+                   Longitude=pd.to_numeric(df['Longitude'], errors='coerce'))
+    df = df.dropna(subset=['Latitude', 'Longitude'])
+    return _catalog_records(df, list(df.columns))
+
+
+def catalog_response(name, build):
+    """
+    Serve a whole-catalog payload from catalog_payloads: 304 if the client
+    already has this version, otherwise the pre-serialized (and, when
+    accepted, pre-compressed) bytes. Cache-Control: no-cache makes the
+    browser revalidate every time, so a catalog change shows up at once.
+    """
+    payload = catalog_payloads.get(name, build)
+    data, encoding, etag = payload.variant(request.accept_encodings)
+    if any(tag in request.if_none_match for tag in payload.etags()):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(data, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
 @app.route('/api/museum-locations')
 def museum_locations():
     try:
-        df = pd.read_csv('final_museums.csv', on_bad_lines='skip')
-        
-        df = df.dropna(subset=['Latitude', 'Longitude'])
-        
-        df = df[df['Latitude'].astype(str).str.strip() != '']
-        df = df[df['Longitude'].astype(str).str.strip() != '']
-        
-        df['Latitude'] = pd.to_numeric(df['Latitude'], errors='coerce')
-        df['Longitude'] = pd.to_numeric(df['Longitude'], errors='coerce')
-        
-        df = df.dropna(subset=['Latitude', 'Longitude'])
-        
-        museums = df.to_dict(orient='records')
-        return jsonify(museums)
+        return catalog_response('museum-locations', _museum_locations)
     except Exception as e:
         print(f"Error loading museum locations: {e}")
         return jsonify({"error": str(e)}), 500
@@ -393,21 +446,12 @@ def cancel_booking():
     if not ticket_id:
         return jsonify({"error": "Ticket ID is required"}), 400
 
-    if not os.path.exists(BOOKING_DB_FILE):
-        return jsonify({"error": "Booking file not found"}), 404
     try:
-        df = pd.read_csv(BOOKING_DB_FILE)
-        if ticket_id not in df['TicketID'].values:
+        old, new = slot_capacity.set_status(ticket_id, 'Cancelled')
+        if old is None:
             return jsonify({"error": "Booking not found"}), 404
-        df.loc[df['TicketID'] == ticket_id, 'Attended'] = 'Cancelled'
-        df.to_csv(BOOKING_DB_FILE, index=False)
-
-        try:
-            db = get_db()
-            bookings_col = db.bookings
-            bookings_col.update_one({"TicketID": ticket_id}, {"$set": {"Attended": "Cancelled"}})
-        except Exception as e:
-            print(f"Warning: failed to update cancellation in MongoDB: {e}")
+        if new is not None:
+            mongo_outbox.update_one("bookings", {"TicketID": ticket_id}, {"$set": {"Attended": "Cancelled"}})
 
         return jsonify({"message": "Booking cancelled"})
     except Exception as e:
@@ -617,11 +661,42 @@ def admin_bookings():
         return redirect(url_for('admin_login'))
     return render_template('manage_bookings.html')
 
+EXHIBITION_COLUMNS = ['Name', 'City', 'State', 'Type', 'Established', 'Latitude', 'Longitude']
+
+
+def _catalog_records(frame, columns):
+    """Rows of a catalog frame as JSON-safe dicts (NaN becomes None)."""
+    present = [c for c in columns if c in frame.columns]
+    sub = frame[present].astype(object)
+    return sub.where(sub.notna(), None).to_dict(orient='records')
+
+
+# Query parameter -> catalog field for /api/exhibitions filters.
+EXHIBITION_FILTERS = {'city': 'City', 'state': 'State', 'type': 'Type'}
+
+
 @app.route('/api/exhibitions')
 def exhibitions():
-    """Visitor museum list for search/autocomplete - MongoDB-backed."""
+    """
+    Visitor museum list, served from the catalog snapshot.
+
+    Filters: ?city=, ?state=, ?type= (repeat a parameter to OR its values;
+    different parameters AND) and ?q= (name/city/state/type words, last one a
+    prefix). ?cursor=/?limit= returns a cursor page (pagination.cursor_page);
+    otherwise any filter, ?facets=1 or page/per_page gives a page object.
+    ?facets=1 adds live City/State/Type counts for the selection. With none
+    of these the whole list is returned, as before, pre-serialized per
+    catalog version with an ETag (catalog_response).
+    """
     try:
-        paginate = ('page' in request.args) or ('per_page' in request.args)
+        selection = {field: [v for v in request.args.getlist(param) if v]
+                     for param, field in EXHIBITION_FILTERS.items()}
+        selection = {field: values for field, values in selection.items() if values}
+        q = (request.args.get('q') or '').strip()
+        want_facets = request.args.get('facets') in ('1', 'true')
+        cursor = request.args.get('cursor') or None
+        cursor_mode = cursor is not None or 'limit' in request.args
+        paginate = ('page' in request.args) or ('per_page' in request.args) or selection or q or want_facets or cursor_mode
         try:
             page = int(request.args.get('page', 1))
             per_page = int(request.args.get('per_page', 9))
@@ -630,152 +705,70 @@ def exhibitions():
         page = max(1, page)
         per_page = max(1, min(per_page, 100))
 
-        db = get_db()
-        museums_col = db.museums
-        projection = {"Name": 1, "City": 1, "State": 1, "Type": 1, "Established": 1, "Latitude": 1, "Longitude": 1}
-
-        if paginate:
-            total = museums_col.count_documents({})
-            cursor = museums_col.find({}, projection).skip((page - 1) * per_page).limit(per_page)
-            items = list(cursor)
-            for it in items:
-                it.pop('_id', None)
-                import math
-                for key in ['Latitude', 'Longitude']:
-                    if key in it and isinstance(it[key], float) and math.isnan(it[key]):
-                        it[key] = None
-            total_pages = (total + per_page - 1) // per_page if per_page else 1
-            return jsonify({
-                "items": items,
-                "page": page,
-                "per_page": per_page,
-                "total": total,
-                "total_pages": total_pages,
-                "has_next": page < total_pages,
-                "has_prev": page > 1
-            })
-        else:
-            cursor = museums_col.find({}, projection)
-            items = list(cursor)
-            for it in items:
-                it.pop('_id', None)
-                import math
-                for key in ['Latitude', 'Longitude']:
-                    if key in it and isinstance(it[key], float) and math.isnan(it[key]):
-                        it[key] = None
-            return jsonify(items)
+        if not paginate:
+            return catalog_response('exhibitions', lambda snapshot: _catalog_records(snapshot.frame, EXHIBITION_COLUMNS))
+
+        indexes = museum_search.indexes()
+        frame = indexes.snapshot.frame
+
+        facets = indexes.facets
+        base = facets.bitmap(indexes.search.matches(q)) if q else None
+        bits = facets.select(selection, base)
+        total = facets.count(bits)
+        if cursor_mode:
+            limit = parse_limit(request.args.get('limit'), 9)
+            ids, next_cursor = sequence_page(facets.ids(bits).tolist(), cursor, limit, 'catalog',
+                                             key=lambda i: indexes.keys[i])
+            payload = cursor_page(_catalog_records(frame.iloc[ids], EXHIBITION_COLUMNS), next_cursor, limit, total)
+            if want_facets:
+                payload["facets"] = facets.counts(selection, base)
+            return jsonify(payload)
+        start = (page - 1) * per_page
+        ids = facets.ids(bits)[start:start + per_page]
+        total_pages = (total + per_page - 1) // per_page if per_page else 1
+        payload = {
+            "items": _catalog_records(frame.iloc[ids], EXHIBITION_COLUMNS),
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "total_pages": total_pages,
+            "has_next": page < total_pages,
+            "has_prev": page > 1
+        }
+        if want_facets:
+            payload["facets"] = facets.counts(selection, base)
+        return jsonify(payload)
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        try:
-            paginate = ('page' in request.args) or ('per_page' in request.args)
-            if museum_df.empty:
-                if paginate:
-                    return jsonify({"items": [], "page": 1, "per_page": 9, "total": 0, "total_pages": 0, "has_next": False, "has_prev": False})
-                else:
-                    return jsonify([])
-            required_columns = ['Name', 'City', 'State', 'Type', 'Established', 'Latitude', 'Longitude']
-            df = museum_df[required_columns].dropna(subset=required_columns)
-            if paginate:
-                try:
-                    page = int(request.args.get('page', 1))
-                    per_page = int(request.args.get('per_page', 9))
-                except ValueError:
-                    page, per_page = 1, 9
-                page = max(1, page)
-                per_page = max(1, min(per_page, 100))
-                total = len(df)
-                start = (page - 1) * per_page
-                end = start + per_page
-                items = df.iloc[start:end].to_dict(orient='records')
-                import math
-                for item in items:
-                    for key in ['Latitude', 'Longitude']:
-                        if key in item and isinstance(item[key], float) and math.isnan(item[key]):
-                            item[key] = None
-                total_pages = (total + per_page - 1) // per_page if per_page else 1
-                return jsonify({
-                    "items": items,
-                    "page": page,
-                    "per_page": per_page,
-                    "total": total,
-                    "total_pages": total_pages,
-                    "has_next": page < total_pages,
-                    "has_prev": page > 1
-                })
-            else:
-                items = df.to_dict(orient='records')
-                import math
-                for item in items:
-                    for key in ['Latitude', 'Longitude']:
-                        if key in item and isinstance(item[key], float) and math.isnan(item[key]):
-                            item[key] = None
-                return jsonify(items)
-        except Exception as e2:
-            return jsonify({"error": str(e2)}), 500
+        return jsonify({"error": str(e)}), 500
 
 @app.route('/api/museum-filters')
 def museum_filters():
-    """Unique filters for City and Type - MongoDB-backed."""
+    """Filter values for City, State and Type - from the catalog facet index."""
     try:
-        db = get_db()
-        museums_col = db.museums
-        cities = sorted([c for c in museums_col.distinct('City') if c])
-        types = sorted([t for t in museums_col.distinct('Type') if t])
-        return jsonify({"cities": cities, "types": types})
+        facets = museum_search.indexes().facets
+        return jsonify({
+            "cities": facets.values('City'),
+            "states": facets.values('State'),
+            "types": facets.values('Type'),
+        })
     except Exception as e:
-        try:
-            if museum_df.empty:
-                return jsonify({"cities": [], "types": []})
-            cities = sorted(museum_df['City'].dropna().unique().tolist())
-            types = sorted(museum_df['Type'].dropna().unique().tolist())
-            return jsonify({"cities": cities, "types": types})
-        except Exception as e2:
-            return jsonify({"error": str(e2)}), 500
+        return jsonify({"error": str(e)}), 500
 
 @app.route('/api/admin/analytics')
 def api_admin_analytics():
     if 'admin_id' not in session:
         return jsonify({"error": "Unauthorized"}), 401
 
-    booking_stats = {
-        "total_bookings": 0,
-        "attended_bookings": 0,
-        "avg_rating": 0.0,
-    }
-    try:
-        if os.path.exists(BOOKING_DB_FILE):
-            bdf = pd.read_csv(BOOKING_DB_FILE)
-            if not bdf.empty:
-                booking_stats["total_bookings"] = int(len(bdf))
-                if 'Attended' in bdf.columns:
-                    booking_stats["attended_bookings"] = int((bdf['Attended'] == 'Yes').sum())
-                if 'Rating' in bdf.columns:
-                    ratings = pd.to_numeric(bdf['Rating'], errors='coerce').dropna()
-                    if not ratings.empty:
-                        booking_stats["avg_rating"] = float(ratings.mean())
-    except Exception as e:
-        pass
+    booking_stats = booking_aggregates.booking_stats()
 
+    frame = museum_catalog.snapshot().frame
+    counts = frame['Type'].dropna().value_counts().to_dict()
     museum_stats = {
-        "total_museums": 0,
-        "museums_by_type": {}
+        "total_museums": int(len(frame)),
+        "museums_by_type": {str(k): int(v) for k, v in counts.items() if k}
     }
-    try:
-        try:
-            db = get_db()
-            museums_col = db.museums
-            museum_stats["total_museums"] = museums_col.count_documents({})
-            pipeline = [
-                {"$group": {"_id": "$Type", "count": {"$sum": 1}}}
-            ]
-            type_counts = {doc.get('_id') or 'Unknown': doc.get('count', 0) for doc in museums_col.aggregate(pipeline)}
-            museum_stats["museums_by_type"] = {k: int(v) for k, v in type_counts.items() if k}
-        except Exception:
-            if not museum_df.empty:
-                museum_stats["total_museums"] = int(len(museum_df))
-                counts = museum_df['Type'].dropna().value_counts().to_dict()
-                museum_stats["museums_by_type"] = {str(k): int(v) for k, v in counts.items()}
-    except Exception:
-        pass
 
     return jsonify({
         "booking_stats": booking_stats,
@@ -844,14 +837,151 @@ def api_admin_bookings():
     except Exception:
         pass
 
-    if not os.path.exists(BOOKING_DB_FILE):
-        return jsonify([])
     try:
-        df = pd.read_csv(BOOKING_DB_FILE).fillna("")
+        df = booking_store.dataframe().fillna("")
         return jsonify(df.to_dict(orient='records'))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/health')
+def health():
+    return jsonify({"mongo": mongo_status(), "catalog": museum_catalog.status()})
+
+
+@app.route('/api/admin/cache-stats')
+def admin_cache_stats():
+    if 'admin_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify({"qr": qr_cache_stats(), "recommendations": recommendation_cache_stats(),
+                    "catalog_payloads": catalog_payloads.stats()})
+
+
+RATING_EXPORT_COLUMNS = [
+    'TicketID', 'Museum', 'MuseumType', 'Date', 'Time', 'VisitorName',
+    'VisitorEmail', 'VisitorPhone', 'Rating', 'Review', 'created_at'
+]
+
+
+def _export_filters():
+    """Shared ?start=&end=&museum=&status= filters for the export routes."""
+    filters = {}
+    for key in ('start', 'end'):
+        value = (request.args.get(key) or '').strip()
+        if value:
+            datetime.strptime(value, '%Y-%m-%d')
+            filters[key] = value
+    for key in ('museum', 'status'):
+        value = (request.args.get(key) or '').strip()
+        if value:
+            filters[key] = value
+    return filters
+
+
+def _export_mongo_query(filters):
+    query = {}
+    if 'start' in filters or 'end' in filters:
+        query['Date'] = {}
+        if 'start' in filters:
+            query['Date']['$gte'] = filters['start']
+        if 'end' in filters:
+            query['Date']['$lte'] = filters['end']
+    if 'museum' in filters:
+        query['Museum'] = filters['museum']
+    if 'status' in filters:
+        query['Attended'] = filters['status']
+    return query
+
+
+def _export_row_matches(row, filters):
+    date = str(row.get('Date') or '')
+    return (
+        ('start' not in filters or date >= filters['start'])
+        and ('end' not in filters or date <= filters['end'])
+        and ('museum' not in filters or row.get('Museum') == filters['museum'])
+        and ('status' not in filters or row.get('Attended') == filters['status'])
+    )
+
+
+def _export_response(rows, columns, fmt, name):
+    stream = export_stream(rows, columns, fmt)
+    filename = f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    return Response(
+        stream_with_context(stream),
+        mimetype=EXPORT_MIMETYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@app.route('/api/admin/export/bookings')
+def api_admin_export_bookings():
+    """Stream bookings as ?format=csv|ndjson|parquet, filtered by date range, museum and status."""
+    if 'admin_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({"error": "format must be csv, ndjson or parquet"}), 400
+    try:
+        filters = _export_filters()
+    except ValueError:
+        return jsonify({"error": "start and end must be YYYY-MM-DD"}), 400
+
+    try:
+        db = get_db()
+        rows = db.bookings.find(_export_mongo_query(filters), {"_id": 0}).batch_size(1000)
+    except Exception as e:
+        print(f"MongoDB not available for export, falling back to booking store: {e}")
+        rows = booking_store.iter_rows(lambda r: _export_row_matches(r, filters))
+
+    try:
+        return _export_response(rows, BOOKING_COLUMNS, fmt, "bookings")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route('/api/admin/export/ratings')
+def api_admin_export_ratings():
+    """Stream ratings as ?format=csv|ndjson|parquet, filtered by visit date range and museum."""
+    if 'admin_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({"error": "format must be csv, ndjson or parquet"}), 400
+    try:
+        filters = _export_filters()
+    except ValueError:
+        return jsonify({"error": "start and end must be YYYY-MM-DD"}), 400
+    filters.pop('status', None)
+
+    try:
+        db = get_db()
+        rows = db.ratings.find(_export_mongo_query(filters), {"_id": 0}).sort('created_at', -1).batch_size(1000)
+        return _export_response(rows, RATING_EXPORT_COLUMNS, fmt, "ratings")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Ratings are stored in MongoDB, which is unavailable: {e}"}), 503
+
+@app.route('/api/admin/aggregates', methods=['GET'])
+def api_admin_aggregates():
+    if 'admin_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(booking_aggregates.snapshot())
+
+@app.route('/api/admin/aggregates/rebuild', methods=['POST'])
+def api_admin_rebuild_aggregates():
+    """Recount every booking aggregate from the booking store."""
+    if 'admin_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    booking_aggregates.rebuild(booking_store.rows())
+    return jsonify(booking_aggregates.snapshot())
+
+@app.route('/api/admin/outbox')
+def api_admin_outbox():
+    """Backlog of booking writes still waiting to reach MongoDB."""
+    if 'admin_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(mongo_outbox.status())
+
 @app.route('/api/admin/bookings/<ticket_id>/status', methods=['POST'])
 def api_admin_update_booking_status(ticket_id):
     if 'admin_id' not in session:
@@ -863,179 +993,328 @@ def api_admin_update_booking_status(ticket_id):
     if status not in allowed:
         return jsonify({"error": "Invalid status. Use Yes, No, or Cancelled."}), 400
 
-    if not os.path.exists(BOOKING_DB_FILE):
-        return jsonify({"error": "Booking file not found"}), 404
     try:
-        df = pd.read_csv(BOOKING_DB_FILE)
-        if 'TicketID' not in df.columns:
-            return jsonify({"error": "Invalid booking database format"}), 500
-        if ticket_id not in df['TicketID'].astype(str).values:
+        old, new = slot_capacity.set_status(ticket_id, status)
+        if old is None:
             return jsonify({"error": "Booking not found"}), 404
-        df.loc[df['TicketID'].astype(str) == ticket_id, 'Attended'] = status
-        df.to_csv(BOOKING_DB_FILE, index=False)
-
-        try:
-            db = get_db()
-            bookings_col = db.bookings
-            bookings_col.update_one({"TicketID": ticket_id}, {"$set": {"Attended": status}})
-        except Exception as e:
-            print(f"Warning: failed to update booking status in MongoDB: {e}")
+        if new is not None:
+            mongo_outbox.update_one("bookings", {"TicketID": ticket_id}, {"$set": {"Attended": status}})
 
         return jsonify({"message": "Status updated successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+MAX_BATCH_BOOKINGS = 500
+MAX_AVAILABILITY_DAYS = 92
+
+
+def _booking_from_payload(data, ticket_id=None):
+    return {
+        "TicketID": ticket_id or str(uuid.uuid4())[:8],
+        "Museum": data.get('museum', ''),
+        "Date": data.get('date', ''),
+        "Time": data.get('time', ''),
+        "People": data.get('people', ''),
+        "TourType": data.get('tourType', ''),
+        "VisitorName": data.get('visitorName', ''),
+        "VisitorEmail": data.get('visitorEmail', ''),
+        "VisitorPhone": data.get('visitorPhone', ''),
+        "VisitorAge": data.get('visitorAge', ''),
+        "SpecialRequests": data.get('specialRequests', ''),
+        "EmergencyContact": data.get('emergencyContact', ''),
+        "MuseumType": data.get('type', ''),
+        "Attended": "No",
+        "Rating": "",
+        "Review": ""
+    }
+
+
+# How far ahead a visit can be booked.
+BOOKING_HORIZON_DAYS = int(os.environ.get('BOOKING_HORIZON_DAYS', 365))
+
+
+def _validate_booking(booking):
+    for key in ('Museum', 'Date', 'Time', 'VisitorName', 'VisitorEmail'):
+        if not str(booking.get(key) or '').strip():
+            return f"{key} is required"
+    try:
+        visit = datetime.strptime(str(booking['Date']), '%Y-%m-%d')
+    except ValueError:
+        return "Date must be YYYY-MM-DD"
+    if visit.date() > datetime.now().date() + timedelta(days=BOOKING_HORIZON_DAYS):
+        return f"Date must be within {BOOKING_HORIZON_DAYS} days"
+    try:
+        if int(booking['People']) < 1:
+            return "People must be at least 1"
+    except (TypeError, ValueError):
+        return "People must be a number"
+    return None
+
+
 @app.route('/api/book', methods=['POST'])
 def book_visit():
     data = request.get_json()
 
-    date = data.get('date', '')
-    time = data.get('time', '')
-    people = data.get('people', '')
-    museum_name = data.get('museum', '')
-    tour_type = data.get('tourType', '')
-    visitor_name = data.get('visitorName', '')
-    visitor_email = data.get('visitorEmail', '')
-    visitor_phone = data.get('visitorPhone', '')
-    visitor_age = data.get('visitorAge', '')
-    special_requests = data.get('specialRequests', '')
-    emergency_contact = data.get('emergencyContact', '')
-    museum_type = data.get('type', '')
-
-    ticket_id = str(uuid.uuid4())[:8]
-    qr_data = f"""Ticket ID: {ticket_id}
-Museum: {museum_name}
-Date: {date}
-Time: {time}
-People: {people}
-Tour Type: {tour_type}
-Visitor: {visitor_name}
-Contact: {visitor_email}"""
-    
-    qr_path = os.path.join(QR_DIR, f"{ticket_id}.png")
-    qr = qrcode.make(qr_data)
-    qr.save(qr_path)
-
-    with open(BOOKING_DB_FILE, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            ticket_id, museum_name, date, time, people, tour_type,
-            visitor_name, visitor_email, visitor_phone, visitor_age,
-            special_requests, emergency_contact, museum_type, 'No', '', ''
-        ])
+    booking = _booking_from_payload(data)
+    error = _validate_booking(booking)
+    if error:
+        return jsonify({"error": error}), 400
+    ticket_id = booking['TicketID']
+    museum_name = booking['Museum']
+    date = booking['Date']
+    time = booking['Time']
 
-    try:
-        db = get_db()
-        bookings_col = db.bookings
-        bookings_col.insert_one({
-            "TicketID": ticket_id,
-            "Museum": museum_name,
-            "Date": date,
-            "Time": time,
-            "People": people,
-            "TourType": tour_type,
-            "VisitorName": visitor_name,
-            "VisitorEmail": visitor_email,
-            "VisitorPhone": visitor_phone,
-            "VisitorAge": visitor_age,
-            "SpecialRequests": special_requests,
-            "EmergencyContact": emergency_contact,
-            "MuseumType": museum_type,
-            "Attended": "No",
-            "Rating": "",
-            "Review": ""
-        })
-    except Exception as e:
-        print(f"Warning: failed to insert booking into MongoDB: {e}")
+    if not slot_capacity.reserve(museum_name, date, time, booking['People'], ticket_id):
+        if not data.get('waitlist'):
+            return jsonify({"error": "This time slot is fully booked", "museum": museum_name, "date": date, "time": time}), 409
+        booking['Attended'] = 'Waitlisted'
+
+    booking_store.add(booking)
+    mongo_outbox.insert("bookings", [booking])
+
+    if booking['Attended'] == 'Waitlisted':
+        return jsonify({
+            "message": "This time slot is full. You have been added to the waitlist.",
+            "ticket_id": ticket_id,
+            "status": "Waitlisted",
+            "museum": museum_name,
+            "date": date,
+            "time": time
+        }), 202
 
     return jsonify({
         "message": "Booking confirmed successfully!",
         "ticket_id": ticket_id,
-        "qr_url": f"/{qr_path}",
+        "qr_url": f"/qr/{ticket_id}",
         "museum": museum_name,
         "date": date,
         "time": time
     })
 
+@app.route('/api/book/batch', methods=['POST'])
+def book_visit_batch():
+    """Group reservations: validate all items, then one journal write and one insert_many."""
+    data = request.get_json(silent=True) or {}
+    items = data.get('bookings') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "bookings must be a non-empty list"}), 400
+    if len(items) > MAX_BATCH_BOOKINGS:
+        return jsonify({"error": f"At most {MAX_BATCH_BOOKINGS} bookings per batch"}), 400
+
+    results = []
+    accepted = []
+    seen_ids = set()
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results.append({"index": index, "success": False, "error": "Booking must be an object"})
+            continue
+        booking = _booking_from_payload(item)
+        while booking['TicketID'] in seen_ids:
+            booking['TicketID'] = str(uuid.uuid4())[:8]
+        error = _validate_booking(booking)
+        if error:
+            results.append({"index": index, "success": False, "error": error})
+            continue
+        if not slot_capacity.reserve(booking['Museum'], booking['Date'], booking['Time'], booking['People'],
+                                     booking['TicketID']):
+            if not item.get('waitlist'):
+                results.append({"index": index, "success": False, "error": "This time slot is fully booked"})
+                continue
+            booking['Attended'] = 'Waitlisted'
+        seen_ids.add(booking['TicketID'])
+        accepted.append(booking)
+        results.append({"index": index, "success": True, "ticket_id": booking['TicketID'], "status": booking['Attended']})
+
+    if accepted:
+        booking_store.add_many(accepted)
+        mongo_outbox.insert("bookings", accepted)
+
+        for result in results:
+            if result["success"] and result["status"] != 'Waitlisted':
+                result["qr_url"] = f"/qr/{result['ticket_id']}"
+
+    return jsonify({
+        "message": f"{len(accepted)} of {len(items)} bookings confirmed",
+        "confirmed": len(accepted),
+        "failed": len(items) - len(accepted),
+        "results": results
+    }), 200 if accepted else 400
+
+@app.route('/api/availability')
+def availability():
+    """Remaining seats per slot for one museum: ?museum=&start=YYYY-MM-DD&end=YYYY-MM-DD"""
+    museum_name = (request.args.get('museum') or '').strip()
+    if not museum_name:
+        return jsonify({"error": "museum is required"}), 400
+    try:
+        start = datetime.strptime(request.args.get('start') or datetime.now().strftime('%Y-%m-%d'), '%Y-%m-%d')
+        end = datetime.strptime(request.args.get('end'), '%Y-%m-%d') if request.args.get('end') else start + timedelta(days=6)
+    except ValueError:
+        return jsonify({"error": "start and end must be YYYY-MM-DD"}), 400
+    if end < start or (end - start).days > MAX_AVAILABILITY_DAYS:
+        return jsonify({"error": f"Date range must be 0-{MAX_AVAILABILITY_DAYS} days"}), 400
+
+    slots = slot_capacity.availability(museum_name, start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))
+    return jsonify({
+        "museum": museum_name,
+        "capacity": slot_capacity.capacity,
+        "slots": slots
+    })
+
+@app.route('/qr/<ticket_id>')
+def ticket_qr(ticket_id):
+    """Render a ticket's QR code on demand (?format=svg for vector output)."""
+    fmt = request.args.get('format', 'png').lower()
+    if fmt not in QR_MIMETYPES:
+        return jsonify({"error": "format must be png or svg"}), 400
+    booking = booking_store.get(ticket_id)
+    if booking is None:
+        return jsonify({"error": "Booking not found"}), 404
+    if booking.get('Attended') not in HELD_STATUSES:
+        # Waitlisted and cancelled bookings have no valid ticket.
+        return jsonify({"error": f"No ticket for a {booking.get('Attended', '').lower()} booking"}), 409
+
+    etag = ticket_qr_etag(booking, fmt)
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        data, etag = render_ticket_qr(booking, fmt)
+        response = app.response_class(data, mimetype=QR_MIMETYPES[fmt])
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
 @app.route('/api/attend', methods=['POST'])
 def attend_tour():
     data = request.get_json()
     date = data.get('date', '')
     time = data.get('time', '')
 
-    if os.path.exists(BOOKING_DB_FILE):
-        df = pd.read_csv(BOOKING_DB_FILE)
-        mask = (df['Date'] == date) & (df['Time'] == time)
-        if mask.any():
-            df.loc[mask, 'Attended'] = 'Yes'
-            df.to_csv(BOOKING_DB_FILE, index=False)
-            try:
-                db = get_db()
-                bookings_col = db.bookings
-                bookings_col.update_many({"Date": date, "Time": time}, {"$set": {"Attended": "Yes"}})
-            except Exception as e:
-                print(f"Warning: failed to mark attended in MongoDB: {e}")
-            return jsonify({"message": "Tour marked as attended!"})
-    
+    matched, changed = slot_capacity.attend(date, time)
+    for ticket_id in changed:
+        mongo_outbox.update_one("bookings", {"TicketID": ticket_id}, {"$set": {"Attended": "Yes"}})
+    if matched:
+        return jsonify({"message": "Tour marked as attended!"})
+
     return jsonify({"message": "No matching booking found"})
 
+HISTORY_PAGE_SIZE = 50
+
+
+def _session_user_email():
+    if 'user_id' not in session:
+        return None
+    if not session.get('email'):
+        user = get_user_by_id(session['user_id'])
+        session['email'] = user['email'] if user else ''
+    return session['email'] or None
+
+
+def _history_page(email, cursor, limit):
+    """
+    One page of a visitor's bookings as `(items, next_cursor)`.
+
+    Served from the booking store's per-email index rather than MongoDB:
+    bookings reach Mongo later, through the outbox, and the store has them
+    at once. A `limit` of None returns everything from the cursor on.
+    """
+    start = 0
+    if cursor:
+        start = decode_cursor(cursor, 'history').get('k')
+        if not isinstance(start, int) or start < 0:
+            raise InvalidCursor("Invalid cursor")
+    items = booking_store.for_email(email, start, limit)
+    has_more = bool(limit) and len(items) == limit
+    return items, encode_cursor({"s": "history", "k": start + len(items)}) if has_more else None
+
+
 @app.route('/api/history')
 def get_history():
-    try:
-        db = get_db()
-        bookings_col = db.bookings
-        docs = list(bookings_col.find({}, {"_id": 0}))
-        if docs:
-            for d in docs:
-                for k, v in list(d.items()):
-                    if v is None:
-                        d[k] = ""
-        return jsonify(docs)
-    except Exception as e:
-        print(f"MongoDB not available for history, falling back to CSV: {e}")
+    """
+    The logged-in visitor's bookings.
+
+    Without paging arguments this returns the full list, as before. With
+    ?limit= and/or ?cursor= it returns {"items", "next_cursor"}.
+    ?format=ndjson streams one booking per line instead.
+    """
+    email = _session_user_email()
+    if not email:
+        return jsonify({"error": "Not logged in"}), 401
+
+    cursor = request.args.get('cursor') or None
+    paged = 'limit' in request.args or cursor is not None
+    limit = parse_limit(request.args.get('limit'), HISTORY_PAGE_SIZE) if paged else None
+    ndjson = (request.args.get('format') == 'ndjson'
+              or request.accept_mimetypes.best == 'application/x-ndjson')
 
-    booking_file_to_use = BOOKING_DB_FILE if os.path.exists(BOOKING_DB_FILE) else BOOKING_FILE
-    if not os.path.exists(booking_file_to_use):
-        return jsonify([])
     try:
-        df = pd.read_csv(booking_file_to_use)
-        df = df.fillna("")
-        return jsonify(df.to_dict(orient='records'))
+        if ndjson:
+            def generate():
+                page_cursor = cursor
+                remaining = limit
+                while True:
+                    items, page_cursor = _history_page(email, page_cursor, min(remaining or HISTORY_PAGE_SIZE, HISTORY_PAGE_SIZE))
+                    for item in items:
+                        yield json.dumps(item, default=str) + "\n"
+                    if remaining is not None:
+                        remaining -= len(items)
+                    if not page_cursor or remaining == 0:
+                        break
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+        items, next_cursor = _history_page(email, cursor, limit)
+        if not paged:
+            return jsonify(items)
+        return jsonify({"items": items, "next_cursor": next_cursor})
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        return jsonify({"error": str(e)})
+        return jsonify({"error": str(e)}), 500
 
 
 @app.route('/api/personalized-recommendations')
 def personalized_recommendations():
+    """
+    Museums for the signed-in visitor from the item-item recommender,
+    topped up with museums of the most-booked types (also the fallback for
+    anonymous or brand-new visitors).
+    """
+    snapshot = museum_catalog.snapshot()
+    museum_df = snapshot.frame
+    columns = ['Name', 'City', 'Type', 'State']
     try:
-        booking_df = pd.read_csv(BOOKING_DB_FILE)
+        items = []
+        email = _session_user_email()
+        if email:
+            for name, _ in booking_recommender.recommend(email, 10):
+                record = snapshot.by_name.get(name)
+                if record is not None:
+                    items.append({c: record.get(c) for c in columns})
+        if len(items) >= 10:
+            return jsonify(items)
 
-        if booking_df.empty or 'MuseumType' not in booking_df.columns:
-            default_recommendations = museum_df.head(10)
-            return jsonify(default_recommendations[['Name', 'City', 'Type', 'State']].to_dict(orient='records'))
+        top_types = booking_aggregates.top_types(3)
 
-        if booking_df['MuseumType'].isnull().all():
+        if not top_types:
             default_recommendations = museum_df.head(10)
-            return jsonify(default_recommendations[['Name', 'City', 'Type', 'State']].to_dict(orient='records'))
-
-        top_types = booking_df['MuseumType'].dropna().value_counts().head(3).index.tolist()
-
-        recommendations = museum_df[museum_df['Type'].isin(top_types)].dropna()
-
-        if len(recommendations) < 10:
+            fill = default_recommendations[columns].to_dict(orient='records')
+        else:
+            recommendations = museum_df[museum_df['Type'].isin(top_types)]
 
-            if 'Museum' in booking_df.columns:
-                popular_museums = booking_df['Museum'].value_counts().head(5).index.tolist()
+            if len(recommendations) < 10:
+                popular_museums = booking_aggregates.top_museums(5)
                 popular_museum_data = museum_df[museum_df['Name'].isin(popular_museums)]
                 recommendations = pd.concat([recommendations, popular_museum_data]).drop_duplicates()
 
-        recommendations = recommendations.head(10)
-        
-        return jsonify(recommendations[['Name', 'City', 'Type', 'State']].to_dict(orient='records'))
+            fill = recommendations[columns].head(10).to_dict(orient='records')
+
+        seen = {item['Name'] for item in items}
+        items.extend(item for item in fill if item['Name'] not in seen)
+        return jsonify(items[:10])
     except Exception as e:
         try:
             default_recommendations = museum_df.head(10)
-            return jsonify(default_recommendations[['Name', 'City', 'Type', 'State']].to_dict(orient='records'))
+            return jsonify(default_recommendations[columns].to_dict(orient='records'))
         except:
             return jsonify([])
 
@@ -1050,63 +1329,50 @@ def submit_review():
   if not ticket_id or not rating:
     return jsonify({"error": "Ticket ID and rating are required"}), 400
 
-  if not os.path.exists(BOOKING_DB_FILE):
-    return jsonify({"error": "Booking file not found"}), 404
   try:
-    df = pd.read_csv(BOOKING_DB_FILE)
-    if ticket_id not in df['TicketID'].values:
+    row = booking_store.update(ticket_id, {'Rating': rating, 'Review': review})
+    if row is None:
       return jsonify({"error": "Booking not found"}), 404
-    df.loc[df['TicketID'] == ticket_id, 'Rating'] = rating
-    df.loc[df['TicketID'] == ticket_id, 'Review'] = review
-    df.to_csv(BOOKING_DB_FILE, index=False)
-    try:
-      db = get_db()
-      bookings_col = db.bookings
-      bookings_col.update_one({"TicketID": ticket_id}, {"$set": {"Rating": rating, "Review": review}})
-      try:
-        ratings_col = db.ratings
-        bdoc = bookings_col.find_one({"TicketID": ticket_id})
-        if not bdoc:
-          row = df[df['TicketID'] == ticket_id].iloc[0].to_dict()
-          bdoc = {
-            "TicketID": row.get('TicketID', ticket_id),
-            "Museum": row.get('Museum', ''),
-            "Date": row.get('Date', ''),
-            "Time": row.get('Time', ''),
-            "VisitorName": row.get('VisitorName', ''),
-            "VisitorEmail": row.get('VisitorEmail', ''),
-            "VisitorPhone": row.get('VisitorPhone', ''),
-            "MuseumType": row.get('MuseumType', '')
-          }
-        doc = {
-          "TicketID": ticket_id,
-          "Museum": bdoc.get('Museum', ''),
-          "MuseumType": bdoc.get('MuseumType', ''),
-          "Date": bdoc.get('Date', ''),
-          "Time": bdoc.get('Time', ''),
-          "VisitorName": bdoc.get('VisitorName', ''),
-          "VisitorEmail": bdoc.get('VisitorEmail', ''),
-          "VisitorPhone": bdoc.get('VisitorPhone', ''),
-          "Rating": int(rating) if str(rating).isdigit() else rating,
-          "Review": review,
-          "created_at": datetime.utcnow()
-        }
-        ratings_col.insert_one(doc)
-      except Exception as e:
-        print(f"Warning: failed to insert into ratings collection: {e}")
-    except Exception as e:
-      print(f"Warning: failed to update review in MongoDB: {e}")
+    mongo_outbox.update_one("bookings", {"TicketID": ticket_id}, {"$set": {"Rating": rating, "Review": review}})
+    mongo_outbox.insert("ratings", [{
+      "TicketID": ticket_id,
+      "Museum": row.get('Museum', ''),
+      "MuseumType": row.get('MuseumType', ''),
+      "Date": row.get('Date', ''),
+      "Time": row.get('Time', ''),
+      "VisitorName": row.get('VisitorName', ''),
+      "VisitorEmail": row.get('VisitorEmail', ''),
+      "VisitorPhone": row.get('VisitorPhone', ''),
+      "Rating": int(rating) if str(rating).isdigit() else rating,
+      "Review": review,
+      "created_at": datetime.utcnow()
+    }])
+    invalidate_count('ratings')
     return jsonify({"message": "Review submitted successfully"})
   except Exception as e:
     return jsonify({"error": str(e)}), 500
 
 @app.route('/api/admin/ratings', methods=['GET'])
 def admin_ratings():
+  """
+  Ratings, newest first. ?cursor=/?limit= returns a cursor page
+  (pagination.cursor_page); ?page=/?per_page= and no arguments keep the
+  older page-object and full-list responses.
+  """
   if 'admin_id' not in session:
     return jsonify({"error": "Unauthorized"}), 401
   try:
     db = get_db()
     ratings_col = db.ratings
+    cursor = request.args.get('cursor') or None
+    if cursor is not None or 'limit' in request.args:
+      limit = parse_limit(request.args.get('limit'), 10)
+      docs, next_cursor = mongo_keyset_page(ratings_col, {}, {"_id": 0}, 'created_at', cursor, limit, 'ratings')
+      for d in docs:
+        d.pop('_id', None)
+      total = cached_count('ratings', ratings_col.estimated_document_count)
+      return jsonify(cursor_page(docs, next_cursor, limit, total))
+
     paginate = ('page' in request.args) or ('per_page' in request.args)
     try:
       page = int(request.args.get('page', 1))
@@ -1118,7 +1384,7 @@ def admin_ratings():
 
     projection = {"_id": 0}
     if paginate:
-      total = ratings_col.count_documents({})
+      total = cached_count('ratings', ratings_col.estimated_document_count)
       cursor = ratings_col.find({}, projection).sort('created_at', -1).skip((page - 1) * per_page).limit(per_page)
       docs = list(cursor)
       total_pages = (total + per_page - 1) // per_page if per_page else 1
@@ -1134,6 +1400,8 @@ def admin_ratings():
     else:
       docs = list(ratings_col.find({}, projection).sort('created_at', -1))
       return jsonify(docs)
+  except InvalidCursor as e:
+    return jsonify({"error": str(e)}), 400
   except Exception as e:
     return jsonify({"error": str(e)}), 500
 
@@ -1145,32 +1413,29 @@ def admin_ratings_page():
 
 @app.route('/api/popular')
 def get_popular():
-    booking_file_to_use = BOOKING_DB_FILE if os.path.exists(BOOKING_DB_FILE) else BOOKING_FILE
-    
-    if not os.path.exists(booking_file_to_use):
-        return jsonify([])
     try:
-        df = pd.read_csv(booking_file_to_use)
-        if 'Rating' not in df.columns:
-            return jsonify([])
-        rating_counts = df['Rating'].value_counts().reset_index()
-        rating_counts.columns = ['Rating', 'Count']
-        return jsonify(rating_counts.to_dict(orient='records'))
+        return jsonify(booking_aggregates.rating_counts())
     except Exception as e:
         return jsonify({"error": str(e)})
 
+@app.route('/api/popular-museums')
+def popular_museums():
+    """Trending museums by time-decayed bookings; ?state= or ?type= narrows the ranking."""
+    try:
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+        return jsonify(popular_exhibits(limit, state=request.args.get('state') or None,
+                                        museum_type=request.args.get('type') or None))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/personalized')
 def personalized():
-    booking_file_to_use = BOOKING_DB_FILE if os.path.exists(BOOKING_DB_FILE) else BOOKING_FILE
-    
-    if not os.path.exists(booking_file_to_use):
-        return jsonify([])
     try:
-        df = pd.read_csv(booking_file_to_use)
-        if 'MuseumType' not in df.columns or df['MuseumType'].isnull().all():
+        top_types = booking_aggregates.top_types(2)
+        if not top_types:
             return jsonify([])
-        top_types = df['MuseumType'].dropna().value_counts().head(2).index.tolist()
-        suggestions = museum_df[museum_df['Type'].isin(top_types)].dropna().head(5)
+        museum_df = museum_catalog.snapshot().frame
+        suggestions = museum_df[museum_df['Type'].isin(top_types)].head(5)
         return jsonify(suggestions[['Name', 'City', 'Type']].to_dict(orient='records'))
     except Exception as e:
         return jsonify({"error": str(e)})
@@ -1225,12 +1490,8 @@ def foreign_visitors_monthly():
 
 @app.route('/api/admin/bookings_legacy')
 def admin_bookings_api_legacy():
-    booking_file_to_use = BOOKING_DB_FILE if os.path.exists(BOOKING_DB_FILE) else BOOKING_FILE
-    
-    if not os.path.exists(booking_file_to_use):
-        return jsonify([])
     try:
-        df = pd.read_csv(booking_file_to_use)
+        df = booking_store.dataframe()
         return jsonify(df.to_dict(orient='records'))
     except Exception as e:
         return jsonify({"error": str(e)})
@@ -1239,17 +1500,10 @@ def admin_bookings_api_legacy():
 def admin_analytics_legacy():
     try:
         booking_stats = {}
-        booking_file_to_use = BOOKING_DB_FILE if os.path.exists(BOOKING_DB_FILE) else BOOKING_FILE
-        
-        if os.path.exists(booking_file_to_use):
-            df = pd.read_csv(booking_file_to_use)
-            booking_stats = {
-                'total_bookings': len(df),
-                'attended_bookings': len(df[df['Attended'] == 'Yes']) if 'Attended' in df.columns else 0,
-                'avg_rating': df['Rating'].mean() if 'Rating' in df.columns else 0
-            }
+        booking_stats = booking_aggregates.booking_stats()
 
         museum_stats = {}
+        museum_df = museum_catalog.snapshot().frame
         if not museum_df.empty:
             museum_stats = {
                 'total_museums': len(museum_df),
@@ -1263,26 +1517,43 @@ def admin_analytics_legacy():
     except Exception as e:
         return jsonify({"error": str(e)})
 
+ADMIN_MUSEUM_PROJECTION = {"Name": 1, "City": 1, "State": 1, "Type": 1, "Established": 1, "Latitude": 1, "Longitude": 1}
+
+
 @app.route('/api/admin/museums', methods=['GET'])
 def list_museums():
+    """
+    Museums for the admin list, newest first. ?cursor=/?limit= returns a
+    cursor page (pagination.cursor_page), from MongoDB or from the JSON
+    fallback file; ?page=/?per_page= and no arguments keep the older
+    responses.
+    """
     if 'admin_id' not in session:
         return jsonify({"error": "Unauthorized"}), 401
+    cursor = request.args.get('cursor') or None
+    cursor_mode = cursor is not None or 'limit' in request.args
+    limit = parse_limit(request.args.get('limit'), 10)
+    paginate = ('page' in request.args) or ('per_page' in request.args)
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 10))
+    except ValueError:
+        page, per_page = 1, 10
+    page = max(1, page)
+    per_page = max(1, min(per_page, 100))
+
     try:
         db = get_db()
         museums_col = db.museums
-        paginate = ('page' in request.args) or ('per_page' in request.args)
-        try:
-            page = int(request.args.get('page', 1))
-            per_page = int(request.args.get('per_page', 10))
-        except ValueError:
-            page, per_page = 1, 10
-        page = max(1, page)
-        per_page = max(1, min(per_page, 100))
-
-        projection = {"Name": 1, "City": 1, "State": 1, "Type": 1, "Established": 1, "Latitude": 1, "Longitude": 1}
+        if cursor_mode:
+            docs, next_cursor = mongo_keyset_page(museums_col, {}, ADMIN_MUSEUM_PROJECTION, '_id', cursor, limit, 'museums')
+            for d in docs:
+                d['id'] = str(d.pop('_id'))
+            total = cached_count('museums', museums_col.estimated_document_count)
+            return jsonify(cursor_page(docs, next_cursor, limit, total))
         if paginate:
-            total = museums_col.count_documents({})
-            cursor = museums_col.find({}, projection).sort('_id', -1).skip((page - 1) * per_page).limit(per_page)
+            total = cached_count('museums', museums_col.estimated_document_count)
+            cursor = museums_col.find({}, ADMIN_MUSEUM_PROJECTION).sort('_id', -1).skip((page - 1) * per_page).limit(per_page)
             docs = list(cursor)
             for d in docs:
                 d['id'] = str(d.pop('_id'))
@@ -1297,23 +1568,19 @@ def list_museums():
                 "has_prev": page > 1
             })
         else:
-            docs = list(museums_col.find({}, projection).sort('_id', -1))
+            docs = list(museums_col.find({}, ADMIN_MUSEUM_PROJECTION).sort('_id', -1))
             for d in docs:
                 d['id'] = str(d.pop('_id'))
             return jsonify(docs)
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         try:
-            paginate = ('page' in request.args) or ('per_page' in request.args)
-            try:
-                page = int(request.args.get('page', 1))
-                per_page = int(request.args.get('per_page', 10))
-            except ValueError:
-                page, per_page = 1, 10
-            page = max(1, page)
-            per_page = max(1, min(per_page, 100))
-
             items = _load_admin_museums_file()
             items = list(reversed(items))
+            if cursor_mode:
+                page_items, next_cursor = sequence_page(items, cursor, limit, 'museums-file', key=lambda m: m.get('id'))
+                return jsonify(cursor_page(page_items, next_cursor, limit, len(items)))
             if paginate:
                 total = len(items)
                 start = (page - 1) * per_page
@@ -1331,9 +1598,29 @@ def list_museums():
                 })
             else:
                 return jsonify(items)
+        except InvalidCursor as e2:
+            return jsonify({"error": str(e2)}), 400
         except Exception as e2:
             return jsonify({"error": str(e2)}), 500
 
+
+def _notify_catalog(change, *args):
+    """
+    Pass an admin write that MongoDB has already accepted on to the
+    catalog. Catalog listeners rebuild search and recommendation indexes;
+    if that fails the write must not be retried against the JSON fallback,
+    so fall back to a full catalog reload instead.
+    """
+    try:
+        change(*args)
+    except Exception as e:
+        print(f"Warning: museum saved but the catalog update failed, reloading it: {e}")
+        try:
+            museum_catalog.refresh()
+        except Exception as e2:
+            print(f"Warning: catalog reload failed: {e2}")
+
+
 @app.route('/api/admin/museums', methods=['POST'])
 def create_museum():
     if 'admin_id' not in session:
@@ -1362,9 +1649,6 @@ def create_museum():
         db = get_db()
         museums_col = db.museums
         res = museums_col.insert_one(doc)
-        doc.pop('_id', None)
-        response_doc = {**doc, 'id': str(res.inserted_id)}
-        return jsonify(response_doc), 201
     except Exception as e:
         try:
             from uuid import uuid4
@@ -1375,6 +1659,11 @@ def create_museum():
             return jsonify(new_doc), 201
         except Exception as e2:
             return jsonify({"error": str(e2)}), 500
+    invalidate_count('museums')
+    _notify_catalog(museum_catalog.upsert, res.inserted_id, doc)
+    doc.pop('_id', None)
+    response_doc = {**doc, 'id': str(res.inserted_id)}
+    return jsonify(response_doc), 201
 
 @app.route('/api/admin/museums/<mid>', methods=['PUT'])
 def update_museum(mid):
@@ -1405,8 +1694,6 @@ def update_museum(mid):
         if result.matched_count == 0:
             return jsonify({"error": "Not found"}), 404
         doc = museums_col.find_one({"_id": ObjectId(mid)})
-        doc['id'] = str(doc.pop('_id'))
-        return jsonify(doc)
     except Exception as e:
         try:
             items = _load_admin_museums_file()
@@ -1418,6 +1705,9 @@ def update_museum(mid):
             return jsonify(items[idx])
         except Exception as e2:
             return jsonify({"error": str(e2)}), 500
+    _notify_catalog(museum_catalog.upsert, mid, doc)
+    doc['id'] = str(doc.pop('_id'))
+    return jsonify(doc)
 
 @app.route('/api/admin/museums/<mid>', methods=['DELETE'])
 def delete_museum(mid):
@@ -1429,7 +1719,6 @@ def delete_museum(mid):
         result = museums_col.delete_one({"_id": ObjectId(mid)})
         if result.deleted_count == 0:
             return jsonify({"error": "Not found"}), 404
-        return jsonify({"message": "Deleted"})
     except Exception as e:
         try:
             items = _load_admin_museums_file()
@@ -1440,6 +1729,9 @@ def delete_museum(mid):
             return jsonify({"message": "Deleted"})
         except Exception as e2:
             return jsonify({"error": str(e2)}), 500
+    invalidate_count('museums')
+    _notify_catalog(museum_catalog.remove, mid)
+    return jsonify({"message": "Deleted"})
 
 if __name__ == '__main__':
     app.run(debug=True)
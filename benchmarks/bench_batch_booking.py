@@ -0,0 +1,61 @@
+"""
+Throughput of POST /api/book/batch versus N sequential POST /api/book calls.
+
+Run from the project root with MongoDB up:
+
+    python benchmarks/bench_batch_booking.py --n 200
+
+Bookings go to a throwaway booking store, not to bookingDB.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as museum_app
+from booking_store import BookingStore
+
+
+def _payload(i):
+    return {
+        "museum": "Salar Jung Museum",
+        "date": "2030-01-15",
+        "time": "11:00",
+        "people": 2,
+        "tourType": "group",
+        "visitorName": f"Student {i}",
+        "visitorEmail": f"student{i}@school.example",
+        "type": "Art",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=200, help="bookings per run")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_booking_")
+    museum_app.booking_store = BookingStore(os.path.join(tmp, "bookingDB"), fsync=True)
+    client = museum_app.app.test_client()
+
+    start = time.perf_counter()
+    for i in range(args.n):
+        client.post("/api/book", json=_payload(i))
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    resp = client.post("/api/book/batch", json={"bookings": [_payload(i) for i in range(args.n)]})
+    batch = time.perf_counter() - start
+    confirmed = resp.get_json().get("confirmed")
+
+    print(f"bookings:   {args.n} (batch confirmed {confirmed})")
+    print(f"sequential: {sequential:.3f}s  {args.n / sequential:8.1f} bookings/s")
+    print(f"batch:      {batch:.3f}s  {args.n / batch:8.1f} bookings/s")
+    print(f"speedup:    {sequential / batch:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+TrigramIndex recall and latency on misspelt museum names, against an
+exhaustive edit-distance scan, at several catalog sizes.
+
+Names are synthetic (real catalog words recombined), and each query is a
+catalog name with typos: a dropped, doubled, swapped or substituted
+letter, or a missing space.
+
+    python benchmarks/bench_fuzzy.py
+    python benchmarks/bench_fuzzy.py --sizes 10000 100000 --queries 300
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fuzzy_index import TrigramIndex, compact, default_max_edits, infix_distance
+
+WORDS = (
+    "salar jung victoria memorial indian national gallery modern art chhatrapati shivaji "
+    "maharaj vastu sangrahalaya calico textile government archaeological maritime railway "
+    "heritage tribal folk crafts science city palace fort royal regional state central "
+    "kolkata mumbai chennai delhi hyderabad jaipur lucknow bhopal mysore pune goa kochi "
+    "ahmedabad patna guwahati shillong madurai thanjavur hampi khajuraho sanchi sarnath"
+).split()
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def make_names(n, rng):
+    names = set()
+    while len(names) < n:
+        words = rng.sample(WORDS, rng.randint(2, 4))
+        words.append(rng.choice(["museum", "gallery", "museum", "sangrahalaya"]))
+        names.add(" ".join(words).title() + ("" if rng.random() < 0.7 else f" {rng.randint(2, 99)}"))
+    return sorted(names)
+
+
+def misspell(name, rng, typos):
+    s = name.lower()
+    for _ in range(typos):
+        i = rng.randrange(len(s))
+        kind = rng.choice(["drop", "double", "swap", "substitute", "space"])
+        if kind == "drop":
+            s = s[:i] + s[i + 1:]
+        elif kind == "double":
+            s = s[:i] + s[i] + s[i:]
+        elif kind == "swap" and i + 1 < len(s):
+            s = s[:i] + s[i + 1] + s[i] + s[i + 2:]
+        elif kind == "space" and " " in s:
+            s = s.replace(" ", "", 1)
+        else:
+            s = s[:i] + rng.choice(LETTERS) + s[i + 1:]
+    # Visitors rarely type the suffix.
+    return s.rsplit(" ", 1)[0] if rng.random() < 0.5 and s.count(" ") > 1 else s
+
+
+def run(n, n_queries, k, scan_queries):
+    rng = random.Random(n)
+    names = make_names(n, rng)
+    t = time.perf_counter()
+    index = TrigramIndex()
+    for i, name in enumerate(names):
+        index.add(name, i)
+    build_s = time.perf_counter() - t
+
+    targets = rng.sample(range(n), n_queries)
+    queries = [misspell(names[i], rng, rng.randint(1, 2)) for i in targets]
+
+    latencies = []
+    hits = 0
+    for target, query in zip(targets, queries):
+        t = time.perf_counter()
+        found = [v for v, _ in index.lookup(query, limit=k)]
+        latencies.append((time.perf_counter() - t) * 1000)
+        hits += target in found
+    latencies.sort()
+
+    # The exhaustive scan gives the best recall the distance bound allows.
+    keys = [compact(name) for name in names]
+    scan_hits = 0
+    t = time.perf_counter()
+    for target, query in list(zip(targets, queries))[:scan_queries]:
+        q = compact(query)
+        bound = default_max_edits(q)
+        scored = sorted((d, abs(len(key) - len(q)), i) for i, key in enumerate(keys)
+                        if (d := infix_distance(q, key, bound)) is not None)
+        scan_hits += target in [i for _, _, i in scored[:k]]
+    scan_ms = (time.perf_counter() - t) / scan_queries * 1000
+
+    print(f"\n{n:,} names  (build {build_s:.2f}s, {len(index):,} keys)")
+    print(f"  index: recall@{k} {hits / n_queries:.3f}   p50 {latencies[len(latencies) // 2]:.3f} ms   "
+          f"p99 {latencies[int(len(latencies) * 0.99)]:.3f} ms")
+    print(f"  scan : recall@{k} {scan_hits / scan_queries:.3f}   {scan_ms:.1f} ms/query  ({scan_queries} queries)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--scan-queries", type=int, default=20)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+    for n in args.sizes:
+        run(n, args.queries, args.k, args.scan_queries)
+
+
+if __name__ == "__main__":
+    main()
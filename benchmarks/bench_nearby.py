@@ -0,0 +1,95 @@
+"""
+nearby_museums: the original iterrows/scalar-haversine loop versus the
+vectorized MuseumCoordinates path, plus the batch distance matrix.
+
+    python benchmarks/bench_nearby.py --queries 200
+    python benchmarks/bench_nearby.py --synthetic 100000 --queries 50
+
+--synthetic replaces final_museums.csv with N random points inside India.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import MUSEUM_FILE
+from ml_recommendations import NEARBY_COLUMNS, MuseumCoordinates, _haversine_km
+
+
+def loop_nearby(df, lat, lon, radius_km, top_n):
+    """nearby_museums as it was before vectorization."""
+    out = []
+    for _, r in df.iterrows():
+        try:
+            mlat = float(r["Latitude"])
+            mlon = float(r["Longitude"])
+        except Exception:
+            continue
+        d = _haversine_km(lat, lon, mlat, mlon)
+        if d <= radius_km:
+            item = {k: r.get(k) for k in NEARBY_COLUMNS}
+            item["distance_km"] = round(d, 1)
+            out.append(item)
+    out.sort(key=lambda x: x["distance_km"])
+    return out[:top_n]
+
+
+def _catalog(synthetic):
+    if not synthetic:
+        return pd.read_csv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), MUSEUM_FILE), on_bad_lines='skip')
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "Name": [f"Museum {i}" for i in range(synthetic)],
+        "City": "City", "State": "State", "Type": "General",
+        "Latitude": rng.uniform(8.0, 34.0, synthetic),
+        "Longitude": rng.uniform(68.0, 97.0, synthetic),
+    })
+
+
+def _timed(fn, repeat):
+    t = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - t) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--radius", type=float, default=50.0)
+    parser.add_argument("--synthetic", type=int, default=0, help="use N random museums instead of the CSV")
+    parser.add_argument("--skip-loop", action="store_true", help="skip the slow baseline")
+    args = parser.parse_args()
+
+    df = _catalog(args.synthetic)
+    rng = np.random.default_rng(1)
+    points = list(zip(rng.uniform(8.0, 34.0, args.queries), rng.uniform(68.0, 97.0, args.queries)))
+    print(f"{len(df)} museums, {len(points)} query points, radius {args.radius} km")
+
+    t = time.perf_counter()
+    coords = MuseumCoordinates(df)
+    print(f"build coordinate arrays: {(time.perf_counter() - t) * 1000:.1f} ms")
+
+    vec, vec_results = _timed(lambda: [coords.within(coords.distances_km(la, lo), args.radius, 12) for la, lo in points], 1)
+    print(f"vectorized:   {vec / len(points) * 1000:.3f} ms/query")
+
+    lats, lons = zip(*points)
+    batch, batch_results = _timed(lambda: [coords.within(row, args.radius, 12) for row in coords.distance_matrix_km(lats, lons)], 1)
+    print(f"batch matrix: {batch / len(points) * 1000:.3f} ms/query")
+    assert [[r["Name"] for r in x] for x in batch_results] == [[r["Name"] for r in x] for x in vec_results]
+
+    if not args.skip_loop:
+        sample = points[:max(1, min(len(points), 20))]
+        loop, loop_results = _timed(lambda: [loop_nearby(df, la, lo, args.radius, 12) for la, lo in sample], 1)
+        print(f"iterrows loop: {loop / len(sample) * 1000:.3f} ms/query  ({loop / len(sample) / (vec / len(points)):.0f}x slower)")
+        for got, want in zip(vec_results, loop_results):
+            assert [r["distance_km"] for r in got] == [r["distance_km"] for r in want]
+
+
+if __name__ == "__main__":
+    main()
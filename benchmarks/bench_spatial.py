@@ -0,0 +1,90 @@
+"""
+SpatialIndex (BallTree + delta buffer) versus a vectorized linear scan, at
+several catalog sizes of random points inside India.
+
+    python benchmarks/bench_spatial.py
+    python benchmarks/bench_spatial.py --sizes 10000 100000 --queries 500
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spatial_index import SpatialIndex, _haversine_km
+
+
+def _ms_per(fn, queries):
+    t = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - t) / len(queries) * 1000
+
+
+def run(n, n_queries, radius_km, k):
+    rng = np.random.default_rng(n)
+    lats = rng.uniform(8.0, 34.0, n)
+    lons = rng.uniform(68.0, 97.0, n)
+    rad_lats, rad_lons = np.radians(lats), np.radians(lons)
+    queries = list(zip(rng.uniform(8.0, 34.0, n_queries), rng.uniform(68.0, 97.0, n_queries)))
+
+    t = time.perf_counter()
+    index = SpatialIndex()
+    index.build((i, lats[i], lons[i], i) for i in range(n))
+    build_s = time.perf_counter() - t
+
+    def scan_radius(q):
+        d = _haversine_km(np.radians(q[0]), np.radians(q[1]), rad_lats, rad_lons)
+        idx = np.flatnonzero(d <= radius_km)
+        return idx[np.argsort(d[idx])]
+
+    def scan_knn(q):
+        d = _haversine_km(np.radians(q[0]), np.radians(q[1]), rad_lats, rad_lons)
+        idx = np.argpartition(d, k - 1)[:k]
+        return idx[np.argsort(d[idx])]
+
+    def scan_bbox(q):
+        return np.flatnonzero((lats >= q[0] - 0.5) & (lats <= q[0] + 0.5) & (lons >= q[1] - 0.5) & (lons <= q[1] + 0.5))
+
+    # Sanity check against the scan before timing.
+    q = queries[0]
+    assert sorted(r for r, _ in index.radius(*q, radius_km)) == sorted(scan_radius(q).tolist())
+    assert [r for r, _ in index.nearest(*q, k)] == scan_knn(q).tolist()
+    assert sorted(index.bbox(q[0] - 0.5, q[1] - 0.5, q[0] + 0.5, q[1] + 0.5)) == scan_bbox(q).tolist()
+
+    rows = [
+        ("radius", _ms_per(lambda q: index.radius(q[0], q[1], radius_km), queries), _ms_per(scan_radius, queries)),
+        ("knn", _ms_per(lambda q: index.nearest(q[0], q[1], k), queries), _ms_per(scan_knn, queries)),
+        ("bbox", _ms_per(lambda q: index.bbox(q[0] - 0.5, q[1] - 0.5, q[0] + 0.5, q[1] + 0.5), queries), _ms_per(scan_bbox, queries)),
+    ]
+
+    # Incremental updates: move 1% of the points, then query through the delta buffer.
+    moves = max(1, n // 100)
+    t = time.perf_counter()
+    for i in rng.choice(n, moves, replace=False):
+        index.upsert(int(i), rng.uniform(8.0, 34.0), rng.uniform(68.0, 97.0), int(i))
+    upsert_us = (time.perf_counter() - t) / moves * 1e6
+    after = _ms_per(lambda q: index.radius(q[0], q[1], radius_km), queries)
+
+    print(f"\n{n:,} points  (build {build_s:.2f}s, upsert {upsert_us:.1f} us, radius after {moves:,} moves {after:.3f} ms)")
+    print(f"  {'query':<8}{'index ms':>10}{'scan ms':>10}{'speedup':>9}")
+    for name, idx_ms, scan_ms in rows:
+        print(f"  {name:<8}{idx_ms:>10.3f}{scan_ms:>10.3f}{scan_ms / idx_ms:>8.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--radius", type=float, default=25.0)
+    parser.add_argument("--k", type=int, default=12)
+    args = parser.parse_args()
+    for n in args.sizes:
+        run(n, args.queries, args.radius, args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Wall-clock time to import the Flask app, i.e. worker startup.
+
+    python benchmarks/bench_startup.py --runs 5
+    MONGO_URI=mongodb://10.255.255.1:27017 python benchmarks/bench_startup.py
+
+The second form points at an unreachable host to measure startup while
+MongoDB is down.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPET = """
+import time
+t = time.perf_counter()
+import app
+print(time.perf_counter() - t)
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    times = []
+    for _ in range(args.runs):
+        out = subprocess.run(
+            [sys.executable, "-c", SNIPPET], cwd=ROOT, capture_output=True, text=True
+        )
+        if out.returncode != 0:
+            print(out.stderr.strip().splitlines()[-1])
+            sys.exit(1)
+        times.append(float(out.stdout.strip().splitlines()[-1]))
+
+    print(f"MONGO_URI={os.environ.get('MONGO_URI', 'mongodb://localhost:27017')}")
+    print(f"import app: median {statistics.median(times):.3f}s  min {min(times):.3f}s  max {max(times):.3f}s  ({args.runs} runs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+import csv
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+from file_lock import file_lock
+
+BOOKING_COLUMNS = [
+    'TicketID', 'Museum', 'Date', 'Time', 'People', 'TourType',
+    'VisitorName', 'VisitorEmail', 'VisitorPhone', 'VisitorAge',
+    'SpecialRequests', 'EmergencyContact', 'MuseumType', 'Attended', 'Rating', 'Review'
+]
+
+
+def _clean_row(row):
+    out = {}
+    for col in BOOKING_COLUMNS:
+        value = row.get(col, '')
+        out[col] = '' if value is None else str(value)
+    return out
+
+
+class BookingStore:
+    """
+    Booking storage engine backed by the `bookingDB` CSV snapshot plus an
+    append-only journal.
+
+    Every mutation appends the full new state of the touched ticket as one
+    JSON line to the journal and records its byte offset in an in-memory
+    TicketID -> offset index, so a status change or review costs O(1).
+    The journal is folded back into the CSV snapshot once it grows past
+    `compact_every` entries (or the size of the snapshot, if larger). On
+    startup the snapshot is loaded and the journal replayed; a torn trailing
+    line from a crash is dropped.
+    """
+
+    def __init__(self, csv_path, journal_path=None, compact_every=500, fsync=True):
+        self.csv_path = csv_path
+        self.journal_path = journal_path or f"{csv_path}.journal"
+        self.lock_path = f"{self.journal_path}.lock"
+        self.compact_every = compact_every
+        self.fsync = fsync
+
+        self._lock = threading.RLock()
+        self._rows = {}
+        self._by_email = {}
+        self._offsets = {}
+        self._journal_pos = 0
+        self._journal_ino = None
+        self._journal_lines = 0
+        self._listeners = []
+        self._loading = False
+
+        with self._locked():
+            self._ensure_files()
+            self._load()
+
+    @contextmanager
+    def _locked(self):
+        """Serialise access across threads and across worker processes."""
+        with self._lock, file_lock(self.lock_path):
+            yield
+
+    def _ensure_files(self):
+        if not os.path.exists(self.csv_path):
+            with open(self.csv_path, 'w', newline='', encoding='utf-8') as f:
+                csv.writer(f).writerow(BOOKING_COLUMNS)
+        if not os.path.exists(self.journal_path):
+            open(self.journal_path, 'ab').close()
+
+    def _load(self):
+        self._rows = {}
+        self._by_email = {}
+        self._offsets = {}
+        self._journal_pos = 0
+        self._journal_lines = 0
+        self._loading = True
+        try:
+            with open(self.csv_path, 'r', newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    ticket_id = row.get('TicketID')
+                    if ticket_id:
+                        self._put(_clean_row(row))
+            self._journal_ino = os.stat(self.journal_path).st_ino
+            self._replay()
+        finally:
+            self._loading = False
+        for listener in self._listeners:
+            listener.rebuild(self._rows.values())
+
+    def _replay(self):
+        """Apply journal lines written since our last read (by us or another worker)."""
+        with open(self.journal_path, 'rb') as f:
+            f.seek(self._journal_pos)
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line or not line.endswith(b'\n'):
+                    break
+                self._journal_pos = f.tell()
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    print(f"Warning: skipping corrupt booking journal entry at offset {offset}")
+                    continue
+                self._apply(event, offset)
+
+    def _apply(self, event, offset):
+        row = _clean_row(event.get('row') or {})
+        ticket_id = row['TicketID']
+        if not ticket_id:
+            return
+        self._put(row)
+        self._offsets[ticket_id] = offset
+        self._journal_lines += 1
+
+    def _put(self, row):
+        ticket_id = row['TicketID']
+        old = self._rows.get(ticket_id)
+        if old is not None and old['VisitorEmail'] != row['VisitorEmail']:
+            self._by_email[old['VisitorEmail']].remove(ticket_id)
+        if old is None or old['VisitorEmail'] != row['VisitorEmail']:
+            self._by_email.setdefault(row['VisitorEmail'], []).append(ticket_id)
+        self._rows[ticket_id] = row
+        if not self._loading:
+            for listener in self._listeners:
+                listener.apply(old, row)
+
+    def _catch_up(self):
+        try:
+            st = os.stat(self.journal_path)
+        except FileNotFoundError:
+            self._ensure_files()
+            st = os.stat(self.journal_path)
+        if st.st_ino != self._journal_ino or st.st_size < self._journal_pos:
+            # Another worker compacted the journal into a fresh snapshot.
+            self._load()
+        elif st.st_size > self._journal_pos:
+            self._replay()
+
+    def _append(self, events):
+        self._catch_up()
+        lines = [(json.dumps(e, ensure_ascii=False) + '\n').encode('utf-8') for e in events]
+        with open(self.journal_path, 'r+b') as f:
+            # Anything past our read position is a torn write left by a crash.
+            f.truncate(self._journal_pos)
+            f.seek(self._journal_pos)
+            f.write(b''.join(lines))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        offset = self._journal_pos
+        for event, line in zip(events, lines):
+            self._apply(event, offset)
+            offset += len(line)
+        self._journal_pos = offset
+        # Compacting once the journal is as long as the snapshot keeps the
+        # rewrite cost amortised O(1) per mutation.
+        if self._journal_lines >= max(self.compact_every, len(self._rows)):
+            self._compact()
+
+    def _compact(self):
+        tmp_csv = f"{self.csv_path}.tmp"
+        with open(tmp_csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=BOOKING_COLUMNS)
+            writer.writeheader()
+            writer.writerows(self._rows.values())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_csv, self.csv_path)
+
+        # Replaying the old journal over the new snapshot is idempotent, so a
+        # crash between these two renames loses nothing.
+        tmp_journal = f"{self.journal_path}.tmp"
+        open(tmp_journal, 'wb').close()
+        os.replace(tmp_journal, self.journal_path)
+        self._journal_ino = os.stat(self.journal_path).st_ino
+        self._journal_pos = 0
+        self._journal_lines = 0
+        self._offsets = {}
+
+    def subscribe(self, listener):
+        """
+        Keep `listener` in sync with the bookings. It receives
+        `rebuild(rows)` now and after any full reload, and `apply(old, new)`
+        for every change, including ones replayed from other workers.
+        """
+        with self._locked():
+            self._catch_up()
+            self._listeners.append(listener)
+            listener.rebuild(self._rows.values())
+
+    def compact(self):
+        """Fold the journal into the CSV snapshot and start an empty journal."""
+        with self._locked():
+            self._catch_up()
+            self._compact()
+
+    def refresh(self):
+        with self._locked():
+            self._catch_up()
+
+    def get(self, ticket_id):
+        with self._locked():
+            self._catch_up()
+            row = self._rows.get(str(ticket_id))
+            return dict(row) if row else None
+
+    def rows(self):
+        with self._locked():
+            self._catch_up()
+            return [dict(r) for r in self._rows.values()]
+
+    def iter_rows(self, predicate=None, chunk_size=1000):
+        """
+        Lazily yield bookings (optionally filtered), copying one chunk at a
+        time so an export never holds a second copy of the whole store.
+        """
+        with self._locked():
+            self._catch_up()
+            ids = list(self._rows)
+        for i in range(0, len(ids), chunk_size):
+            with self._locked():
+                chunk = [self._rows.get(t) for t in ids[i:i + chunk_size]]
+            for row in chunk:
+                if row is not None and (predicate is None or predicate(row)):
+                    yield dict(row)
+
+    def for_email(self, email, start=0, limit=None):
+        """Bookings made under `email`, oldest first, via the per-email index."""
+        with self._locked():
+            self._catch_up()
+            ids = self._by_email.get(email, [])
+            end = len(ids) if limit is None else start + limit
+            return [dict(self._rows[t]) for t in ids[start:end]]
+
+    def dataframe(self):
+        """Bookings as a DataFrame shaped like `pd.read_csv(bookingDB)`."""
+        df = pd.DataFrame(self.rows(), columns=BOOKING_COLUMNS)
+        df = df.replace('', None)
+        for col in ('People', 'Rating'):
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        return df
+
+    def add(self, row):
+        row = _clean_row(row)
+        if not row['TicketID']:
+            raise ValueError("TicketID is required")
+        with self._locked():
+            self._append([{'op': 'book', 'row': row}])
+        return row
+
+    def add_many(self, rows):
+        """Append several bookings with a single journal write."""
+        rows = [_clean_row(r) for r in rows]
+        if any(not r['TicketID'] for r in rows):
+            raise ValueError("TicketID is required")
+        if rows:
+            with self._locked():
+                self._append([{'op': 'book', 'row': r} for r in rows])
+        return rows
+
+    def update(self, ticket_id, fields):
+        """Set `fields` on one booking. Returns the updated row, or None if unknown."""
+        ticket_id = str(ticket_id)
+        with self._locked():
+            self._catch_up()
+            current = self._rows.get(ticket_id)
+            if current is None:
+                return None
+            row = _clean_row({**current, **fields, 'TicketID': ticket_id})
+            self._append([{'op': 'update', 'row': row}])
+            return dict(row)
+
+    def transition(self, ticket_id, fields, expect=None):
+        """
+        Compare-and-set for one booking: set `fields` unless it already has
+        them, or the current row fails the `expect` predicate. Returns
+        `(old, new)`, with `new` None when nothing changed and both None if
+        the ticket is unknown. Only the caller that actually made a change
+        gets a `new`, so side effects keyed on the change (seat counts) run
+        once even for concurrent requests.
+        """
+        ticket_id = str(ticket_id)
+        with self._locked():
+            self._catch_up()
+            current = self._rows.get(ticket_id)
+            if current is None:
+                return None, None
+            if expect is not None and not expect(current):
+                return dict(current), None
+            row = _clean_row({**current, **fields, 'TicketID': ticket_id})
+            if row == current:
+                return dict(current), None
+            self._append([{'op': 'update', 'row': row}])
+            return dict(current), dict(row)
+
+    def update_where(self, predicate, fields):
+        """Set `fields` on every booking matching `predicate`. Returns the touched TicketIDs."""
+        with self._locked():
+            self._catch_up()
+            events = [
+                {'op': 'update', 'row': _clean_row({**row, **fields, 'TicketID': ticket_id})}
+                for ticket_id, row in self._rows.items()
+                if predicate(row)
+            ]
+            if events:
+                self._append(events)
+            return [e['row']['TicketID'] for e in events]
+
+    def __len__(self):
+        with self._locked():
+            self._catch_up()
+            return len(self._rows)
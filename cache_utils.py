@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache bounded by entry count and, optionally, by the
+    total size of its values (as reported by `sizeof`). With `ttl` set,
+    entries also expire that many seconds after they were stored.
+    """
+
+    def __init__(self, max_items=1024, max_bytes=None, sizeof=len, ttl=None, clock=time.monotonic):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.coalesced = 0
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._expires = {}
+        self._bytes = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _drop(self, key):
+        self._bytes -= self._sizes.pop(key)
+        self._expires.pop(key, None)
+        return self._data.pop(key)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                if self.ttl is not None and self._expires[key] <= self.clock():
+                    self._drop(key)
+                    self.expired += 1
+                else:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._data[key] = value
+            self._sizes[key] = size
+            if self.ttl is not None:
+                self._expires[key] = self.clock() + self.ttl
+            self._bytes += size
+            while len(self._data) > self.max_items or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                self._drop(next(iter(self._data)))
+
+    def get_or_compute(self, key, compute):
+        """
+        Cached value for `key`, calling `compute()` on a miss. Concurrent
+        misses for the same key wait for the first caller's result instead
+        of computing it again (single-flight).
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = compute()
+            self.set(key, flight.value)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._expires.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "items": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "coalesced": self.coalesced,
+            }
+
+    def __len__(self):
+        return len(self._data)
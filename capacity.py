@@ -0,0 +1,295 @@
+import os
+import threading
+from collections import defaultdict
+import datetime
+
+from pymongo import ReplaceOne
+from pymongo.errors import DuplicateKeyError
+
+SLOT_CAPACITY = int(os.environ.get('SLOT_CAPACITY', 50))
+TOUR_TIMES = ["10:00", "11:00", "12:00", "14:00", "15:00", "16:00", "17:00"]
+
+# Booking statuses that occupy seats in their slot.
+HELD_STATUSES = {"No", "Yes"}
+
+
+def slot_key(museum, date, time):
+    return f"{museum}|{date}|{time}"
+
+
+def _people(value):
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class MemorySlotCounters:
+    """
+    In-process stand-in for the Mongo `slots` collection.
+
+    A BookingStore listener, so the counts follow the shared booking
+    journal and every worker sees the same bookings. Seats granted by
+    `reserve` are held against their TicketID until that booking reaches
+    the store, so two requests cannot both take the last seats.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._booked = {}
+        self._by_museum = defaultdict(set)
+        self._pending = {}                  # ticket id -> (slot key, people)
+        self._pending_seats = defaultdict(int)
+
+    def _count(self, row, sign):
+        if row.get('Attended') not in HELD_STATUSES:
+            return
+        key = slot_key(row['Museum'], row['Date'], row['Time'])
+        self._booked[key] = max(self._booked.get(key, 0) + sign * _people(row.get('People')), 0)
+        self._by_museum[row['Museum']].add((row['Date'], row['Time']))
+
+    def _settle(self, ticket_id):
+        key, people = self._pending.pop(ticket_id, (None, 0))
+        if key is not None:
+            self._pending_seats[key] -= people
+            if not self._pending_seats[key]:
+                del self._pending_seats[key]
+
+    def reserve(self, museum, date, time, people, capacity, ticket_id):
+        key = slot_key(museum, date, time)
+        with self._lock:
+            taken = self._booked.get(key, 0) + self._pending_seats.get(key, 0)
+            if taken + people > capacity:
+                return False
+            self._pending[ticket_id] = (key, people)
+            self._pending_seats[key] += people
+            self._by_museum[museum].add((date, time))
+            return True
+
+    def booked_between(self, museum, start, end):
+        with self._lock:
+            return {
+                (date, time): self._booked.get(slot_key(museum, date, time), 0)
+                              + self._pending_seats.get(slot_key(museum, date, time), 0)
+                for date, time in self._by_museum.get(museum, ())
+                if start <= date <= end
+            }
+
+    # Listener interface
+
+    def rebuild(self, bookings):
+        with self._lock:
+            self._booked = {}
+            self._by_museum = defaultdict(set)
+            for b in bookings:
+                self._settle(b['TicketID'])
+                self._count(b, 1)
+
+    def apply(self, old, new):
+        with self._lock:
+            if old is not None:
+                self._count(old, -1)
+            if new is not None:
+                self._settle(new['TicketID'])
+                self._count(new, 1)
+
+
+class MongoSlotCounters:
+    """
+    Per-slot seat counters in the `slots` collection, one document per
+    Museum/Date/Time. Reservations are a single conditional `$inc`, so two
+    workers can never oversell a slot.
+    """
+
+    def __init__(self, collection):
+        self.col = collection
+
+    def reserve(self, museum, date, time, people, capacity):
+        if people > capacity:
+            return False
+        key = slot_key(museum, date, time)
+        guarded = {"_id": key, "booked": {"$lte": capacity - people}}
+        if self.col.update_one(guarded, {"$inc": {"booked": people}}).matched_count:
+            return True
+        try:
+            self.col.insert_one({"_id": key, "Museum": museum, "Date": date, "Time": time, "booked": people})
+            return True
+        except DuplicateKeyError:
+            # Either the slot is full or another worker created it first.
+            return self.col.update_one(guarded, {"$inc": {"booked": people}}).matched_count == 1
+
+    def adjust(self, museum, date, time, delta):
+        self.col.update_one(
+            {"_id": slot_key(museum, date, time)},
+            {"$inc": {"booked": delta}, "$setOnInsert": {"Museum": museum, "Date": date, "Time": time}},
+            upsert=True
+        )
+
+    def booked_between(self, museum, start, end):
+        cursor = self.col.find(
+            {"Museum": museum, "Date": {"$gte": start, "$lte": end}},
+            {"_id": 0, "Date": 1, "Time": 1, "booked": 1}
+        )
+        return {(d["Date"], d["Time"]): max(int(d.get("booked", 0)), 0) for d in cursor}
+
+    def rebuild(self, bookings):
+        totals = {}
+        for b in bookings:
+            if b.get('Attended') not in HELD_STATUSES:
+                continue
+            key = slot_key(b['Museum'], b['Date'], b['Time'])
+            doc = totals.setdefault(key, {"_id": key, "Museum": b['Museum'], "Date": b['Date'], "Time": b['Time'], "booked": 0})
+            doc["booked"] += _people(b.get('People'))
+        self.col.delete_many({"_id": {"$nin": list(totals)}})
+        if totals:
+            self.col.bulk_write([ReplaceOne({"_id": k}, d, upsert=True) for k, d in totals.items()], ordered=False)
+
+
+class SlotCapacity:
+    """
+    Seat accounting per Museum/Date/Time slot.
+
+    Uses the Mongo `slots` collection when MongoDB is reachable and falls
+    back to in-process counters that follow the booking store otherwise.
+    `reconcile` recounts `slots` from the store, so seats taken while Mongo
+    was down (or before `slots` existed) are there when it comes back.
+    """
+
+    def __init__(self, get_db, capacity=SLOT_CAPACITY):
+        self.get_db = get_db
+        self.capacity = capacity
+        self.memory = MemorySlotCounters()
+        self._store = None
+        self._refresh = lambda: None
+
+    def attach(self, store):
+        """Count seats from `store`'s bookings, including ones journalled by other workers."""
+        self._store = store
+        self._refresh = store.refresh
+        store.subscribe(self.memory)
+
+    def reconcile(self, db):
+        """Recount the Mongo `slots` collection from the booking store (on every Mongo (re)connect)."""
+        if self._store is None:
+            return
+        try:
+            MongoSlotCounters(db.slots).rebuild(self._store.rows())
+        except Exception as e:
+            print(f"Warning: could not reconcile slot counters in MongoDB: {e}")
+
+    def _mongo(self):
+        try:
+            return MongoSlotCounters(self.get_db().slots)
+        except Exception:
+            return None
+
+    def reserve(self, museum, date, time, people, ticket_id):
+        """
+        Atomically take `people` seats for the booking `ticket_id`, which the
+        caller adds to the booking store next. Returns False when the slot
+        is full.
+        """
+        people = _people(people)
+        mongo = self._mongo()
+        if mongo is not None:
+            try:
+                return mongo.reserve(museum, date, time, people, self.capacity)
+            except Exception as e:
+                print(f"Warning: slot reservation failed in MongoDB, using in-process counters: {e}")
+        self._refresh()
+        return self.memory.reserve(museum, date, time, people, self.capacity, ticket_id)
+
+    def _adjust(self, museum, date, time, delta):
+        # The in-process counters follow the booking store; only Mongo needs telling.
+        mongo = self._mongo()
+        if mongo is not None:
+            try:
+                mongo.adjust(museum, date, time, delta)
+            except Exception as e:
+                print(f"Warning: failed to update slot counters in MongoDB: {e}")
+
+    def release(self, museum, date, time, people):
+        self._adjust(museum, date, time, -_people(people))
+
+    def hold(self, museum, date, time, people):
+        """Take seats unconditionally (e.g. an admin re-instating a booking)."""
+        self._adjust(museum, date, time, _people(people))
+
+    def sync_status(self, old, new):
+        """Move seats when a booking enters or leaves a seat-holding status."""
+        was_held = old.get('Attended') in HELD_STATUSES
+        is_held = new.get('Attended') in HELD_STATUSES
+        if was_held and not is_held:
+            self.release(old['Museum'], old['Date'], old['Time'], old.get('People'))
+        elif is_held and not was_held:
+            self.hold(new['Museum'], new['Date'], new['Time'], new.get('People'))
+
+    def set_status(self, ticket_id, status, expect=None):
+        """
+        Set a booking's Attended status in the attached store and move its
+        seats. Returns `(old, new)` like BookingStore.transition: `new` is
+        None when nothing changed, so seats move once per real change.
+        """
+        old, new = self._store.transition(ticket_id, {'Attended': status}, expect=expect)
+        if new is not None:
+            self.sync_status(old, new)
+        return old, new
+
+    def attend(self, date, time):
+        """
+        Mark the seat-holding bookings of a Date/Time slot attended;
+        cancelled and waitlisted ones are left alone. Returns
+        `(matched, changed)` TicketID lists.
+        """
+        held = lambda r: r.get('Attended') in HELD_STATUSES
+        matched = [r['TicketID'] for r in self._store.iter_rows(
+            lambda r: r['Date'] == str(date) and r['Time'] == str(time) and held(r)
+        )]
+        changed = [t for t in matched if self.set_status(t, 'Yes', expect=held)[1] is not None]
+        return matched, changed
+
+    def availability(self, museum, start, end, times=TOUR_TIMES):
+        """Remaining seats for every slot of `museum` between two ISO dates, from one query."""
+        booked = None
+        mongo = self._mongo()
+        if mongo is not None:
+            try:
+                booked = mongo.booked_between(museum, start, end)
+            except Exception as e:
+                print(f"Warning: failed to read slot counters from MongoDB: {e}")
+        if booked is None:
+            booked = self.memory.booked_between(museum, start, end)
+        first, last = datetime.date.fromisoformat(start), datetime.date.fromisoformat(end)
+        slots = {}
+        day = first
+        while day <= last:
+            for t in times:
+                slots[(day.isoformat(), t)] = 0
+            day += datetime.timedelta(days=1)
+        slots.update(booked)
+        return [
+            {
+                "date": d,
+                "time": t,
+                "booked": n,
+                "remaining": max(self.capacity - n, 0)
+            }
+            for (d, t), n in sorted(slots.items())
+        ]
+
+    def rebuild(self, bookings):
+        """Recount every slot in MongoDB from the booking records."""
+        bookings = list(bookings)
+        try:
+            MongoSlotCounters(self.get_db().slots).rebuild(bookings)
+        except Exception as e:
+            print(f"Warning: could not rebuild slot counters in MongoDB: {e}")
+
+
+if __name__ == '__main__':
+    from booking_store import BookingStore
+    from db_utils import get_db
+
+    store = BookingStore("bookingDB")
+    SlotCapacity(get_db).rebuild(store.rows())
+    print(f"Rebuilt slot counters from {len(store)} bookings")
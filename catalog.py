@@ -0,0 +1,255 @@
+import hashlib
+import os
+import threading
+import time
+
+import pandas as pd
+from pymongo import ReturnDocument
+from db_utils import get_db
+
+MUSEUM_FILE = "final_museums.csv"
+ESSENTIAL_COLUMNS = ['Name', 'City', 'State', 'Type']
+CATALOG_POLL_INTERVAL = float(os.environ.get('CATALOG_POLL_INTERVAL', 10))
+
+# Single document bumped on every admin write so other workers notice
+# the change without re-reading the whole collection.
+META_COLLECTION = "catalog_meta"
+META_ID = "museums"
+
+
+def _remote_signature(db):
+    """Cheap change marker: the admin-write counter plus the collection size
+    (which also catches inserts/deletes made outside the app)."""
+    meta = db[META_COLLECTION].find_one({"_id": META_ID}) or {}
+    return meta.get("version", 0), db.museums.estimated_document_count()
+
+
+def _fingerprint(frame):
+    h = hashlib.sha1(",".join(map(str, frame.columns)).encode("utf-8"))
+    if len(frame):
+        h.update(pd.util.hash_pandas_object(frame.astype(str), index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+class CatalogSnapshot:
+    """
+    One immutable version of the museum catalog.
+
+    `frame` holds every museum with Name/City/State/Type present; Mongo
+    ids are kept as strings in `_id`. Consumers must treat it as
+    read-only — a change produces a new snapshot, never an edit in place.
+    """
+
+    def __init__(self, frame, version, source):
+        self.frame = frame
+        self.version = version
+        self.source = source
+        self.fingerprint = _fingerprint(frame)
+        self.loaded_at = time.time()
+        self._search_text = None
+        self._records = None
+        self._by_name = None
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def records(self):
+        """Rows as dicts with NaN replaced by None, built once per snapshot."""
+        if self._records is None:
+            frame = self.frame.astype(object)
+            self._records = frame.where(frame.notna(), None).to_dict(orient='records')
+        return self._records
+
+    @property
+    def by_name(self):
+        """Name -> record (first one wins for duplicate names)."""
+        if self._by_name is None:
+            by_name = {}
+            for record in self.records:
+                by_name.setdefault(record.get('Name'), record)
+            self._by_name = by_name
+        return self._by_name
+
+    @property
+    def search_text(self):
+        """Lower-cased Name/City/State/Type/Category/Description per row, built once per snapshot."""
+        if self._search_text is None:
+            df = self.frame
+            parts = [df[c].fillna('').astype(str) if c in df else pd.Series([''] * len(df), index=df.index)
+                     for c in ['Name', 'City', 'State', 'Type', 'Category', 'Description']]
+            text = parts[0]
+            for p in parts[1:]:
+                text = text + ' ' + p
+            self._search_text = text.str.lower().tolist()
+        return self._search_text
+
+
+def _clean(frame):
+    frame.columns = frame.columns.str.strip()
+    for col in ESSENTIAL_COLUMNS:
+        if col not in frame.columns:
+            frame[col] = pd.Series(dtype=object)
+    return frame.dropna(subset=ESSENTIAL_COLUMNS).reset_index(drop=True)
+
+
+class MuseumCatalog:
+    """
+    Process-wide museum catalog shared by the routes, the recommender and
+    the chatbot.
+
+    Readers call `snapshot()` and get an immutable CatalogSnapshot; loading
+    happens once, on first use. A reload (`refresh`), an admin write
+    (`upsert`/`remove`) or the background poll builds a new snapshot and
+    swaps it in atomically, then calls each subscriber with
+    `(snapshot, change)`, where `change` is ("upsert", id, doc),
+    ("remove", id) or None for a full reload.
+    """
+
+    def __init__(self, csv_path=MUSEUM_FILE, get_db=get_db, poll_interval=CATALOG_POLL_INTERVAL):
+        self.csv_path = csv_path
+        self.get_db = get_db
+        self.poll_interval = poll_interval
+        self._lock = threading.RLock()
+        self._snapshot = None
+        self._version = 0
+        self._listeners = []
+        self._remote_version = None
+        self._thread = None
+        self._thread_pid = None
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self.refresh()
+                snapshot = self._snapshot
+        return snapshot
+
+    def _load(self):
+        try:
+            db = self.get_db()
+            signature = _remote_signature(db)
+            docs = [{**d, "_id": str(d["_id"])} for d in db.museums.find({})]
+            self._remote_version = signature
+            return _clean(pd.DataFrame(docs)), "mongo"
+        except Exception as e:
+            print(f"MongoDB not available for the museum catalog, falling back to CSV: {e}")
+        try:
+            return _clean(pd.read_csv(self.csv_path, on_bad_lines='skip')), "csv"
+        except Exception as e:
+            print(f"Error loading museums: {e}")
+            return _clean(pd.DataFrame()), "empty"
+
+    def _swap(self, frame, source, change):
+        self._version += 1
+        snapshot = CatalogSnapshot(frame, self._version, source)
+        self._snapshot = snapshot
+        for listener in list(self._listeners):
+            try:
+                listener(snapshot, change)
+            except Exception as e:
+                print(f"Warning: catalog listener failed: {e}")
+        return snapshot
+
+    def refresh(self):
+        """Reload from MongoDB (or the CSV). Swaps only if the content changed."""
+        with self._lock:
+            frame, source = self._load()
+            current = self._snapshot
+            if current is not None and current.source == source and current.fingerprint == _fingerprint(frame):
+                return current
+            return self._swap(frame, source, None)
+
+    def _bump_remote(self):
+        try:
+            db = self.get_db()
+            meta = db[META_COLLECTION].find_one_and_update(
+                {"_id": META_ID}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+            )
+            previous = self._remote_version
+            if previous is not None and meta.get("version", 0) == previous[0] + 1:
+                self._remote_version = (meta["version"], db.museums.estimated_document_count())
+            else:
+                # Another worker changed the catalog since our last load;
+                # forget the signature so the next poll reloads it.
+                self._remote_version = None
+        except Exception as e:
+            print(f"Warning: could not publish catalog change: {e}")
+
+    def upsert(self, museum_id, doc):
+        """Record an admin create/update that has already been written to MongoDB."""
+        museum_id = str(museum_id)
+        row = {k: v for k, v in doc.items() if k != '_id'}
+        row["_id"] = museum_id
+        with self._lock:
+            current = self.snapshot()
+            if current.source != "mongo" or "_id" not in current.frame.columns:
+                self.refresh()
+                self._bump_remote()
+                return self._snapshot
+            frame = current.frame[current.frame["_id"] != museum_id]
+            frame = _clean(pd.concat([frame, pd.DataFrame([row])], ignore_index=True))
+            self._bump_remote()
+            return self._swap(frame, current.source, ("upsert", museum_id, row))
+
+    def remove(self, museum_id):
+        """Record an admin delete that has already been applied in MongoDB."""
+        museum_id = str(museum_id)
+        with self._lock:
+            current = self.snapshot()
+            if current.source != "mongo" or "_id" not in current.frame.columns:
+                self.refresh()
+                self._bump_remote()
+                return self._snapshot
+            frame = current.frame[current.frame["_id"] != museum_id].reset_index(drop=True)
+            self._bump_remote()
+            return self._swap(frame, current.source, ("remove", museum_id))
+
+    def poll(self):
+        """Reload if another worker (or a reconnect) changed the catalog since our snapshot."""
+        try:
+            remote = _remote_signature(self.get_db())
+        except Exception:
+            return False
+        current = self._snapshot
+        if current is not None and current.source == "mongo" and remote == self._remote_version:
+            return False
+        self.refresh()
+        return True
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Warning: catalog poll failed: {e}")
+
+    def start(self):
+        """Start the change poll (again, if this process was forked)."""
+        if self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid():
+            return
+        self._thread_pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="catalog-poll", daemon=True)
+        self._thread.start()
+
+    def status(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"loaded": False}
+        return {
+            "loaded": True,
+            "version": snapshot.version,
+            "source": snapshot.source,
+            "museums": len(snapshot),
+            "fingerprint": snapshot.fingerprint,
+            "loaded_at": snapshot.loaded_at,
+        }
+
+
+museum_catalog = MuseumCatalog()
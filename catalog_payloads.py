@@ -0,0 +1,83 @@
+import gzip
+import hashlib
+import json
+import threading
+
+from catalog import museum_catalog
+
+try:
+    import brotli
+except ImportError:   # optional; gzip is always available
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 9
+
+
+class CatalogPayload:
+    """
+    One catalog response serialized once: the JSON bytes, their gzip (and,
+    if the brotli package is installed, brotli) encodings, and a strong
+    ETag per encoding derived from the JSON body.
+    """
+
+    def __init__(self, data):
+        self.body = json.dumps(data, separators=(",", ":"), sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+        self.etag = hashlib.sha1(self.body).hexdigest()
+        self.encoded = {"gzip": gzip.compress(self.body, GZIP_LEVEL, mtime=0)}
+        if brotli is not None:
+            self.encoded["br"] = brotli.compress(self.body, quality=BROTLI_QUALITY)
+
+    def etags(self):
+        """Every ETag this payload is served under, for If-None-Match."""
+        return [self.etag] + [f"{self.etag}-{coding}" for coding in self.encoded]
+
+    def variant(self, accept_encodings):
+        """`(bytes, content_encoding or None, etag)` for a request's Accept-Encoding."""
+        for coding in ("br", "gzip"):
+            if coding in self.encoded and accept_encodings[coding]:
+                return self.encoded[coding], coding, f"{self.etag}-{coding}"
+        return self.body, None, self.etag
+
+
+class CatalogPayloads:
+    """
+    Serialized catalog responses, built on first request for each catalog
+    version and dropped when the catalog changes. Entries are keyed by the
+    snapshot fingerprint, so every worker serving the same catalog hands out
+    the same ETags.
+    """
+
+    def __init__(self, catalog=museum_catalog):
+        self.catalog = catalog
+        self._lock = threading.Lock()
+        self._payloads = {}
+        catalog.subscribe(self._on_catalog_change)
+
+    def _on_catalog_change(self, snapshot, change=None):
+        with self._lock:
+            self._payloads = {k: v for k, v in self._payloads.items() if k[1] == snapshot.fingerprint}
+
+    def get(self, name, build):
+        """The payload for `name` on the current snapshot; `build(snapshot)` returns its JSON data."""
+        snapshot = self.catalog.snapshot()
+        key = (name, snapshot.fingerprint)
+        payload = self._payloads.get(key)
+        if payload is None:
+            with self._lock:
+                payload = self._payloads.get(key)
+                if payload is None:
+                    payload = CatalogPayload(build(snapshot))
+                    if snapshot is self.catalog.snapshot():
+                        self._payloads[key] = payload
+        return payload
+
+    def stats(self):
+        return {
+            name: {"fingerprint": fingerprint, "bytes": len(p.body),
+                   **{f"{coding}_bytes": len(data) for coding, data in p.encoded.items()}}
+            for (name, fingerprint), p in list(self._payloads.items())
+        }
+
+
+catalog_payloads = CatalogPayloads()
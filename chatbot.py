@@ -8,14 +8,25 @@ from datetime import datetime, timedelta
 import requests
 from urllib.parse import quote
 
+from catalog import MuseumCatalog, museum_catalog, MUSEUM_FILE
+from search_index import MuseumSearch, museum_search
+
+# Question words never looked up as (misspelt) museum or city names.
+_LOOKUP_STOPWORDS = {
+    'about', 'could', 'where', 'which', 'there', 'their', 'these', 'those', 'would',
+    'should', 'museum', 'museums', 'visit', 'visiting', 'timings', 'ticket', 'tickets',
+    'tell', 'show', 'what', 'when', 'with', 'from', 'that', 'this', 'have', 'near', 'best',
+}
+
 class MuseumExpertChatbot:
-    def __init__(self, api_key: str, museum_data_file: str = "final_museums.csv"):
+    def __init__(self, api_key: str, museum_data_file: str = MUSEUM_FILE, catalog: Optional[MuseumCatalog] = None):
         """
         Initialize the Comprehensive Museum Expert Chatbot
         
         Args:
             api_key (str): Gemini API key
-            museum_data_file (str): Path to the museum data CSV file
+            museum_data_file (str): CSV fallback used when no catalog is given
+            catalog (MuseumCatalog): Shared museum catalog (defaults to the app-wide one)
         """
         if not api_key or not api_key.startswith('AIza'):
             raise ValueError("Invalid Gemini API key provided. Please check your API key.")
@@ -49,7 +60,10 @@ class MuseumExpertChatbot:
         self._initialize_expert_chat_session()
 
         self.museum_data_file = museum_data_file
-        self.museums_df = self._load_museum_data()
+        if catalog is None:
+            catalog = museum_catalog if museum_data_file == MUSEUM_FILE else MuseumCatalog(csv_path=museum_data_file)
+        self.catalog = catalog
+        self.search = museum_search if catalog is museum_catalog else MuseumSearch(catalog)
 
         self.conversation_context = {
             "user_profile": {
@@ -167,30 +181,10 @@ class MuseumExpertChatbot:
             print(f"Warning: Could not initialize expert chat session: {e}")
             self.chat_session = None
 
-    def _load_museum_data(self) -> pd.DataFrame:
-        """Load and enhance museum database"""
-        try:
-            df = pd.read_csv(self.museum_data_file, on_bad_lines='skip')
-            df.columns = df.columns.str.strip()
-
-            essential_columns = ['Name', 'City', 'State', 'Type']
-            df = df.dropna(subset=essential_columns)
-
-            df['SearchIndex'] = (
-                df['Name'].fillna('') + ' ' +
-                df['City'].fillna('') + ' ' +
-                df['State'].fillna('') + ' ' +
-                df['Type'].fillna('') + ' ' +
-                df.get('Category', pd.Series([''] * len(df))).fillna('') + ' ' +
-                df.get('Description', pd.Series([''] * len(df))).fillna('')
-            ).str.lower()
-            
-            print(f"📊 Loaded {len(df)} museums into knowledge base")
-            return df
-            
-        except Exception as e:
-            print(f"Warning: Could not load museum data: {e}")
-            return pd.DataFrame()
+    @property
+    def museums_df(self) -> pd.DataFrame:
+        """Current museum catalog snapshot"""
+        return self.catalog.snapshot().frame
 
     def answer_museum_question(self, question: str, context: Dict = None) -> str:
         """
@@ -324,18 +318,33 @@ class MuseumExpertChatbot:
         return analysis
 
     def _find_relevant_museums(self, question: str, limit: int = 5) -> List[Dict]:
-        """Find museums relevant to the question"""
-        if self.museums_df.empty:
+        """Find museums relevant to the question, tolerating misspelt names and cities"""
+        indexes = self.search.indexes()
+        snapshot, trigram = indexes.snapshot, indexes.fuzzy
+        if snapshot.frame.empty:
             return []
         
         question_lower = question.lower()
+        question_words = re.findall(r'\b\w+\b', question_lower)
+
+        # Fuzzy name/city hits for single words and adjacent pairs
+        # ("salarjung", "victorial memorial", "kolkatta").
+        words = [w for w in question_words if w not in _LOOKUP_STOPWORDS]
+        phrases = [w for w in words if len(w) >= 5]
+        phrases += [f"{a} {b}" for a, b in zip(words, words[1:]) if len(a) >= 3 and len(b) >= 3]
+        fuzzy_scores = {}
+        for phrase in phrases:
+            best = {}
+            for (i, column), distance in trigram.lookup(phrase, limit=10):
+                best[i] = max(best.get(i, 0), (5 if column == 'Name' else 3) - distance)
+            for i, score in best.items():
+                fuzzy_scores[i] = fuzzy_scores.get(i, 0) + score
+
         relevant_museums = []
 
-        for _, museum in self.museums_df.iterrows():
-            relevance_score = 0
-            search_text = museum.get('SearchIndex', '').lower()
+        for i, (museum, search_text) in enumerate(zip(snapshot.records, snapshot.search_text)):
+            relevance_score = fuzzy_scores.get(i, 0)
 
-            question_words = re.findall(r'\b\w+\b', question_lower)
             for word in question_words:
                 if len(word) > 3 and word in search_text:
                     relevance_score += 1
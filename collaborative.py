@@ -0,0 +1,240 @@
+import heapq
+import random
+import threading
+from collections import defaultdict
+
+import scipy.sparse as sp
+
+# Bookings that were cancelled say nothing about what a visitor likes.
+IGNORED_STATUSES = {"Cancelled"}
+
+
+def interaction_weight(row):
+    """
+    How strongly one booking ties a visitor to a museum: 1 for booking it,
+    +1 for actually attending, and up to +1 more for a 4-5 star review.
+    """
+    if not row.get('VisitorEmail') or not row.get('Museum') or row.get('Attended') in IGNORED_STATUSES:
+        return 0.0
+    weight = 1.0
+    if row.get('Attended') == 'Yes':
+        weight += 1.0
+    try:
+        rating = float(row.get('Rating'))
+    except (TypeError, ValueError):
+        rating = None
+    if rating is not None and rating == rating:
+        weight += max(rating - 3.0, 0.0) / 2.0
+    return weight
+
+
+def _visitor(row):
+    return (row.get('VisitorEmail') or '').strip().lower()
+
+
+class ItemItemRecommender:
+    """
+    Item-item collaborative filtering over a sparse visitor x museum matrix
+    built from bookings (and the ratings stored on them), keyed by
+    VisitorEmail.
+
+    It is a BookingStore listener: `rebuild(rows)` computes all co-occurrence
+    dot products with one sparse product, and `apply(old, new)` adjusts
+    only the pairs involving the touched visitor's museums. Each museum's
+    top-`neighbours` similarities are recomputed lazily the next time they
+    are needed after a change.
+
+    Similarity is the asymmetric cosine dot(i, j) / (|i|^2a * |j|^2(1-a)).
+    a = 0.5 is plain cosine; larger values stop a museum's neighbour list
+    from filling up with obscure museums that happen to share one visitor.
+    """
+
+    def __init__(self, neighbours=20, alpha=0.8, refresh=None):
+        self.neighbours = neighbours
+        self.alpha = alpha
+        self._refresh = refresh or (lambda: None)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._weights = defaultdict(dict)   # visitor -> {museum: weight}
+        self._dots = defaultdict(dict)      # museum -> {museum: sum of w_ui * w_uj}
+        self._norms = defaultdict(float)    # museum -> sum of w_ui ** 2
+        self._top = {}                      # museum -> [(sim, museum)], pruned
+        self._dirty = set()
+
+    # Listener interface
+
+    def rebuild(self, rows):
+        weights = defaultdict(lambda: defaultdict(float))
+        for row in rows:
+            w = interaction_weight(row)
+            if w:
+                weights[_visitor(row)][row['Museum']] += w
+        visitors = list(weights)
+        museums = sorted({m for items in weights.values() for m in items})
+        col = {m: j for j, m in enumerate(museums)}
+        r, c, v = [], [], []
+        for i, u in enumerate(visitors):
+            for m, w in weights[u].items():
+                r.append(i)
+                c.append(col[m])
+                v.append(w)
+        X = sp.csr_matrix((v, (r, c)), shape=(len(visitors), len(museums)))
+        C = (X.T @ X).tocoo()
+        with self._lock:
+            self._reset()
+            for u in visitors:
+                self._weights[u] = dict(weights[u])
+            for i, j, d in zip(C.row, C.col, C.data):
+                if i == j:
+                    self._norms[museums[i]] = float(d)
+                else:
+                    self._dots[museums[i]][museums[j]] = float(d)
+            self._dirty = set(museums)
+
+    def _adjust(self, visitor, museum, delta):
+        items = self._weights[visitor]
+        old = items.get(museum, 0.0)
+        new = old + delta
+        if abs(new) < 1e-9:
+            new = 0.0
+        for other, w in items.items():
+            if other == museum:
+                continue
+            d = self._dots[museum].get(other, 0.0) + (new - old) * w
+            if abs(d) < 1e-9:
+                self._dots[museum].pop(other, None)
+                self._dots[other].pop(museum, None)
+            else:
+                self._dots[museum][other] = d
+                self._dots[other][museum] = d
+            self._dirty.add(other)
+        self._norms[museum] = max(self._norms[museum] + new * new - old * old, 0.0)
+        self._dirty.add(museum)
+        # Every similarity to `museum` divides by its norm, so neighbours
+        # reached only through other visitors are stale too.
+        self._dirty.update(self._dots.get(museum, ()))
+        if new:
+            items[museum] = new
+        else:
+            items.pop(museum, None)
+            if not items:
+                del self._weights[visitor]
+
+    def apply(self, old, new):
+        with self._lock:
+            if old is not None:
+                w = interaction_weight(old)
+                if w:
+                    self._adjust(_visitor(old), old['Museum'], -w)
+            if new is not None:
+                w = interaction_weight(new)
+                if w:
+                    self._adjust(_visitor(new), new['Museum'], w)
+
+    # Queries
+
+    def _neighbours(self, museum):
+        if museum in self._dirty or museum not in self._top:
+            norm = self._norms.get(museum, 0.0)
+            if norm > 0:
+                a = self.alpha
+                sims = (
+                    (d / (norm ** a * self._norms[other] ** (1 - a)), other)
+                    for other, d in self._dots.get(museum, {}).items()
+                    if self._norms.get(other, 0.0) > 0
+                )
+                self._top[museum] = heapq.nlargest(self.neighbours, sims)
+            else:
+                self._top[museum] = []
+            self._dirty.discard(museum)
+        return self._top[museum]
+
+    def similar(self, museum, n=10):
+        self._refresh()
+        with self._lock:
+            return [(m, s) for s, m in self._neighbours(museum)[:n]]
+
+    def recommend(self, email, n=10):
+        """[(museum, score)] for a visitor, excluding museums they already booked."""
+        self._refresh()
+        visitor = (email or '').strip().lower()
+        with self._lock:
+            items = self._weights.get(visitor)
+            if not items:
+                return []
+            scores = defaultdict(float)
+            for museum, w in items.items():
+                for sim, other in self._neighbours(museum):
+                    if other not in items:
+                        scores[other] += w * sim
+        return heapq.nlargest(n, scores.items(), key=lambda kv: (kv[1], kv[0]))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "visitors": len(self._weights),
+                "museums": sum(1 for v in self._norms.values() if v > 0),
+                "pairs": sum(len(d) for d in self._dots.values()) // 2,
+                "stale_neighbour_lists": len(self._dirty),
+            }
+
+
+def precision_at_k(rows, k=10, neighbours=20, alpha=0.8, seed=0):
+    """
+    Offline leave-one-out evaluation: for every visitor with at least two
+    museums, hide one of them, train on everything else and check whether
+    it comes back in the top `k`. Returns precision@k and hit rate, plus a
+    most-popular baseline for comparison.
+    """
+    rng = random.Random(seed)
+    rows = [r for r in rows if interaction_weight(r)]
+    by_visitor = defaultdict(set)
+    for r in rows:
+        by_visitor[_visitor(r)].add(r['Museum'])
+    held_out = {
+        v: rng.choice(sorted(museums)) for v, museums in by_visitor.items() if len(museums) >= 2
+    }
+    train = [r for r in rows if held_out.get(_visitor(r)) != r['Museum']]
+
+    model = ItemItemRecommender(neighbours=neighbours, alpha=alpha)
+    model.rebuild(train)
+    popularity = defaultdict(float)
+    for r in train:
+        popularity[r['Museum']] += interaction_weight(r)
+    ranked = [m for m, _ in sorted(popularity.items(), key=lambda kv: -kv[1])]
+    seen = defaultdict(set)
+    for r in train:
+        seen[_visitor(r)].add(r['Museum'])
+
+    hits = baseline_hits = 0
+    for visitor, target in held_out.items():
+        recs = [m for m, _ in model.recommend(visitor, k)]
+        hits += target in recs
+        baseline = [m for m in ranked if m not in seen[visitor]][:k]
+        baseline_hits += target in baseline
+    users = len(held_out)
+    return {
+        "users": users,
+        "k": k,
+        "precision_at_k": hits / (users * k) if users else 0.0,
+        "hit_rate": hits / users if users else 0.0,
+        "popularity_precision_at_k": baseline_hits / (users * k) if users else 0.0,
+        "popularity_hit_rate": baseline_hits / users if users else 0.0,
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    from booking_store import BookingStore
+
+    parser = argparse.ArgumentParser(description="Offline precision@k for the item-item recommender")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--neighbours", type=int, default=20)
+    parser.add_argument("--alpha", type=float, default=0.8)
+    args = parser.parse_args()
+    store = BookingStore("bookingDB")
+    print(json.dumps(precision_at_k(store.rows(), k=args.k, neighbours=args.neighbours, alpha=args.alpha), indent=2))
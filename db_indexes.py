@@ -0,0 +1,104 @@
+import sys
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+# Indexes each collection needs, keyed by the routes that rely on them.
+INDEXES = {
+    "bookings": [
+        ([("TicketID", ASCENDING)], {"name": "ticket_id_unique", "unique": True}),
+        ([("Date", ASCENDING), ("Time", ASCENDING)], {"name": "date_time"}),
+        ([("VisitorEmail", ASCENDING), ("_id", ASCENDING)], {"name": "visitor_email_id"}),
+    ],
+    "users": [
+        ([("username", ASCENDING)], {"name": "username_unique", "unique": True}),
+        ([("email", ASCENDING)], {"name": "email_unique", "unique": True}),
+    ],
+    "admins": [
+        ([("username", ASCENDING)], {"name": "username_unique", "unique": True}),
+    ],
+    "passkeys": [
+        ([("passkey", ASCENDING)], {"name": "passkey_unique", "unique": True}),
+    ],
+    "ratings": [
+        # Keyset pages sort and seek on (created_at, _id).
+        ([("created_at", DESCENDING), ("_id", DESCENDING)], {"name": "created_at_id_desc"}),
+    ],
+    "slots": [
+        ([("Museum", ASCENDING), ("Date", ASCENDING)], {"name": "museum_date"}),
+    ],
+}
+
+# Every selective query shape app.py issues: (collection, filter, sort).
+# Full-catalog reads of `museums` are deliberate scans and are not listed.
+QUERY_SHAPES = [
+    ("bookings", {"TicketID": "00000000"}, None),
+    ("bookings", {"Date": "2000-01-01", "Time": "10:00"}, None),
+    ("bookings", {"VisitorEmail": "probe@example.com"}, [("_id", ASCENDING)]),
+    ("users", {"username": "probe"}, None),
+    ("users", {"email": "probe@example.com"}, None),
+    ("admins", {"username": "probe"}, None),
+    ("passkeys", {"passkey": "probe"}, None),
+    ("ratings", {}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("ratings", {"$or": [{"created_at": {"$lt": datetime(2000, 1, 1)}},
+                         {"created_at": datetime(2000, 1, 1), "_id": {"$lt": ObjectId("0" * 24)}},
+                         {"created_at": None}]},
+     [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("slots", {"Museum": "probe", "Date": {"$gte": "2000-01-01", "$lte": "2000-01-31"}}, None),
+]
+
+
+def ensure_indexes(db):
+    """Create any missing indexes. Safe to run on every startup."""
+    for collection, specs in INDEXES.items():
+        for keys, options in specs:
+            try:
+                db[collection].create_index(keys, **options)
+            except OperationFailure as e:
+                # Typically duplicate values blocking a unique index.
+                print(f"Warning: could not create index {options.get('name')} on {collection}: {e}")
+
+
+def _stages(plan):
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+def collscan_shapes(db, shapes=QUERY_SHAPES):
+    """
+    Return the query shapes whose winning plan contains a COLLSCAN, or an
+    in-memory SORT for shapes with a sort the index should provide.
+    """
+    failures = []
+    for collection, filter, sort in shapes:
+        cursor = db[collection].find(filter)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        stages = set(_stages(plan))
+        if "COLLSCAN" in stages or (sort and "SORT" in stages):
+            failures.append((collection, filter, sort))
+    return failures
+
+
+if __name__ == '__main__':
+    from db_utils import get_db
+
+    db = get_db()
+    ensure_indexes(db)
+    if '--check' in sys.argv:
+        failures = collscan_shapes(db)
+        for collection, filter, sort in failures:
+            print(f"COLLSCAN/SORT: {collection}.find({filter}){f'.sort({sort})' if sort else ''}")
+        if failures:
+            sys.exit(1)
+        print(f"OK: all {len(QUERY_SHAPES)} query shapes use an index")
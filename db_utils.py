@@ -1,21 +1,106 @@
+import os
+import threading
+import time
+
 from pymongo import MongoClient
 from werkzeug.security import generate_password_hash, check_password_hash
 
-MONGO_URI = "mongodb://localhost:27017"
-DB_NAME = "museum_db"
+MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("MONGO_DB_NAME", "museum_db")
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", 50))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", 0))
+MONGO_TIMEOUT_MS = int(os.environ.get("MONGO_TIMEOUT_MS", 2000))
+MONGO_HEALTH_INTERVAL = float(os.environ.get("MONGO_HEALTH_INTERVAL", 5))
 
 _client = None
+_client_pid = None
+_client_lock = threading.Lock()
+_on_up_callbacks = []
+_health = {"up": None, "checked_at": None, "error": None}
+
+
+class MongoUnavailable(Exception):
+    pass
+
+
+def _ping(client):
+    try:
+        client.admin.command('ping')
+        return True, None
+    except Exception as e:
+        return False, str(e)
+
+
+def _monitor(client, pid):
+    """Ping MongoDB in the background and publish up/down for routes to read."""
+    while _client is client and os.getpid() == pid:
+        was_up = _health["up"]
+        up, error = _ping(client)
+        _health.update(up=up, error=error, checked_at=time.time())
+        if up and not was_up:
+            for callback in list(_on_up_callbacks):
+                try:
+                    callback(client[DB_NAME])
+                except Exception as e:
+                    print(f"Warning: MongoDB on-connect hook failed: {e}")
+        elif was_up and not up:
+            print(f"Warning: MongoDB became unreachable: {error}")
+        time.sleep(MONGO_HEALTH_INTERVAL)
+
+
+def get_client():
+    """
+    Lazily created, per-process MongoClient.
+
+    Construction does not touch the network (`connect=False`), and a
+    forked worker gets its own client and health monitor instead of
+    reusing the parent's sockets.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = MongoClient(
+                    MONGO_URI,
+                    connect=False,
+                    maxPoolSize=MONGO_MAX_POOL_SIZE,
+                    minPoolSize=MONGO_MIN_POOL_SIZE,
+                    serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+                    connectTimeoutMS=MONGO_TIMEOUT_MS,
+                )
+                _client_pid = pid
+                _health.update(up=None, checked_at=None, error=None)
+                threading.Thread(
+                    target=_monitor, args=(_client, pid), name="mongo-health", daemon=True
+                ).start()
+    return _client
+
+
+def mongo_status():
+    return dict(_health)
+
+
+def on_mongo_up(callback):
+    """Run `callback(db)` every time the health monitor sees MongoDB come up."""
+    _on_up_callbacks.append(callback)
+    client = get_client()
+    if _health["up"]:
+        callback(client[DB_NAME])
+
 
 def get_db():
-    global _client
-    if _client is None:
-        try:
-            _client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-            _client.admin.command('ping')
-        except Exception as e:
-            print(f"Failed to connect to MongoDB: {e}")
-            raise Exception("Could not connect to MongoDB. Please ensure MongoDB is running.")
-    return _client[DB_NAME]
+    """
+    Return the application database.
+
+    Raises MongoUnavailable immediately while the health monitor reports
+    MongoDB as down, so callers drop to their CSV/JSON fallback without
+    waiting for a server-selection timeout.
+    """
+    client = get_client()
+    if _health["up"] is False:
+        raise MongoUnavailable(f"MongoDB is unavailable: {_health['error']}")
+    return client[DB_NAME]
 
 def create_user(username, email, password):
     """Create a new user with hashed password"""
@@ -0,0 +1,115 @@
+import csv
+import io
+import json
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+CHUNK_ROWS = 1000
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def _chunks(rows, size=CHUNK_ROWS):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def csv_stream(rows, columns):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    # Emit the header straight away so the client sees the first byte
+    # before the underlying query has produced anything.
+    yield buf.getvalue()
+    for chunk in _chunks(rows):
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows([[_cell(r.get(c)) for c in columns] for r in chunk])
+        yield buf.getvalue()
+
+
+def ndjson_stream(rows, columns):
+    for chunk in _chunks(rows):
+        yield ''.join(
+            json.dumps({c: r.get(c) for c in columns}, default=_cell, ensure_ascii=False) + '\n'
+            for r in chunk
+        )
+
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def parquet_stream(rows, columns):
+    """One Parquet row group per chunk; every value is written as a string column."""
+    schema = pa.schema([(c, pa.string()) for c in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for chunk in _chunks(rows):
+        table = pa.Table.from_pydict(
+            {c: [_cell(r.get(c)) for r in chunk] for c in columns}, schema=schema
+        )
+        writer.write_table(table)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def export_stream(rows, columns, fmt):
+    if fmt == 'csv':
+        return csv_stream(rows, columns)
+    if fmt == 'ndjson':
+        return ndjson_stream(rows, columns)
+    if fmt == 'parquet':
+        if pa is None:
+            raise ValueError("Parquet export requires pyarrow to be installed")
+        return parquet_stream(rows, columns)
+    raise ValueError(f"Unsupported export format: {fmt}")
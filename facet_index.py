@@ -0,0 +1,91 @@
+import numpy as np
+
+FACET_FIELDS = ('City', 'State', 'Type')
+
+try:
+    _popcount = int.bit_count
+except AttributeError:   # Python < 3.10
+    def _popcount(bits):
+        return bin(bits).count("1")
+
+
+def bitmap_of(ids, size):
+    """Bitmap (Python int, bit i = document i) with the given document ids set."""
+    flags = np.zeros(size, dtype=bool)
+    flags[list(ids)] = True
+    return int.from_bytes(np.packbits(flags, bitorder="little").tobytes(), "little")
+
+
+def ids_of(bits, size):
+    """Sorted document ids set in `bits`."""
+    if not bits:
+        return np.empty(0, dtype=np.intp)
+    raw = np.frombuffer(bits.to_bytes((size + 7) // 8, "little"), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(raw, bitorder="little")[:size])
+
+
+class FacetIndex:
+    """
+    One bitmap per City, State and Type value, built once per catalog
+    snapshot. Document ids are positions in the snapshot's records.
+
+    A selection is {field: [values]}: values of one field are OR'ed and
+    fields are AND'ed, each a single big-int operation. Facet counts are
+    disjunctive: a field's counts apply every filter except its own, so
+    the visitor can see what switching or adding a value would give.
+    """
+
+    def __init__(self, records, fields=FACET_FIELDS):
+        self.size = len(records)
+        self.fields = fields
+        self.all = (1 << self.size) - 1
+        ids = {field: {} for field in fields}
+        for i, record in enumerate(records):
+            for field in fields:
+                value = record.get(field)
+                if value:
+                    ids[field].setdefault(value, []).append(i)
+        self.bitmaps = {
+            # Mongo documents can mix value types (e.g. a numeric City).
+            field: {value: bitmap_of(docs, self.size)
+                    for value, docs in sorted(values.items(), key=lambda kv: str(kv[0]))}
+            for field, values in ids.items()
+        }
+
+    def values(self, field):
+        return list(self.bitmaps[field])
+
+    def _field_bits(self, field, values):
+        bitmaps = self.bitmaps[field]
+        bits = 0
+        for value in values:
+            bits |= bitmaps.get(value, 0)
+        return bits
+
+    def select(self, selection, base=None):
+        """Bitmap of documents matching every field of `selection` (and `base`, if given)."""
+        bits = self.all if base is None else base
+        for field, values in selection.items():
+            if values:
+                bits &= self._field_bits(field, values)
+        return bits
+
+    def counts(self, selection, base=None):
+        """{field: {value: count}} for the selection, leaving out values with no matches."""
+        out = {}
+        for field in self.fields:
+            others = {f: v for f, v in selection.items() if f != field}
+            bits = self.select(others, base)
+            out[field] = {
+                value: n for value, bitmap in self.bitmaps[field].items() if (n := _popcount(bits & bitmap))
+            }
+        return out
+
+    def bitmap(self, ids):
+        return bitmap_of(ids, self.size)
+
+    def ids(self, bits):
+        return ids_of(bits, self.size)
+
+    def count(self, bits):
+        return _popcount(bits)
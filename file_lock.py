@@ -0,0 +1,30 @@
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path, blocking=True):
+    """
+    Exclusive advisory lock on `path`, shared by every worker process on
+    this host. Yields True if the lock is held, False if `blocking` is off
+    and another process holds it. On platforms without fcntl this is a
+    no-op that always yields True.
+    """
+    if fcntl is None:
+        yield True
+        return
+    with open(path, 'a') as lock_file:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(lock_file, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,175 @@
+import re
+import unicodedata
+from collections import Counter
+
+# Trigrams present in more than this share of keys ("mus", "use", ...) carry
+# almost no signal and have the longest postings; they are skipped when
+# counting overlaps unless the query has nothing rarer.
+COMMON_TRIGRAM_SHARE = 0.05
+# Candidates (by trigram overlap) that get the exact edit-distance check.
+RERANK_CANDIDATES = 200
+MIN_QUERY_LENGTH = 4
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def compact(text):
+    """Lower-cased ASCII with spaces and punctuation removed ("Salar Jung" -> "salarjung")."""
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode("ascii")
+    return _NON_ALNUM.sub("", text.lower())
+
+
+def trigrams(key):
+    if len(key) < 3:
+        return {key} if key else set()
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+def default_max_edits(query):
+    """One typo per four characters, at least one, at most three."""
+    return max(1, min(3, len(query) // 4))
+
+
+def _peq(query):
+    masks = {}
+    for i, ch in enumerate(query):
+        masks[ch] = masks.get(ch, 0) | (1 << i)
+    return masks
+
+
+def infix_distance(query, target, bound, peq=None):
+    """
+    Fewest edits turning `query` into some substring of `target`, or None if
+    that exceeds `bound`. Myers' bit-parallel algorithm: one column of the
+    edit-distance table per target character, as a few operations on
+    len(query)-bit integers. `peq` is _peq(query), if already at hand.
+    """
+    m = len(query)
+    if not m:
+        return 0
+    if len(target) < m - bound:
+        return None
+    peq = peq if peq is not None else _peq(query)
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv, mv, score = mask, 0, m
+    best = m
+    for ch in target:
+        eq = peq.get(ch, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        if score < best:
+            best = score
+        # A match may start anywhere, so the top row stays zero: shift in 0.
+        ph = (ph << 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+    return best if best <= bound else None
+
+
+class TrigramIndex:
+    """
+    Typo-tolerant lookup of short strings (museum names, cities).
+
+    Each string is compacted (lower case, no spaces or punctuation) so
+    "Salarjung" and "Salar Jung" meet, and its character trigrams go into an
+    inverted index. A query counts trigram overlaps through the postings,
+    keeps the keys that could still be within `max_edits` (an edit destroys
+    at most three trigrams), and reranks the best RERANK_CANDIDATES by
+    `infix_distance`, so "Kolkatta" finds "Kolkata" and "Victorial memorial"
+    finds "Victoria Memorial" without comparing against every key.
+
+    `add(text, value)` may be called many times for one text; lookups
+    return the values of each matching key.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.values = []
+        self._key_id = {}
+        self._postings = {}
+
+    def add(self, text, value):
+        key = compact(text)
+        if not key:
+            return
+        kid = self._key_id.get(key)
+        if kid is None:
+            kid = self._key_id[key] = len(self.keys)
+            self.keys.append(key)
+            self.values.append([])
+            for gram in trigrams(key):
+                self._postings.setdefault(gram, []).append(kid)
+        self.values[kid].append(value)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def candidates(self, query, max_edits):
+        """
+        [(key id, fewest edits its trigram overlap allows)] for up to
+        RERANK_CANDIDATES keys, most promising first.
+        """
+        grams = trigrams(query)
+        lists = [self._postings[g] for g in grams if g in self._postings]
+        limit = max(1, int(COMMON_TRIGRAM_SHARE * len(self.keys)))
+        rare = [p for p in lists if len(p) <= limit]
+        # Skipped common grams may be among the ones a match shares.
+        counted = len(grams) - (len(lists) - len(rare) if rare else 0)
+        needed = max(1, counted - 3 * max_edits)
+        counts = Counter()
+        for p in rare or lists:
+            counts.update(p)
+        return [(kid, -(-(counted - n) // 3)) for kid, n in counts.most_common(RERANK_CANDIDATES) if n >= needed]
+
+    def lookup(self, text, limit=5, max_edits=None):
+        """
+        [(value, distance)] for the closest keys, best first: fewest edits,
+        then the key nearest in length to the query, then insertion order.
+        """
+        query = compact(text)
+        if len(query) < MIN_QUERY_LENGTH or limit <= 0:
+            return []
+        if max_edits is None:
+            max_edits = default_max_edits(query)
+        scored = []
+        bound = max_edits
+        peq = _peq(query)
+        for kid, fewest in self.candidates(query, max_edits):
+            # Candidates come by falling overlap, so once the overlap alone
+            # rules out beating the current `limit` best, nothing later can.
+            if fewest > bound:
+                break
+            key = self.keys[kid]
+            distance = infix_distance(query, key, bound, peq)
+            if distance is not None:
+                scored.append((distance, abs(len(key) - len(query)), kid))
+                if len(scored) >= limit:
+                    scored.sort()
+                    del scored[limit:]
+                    bound = scored[-1][0]
+        scored.sort()
+        out = []
+        for distance, _, kid in scored:
+            for value in self.values[kid]:
+                out.append((value, distance))
+                if len(out) == limit:
+                    return out
+        return out
+
+
+def build_catalog_index(records, columns=('Name', 'City')):
+    """TrigramIndex over the given columns; values are (record index, column)."""
+    index = TrigramIndex()
+    for i, record in enumerate(records):
+        for column in columns:
+            if record.get(column):
+                index.add(record[column], (i, column))
+    return index
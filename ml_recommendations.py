@@ -1,87 +1,487 @@
-import random
+import hashlib
+import json
+import os
+import threading
 from math import radians, sin, cos, sqrt, atan2
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
+from sklearn.decomposition import TruncatedSVD
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from db_utils import get_db
+from catalog import museum_catalog
+from popularity import museum_popularity
+from spatial_index import SpatialIndex
 
-db = get_db()
-museums = db.museums
+INDEX_DIR = os.environ.get('RECOMMENDER_CACHE_DIR', '.recommender_cache')
+RESULT_COLUMNS = ["Name","City","State","Category","Type","Latitude","Longitude"]
+LSA_COMPONENTS = int(os.environ.get('LSA_COMPONENTS', 64))
+
+# Visitor words that never appear in the catalog text, mapped onto the
+# catalog's own vocabulary before a query is embedded.
+QUERY_SYNONYMS = {
+    "painting": "art gallery", "paintings": "art gallery", "sculpture": "art",
+    "sculptures": "art", "artwork": "art", "artworks": "art",
+    "dinosaur": "natural history", "dinosaurs": "natural history", "fossils": "natural history",
+    "animals": "natural history", "wildlife": "natural history",
+    "war": "military", "weapons": "military", "army": "military",
+    "ships": "maritime", "naval": "maritime", "navy": "maritime", "sea": "maritime",
+    "trains": "railway transport", "railways": "railway transport", "cars": "transport",
+    "aircraft": "aviation transport", "planes": "aviation transport",
+    "coins": "numismatics", "currency": "numismatics",
+    "temples": "religious", "temple": "religious", "spiritual": "religious",
+    "tribes": "tribal ethnographic", "tribal": "tribal ethnographic",
+    "fabric": "textile", "fabrics": "textile", "sarees": "textile",
+    "ancient": "archaeology history", "ruins": "archaeology", "excavation": "archaeology",
+    "kings": "palace history", "royal": "palace", "forts": "fort",
+    "technology": "science", "space": "science", "physics": "science",
+}
+
+EARTH_RADIUS_KM = 6371.0
+NEARBY_COLUMNS = ["Name","City","State","Category","Type","Latitude","Longitude"]
 
 def _haversine_km(lat1, lon1, lat2, lon2):
-    R = 6371.0
+    R = EARTH_RADIUS_KM
     dlat = radians(float(lat2) - float(lat1))
     dlon = radians(float(lon2) - float(lon1))
     a = sin(dlat/2)**2 + cos(radians(float(lat1))) * cos(radians(float(lat2))) * sin(dlon/2)**2
     return R * 2 * atan2(sqrt(a), sqrt(1-a))
 
-def _to_df():
-    docs = list(museums.find({}, {"_id": 0}))
-    if not docs:
-        return pd.DataFrame(columns=["Name","City","State","Type","Category","Latitude","Longitude"])
-    return pd.DataFrame(docs)
+def expand_query(query):
+    words = str(query).lower().split()
+    return " ".join(words + [QUERY_SYNONYMS[w] for w in words if w in QUERY_SYNONYMS])
 
-def personalized_suggestions(interests, top_n=8):
-    """
-    interests: list like ["Art","History","Science"]
-    Scans Type/Category text using TF-IDF and returns best matches.
-    """
-    df = _to_df()
-    if df.empty:
-        return []
+def _top_indices(sims, k):
+    """Indices of the `k` largest scores, best first (ties by position)."""
+    n = len(sims)
+    if k < n:
+        idx = np.sort(np.argpartition(-sims, k - 1)[:k])
+    else:
+        idx = np.arange(n)
+    return idx[np.argsort(-sims[idx], kind="stable")].tolist()
 
+def _document_text(df):
     text = (df.get("Category").fillna("")
-            if "Category" in df else pd.Series([""]*len(df)))
+            if "Category" in df else pd.Series([""]*len(df), index=df.index))
+    if "Name" in df:
+        text = (text.astype(str) + " " + df["Name"].fillna("").astype(str))
     if "Type" in df:
         text = (text.astype(str) + " " + df["Type"].fillna("").astype(str))
     if "City" in df:
         text = (text.astype(str) + " " + df["City"].fillna("").astype(str))
     if "State" in df:
         text = (text.astype(str) + " " + df["State"].fillna("").astype(str))
+    return text.astype(str).tolist()
+
+
+class TfidfIndex:
+    """
+    Fitted TF-IDF vectorizer plus the L2-normalised document matrix for
+    one version of the museum catalog.
+
+    `fingerprint` hashes the indexed text, so a saved index is reused
+    until the catalog actually changes.
+    """
+
+    def __init__(self, vectorizer, matrix, records, fingerprint):
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.records = records
+        self.fingerprint = fingerprint
+
+    @staticmethod
+    def fingerprint_of(texts):
+        h = hashlib.sha1()
+        for t in texts:
+            h.update(t.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    @classmethod
+    def build(cls, df, index_dir=INDEX_DIR):
+        """Load the saved index for this catalog, or fit and save a new one."""
+        texts = _document_text(df)
+        fingerprint = cls.fingerprint_of(texts)
+        cols = [c for c in RESULT_COLUMNS if c in df.columns]
+        records = df[cols].to_dict(orient="records")
+        if not records:
+            return cls(None, sp.csr_matrix((0, 0)), records, fingerprint)
+        index = cls._load(index_dir, fingerprint, records)
+        if index is None:
+            vectorizer = TfidfVectorizer(stop_words="english")
+            matrix = vectorizer.fit_transform(texts).tocsr()
+            index = cls(vectorizer, matrix, records, fingerprint)
+            try:
+                index._save(index_dir)
+            except OSError as e:
+                print(f"Warning: could not save TF-IDF index: {e}")
+        return index
+
+    @staticmethod
+    def _paths(index_dir, fingerprint):
+        base = os.path.join(index_dir, f"tfidf-{fingerprint}")
+        return f"{base}.json", f"{base}.npz"
+
+    @classmethod
+    def _load(cls, index_dir, fingerprint, records):
+        meta_path, matrix_path = cls._paths(index_dir, fingerprint)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            matrix = sp.load_npz(matrix_path).tocsr()
+        except (OSError, ValueError):
+            return None
+        if matrix.shape[0] != len(records):
+            return None
+        vectorizer = TfidfVectorizer(stop_words="english", vocabulary=meta["vocabulary"])
+        vectorizer.idf_ = np.asarray(meta["idf"], dtype=np.float64)
+        return cls(vectorizer, matrix, records, fingerprint)
+
+    def _save(self, index_dir):
+        os.makedirs(index_dir, exist_ok=True)
+        meta_path, matrix_path = self._paths(index_dir, self.fingerprint)
+        meta = {
+            "vocabulary": {t: int(i) for t, i in self.vectorizer.vocabulary_.items()},
+            "idf": self.vectorizer.idf_.tolist(),
+        }
+        # Write both files under temporary names first so a reader never
+        # pairs a new vocabulary with an old matrix.
+        sp.save_npz(f"{matrix_path}.tmp.npz", self.matrix)
+        with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(f"{matrix_path}.tmp.npz", matrix_path)
+        os.replace(f"{meta_path}.tmp", meta_path)
+        keep = {os.path.basename(meta_path), os.path.basename(matrix_path)}
+        for name in os.listdir(index_dir):
+            if name.startswith("tfidf-") and name not in keep:
+                try:
+                    os.remove(os.path.join(index_dir, name))
+                except OSError:
+                    pass
+
+    def top_k(self, query, k):
+        """Indices of the `k` best-matching documents, best first."""
+        n = self.matrix.shape[0]
+        if n == 0 or k <= 0:
+            return []
+        # Rows and query are both L2-normalised, so the dot product is the cosine.
+        sims = (self.matrix @ self.vectorizer.transform([query]).T).toarray().ravel()
+        return _top_indices(sims, k)
+
 
-    vectorizer = TfidfVectorizer(stop_words="english")
-    X = vectorizer.fit_transform(text.astype(str).tolist())
+class LsaIndex:
+    """
+    Latent semantic embeddings of the catalog: TruncatedSVD over the TF-IDF
+    matrix, one L2-normalised float32 row per museum in a single contiguous
+    array. Museums that share no token but whose words co-occur elsewhere
+    in the catalog still land close together.
+
+    Saved next to the TF-IDF index under the same fingerprint.
+    """
+
+    def __init__(self, tfidf, components, vectors):
+        self.tfidf = tfidf
+        self.components = components    # (dims, vocabulary) float32
+        self.vectors = vectors          # (museums, dims) float32, unit rows
+        self.position = {}
+        for i, record in enumerate(tfidf.records):
+            self.position.setdefault(record.get("Name"), i)
+
+    @classmethod
+    def build(cls, tfidf, dims=LSA_COMPONENTS, index_dir=INDEX_DIR):
+        n_docs, n_terms = tfidf.matrix.shape
+        dims = min(dims, n_docs - 1, n_terms - 1)
+        if dims < 1:
+            return None
+        path = os.path.join(index_dir, f"lsa-{tfidf.fingerprint}-{dims}.npz")
+        try:
+            with np.load(path) as saved:
+                index = cls(tfidf, saved["components"], saved["vectors"])
+            if index.vectors.shape == (n_docs, dims) and index.components.shape == (dims, n_terms):
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+        svd = TruncatedSVD(n_components=dims, random_state=42)
+        vectors = svd.fit_transform(tfidf.matrix)
+        index = cls(tfidf, svd.components_.astype(np.float32), cls._normalise(vectors))
+        try:
+            index._save(path)
+        except OSError as e:
+            print(f"Warning: could not save LSA index: {e}")
+        return index
+
+    @staticmethod
+    def _normalise(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.ascontiguousarray(vectors / np.where(norms > 0, norms, 1))
+
+    def _save(self, path):
+        index_dir = os.path.dirname(path)
+        os.makedirs(index_dir, exist_ok=True)
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez(f, components=self.components, vectors=self.vectors)
+        os.replace(f"{path}.tmp", path)
+        for name in os.listdir(index_dir):
+            if name.startswith("lsa-") and name != os.path.basename(path):
+                try:
+                    os.remove(os.path.join(index_dir, name))
+                except OSError:
+                    pass
+
+    def embed(self, query):
+        """Unit float32 vector for free text (all zeros if no word is known)."""
+        return self.embed_many([query])[0]
+
+    def embed_many(self, queries):
+        """Unit float32 rows for many queries: one sparse x dense product."""
+        x = self.tfidf.vectorizer.transform([expand_query(q) for q in queries])
+        return self._normalise(x @ self.components.T)
 
-    query = " ".join(interests) if interests else "museum art history science"
-    qv = vectorizer.transform([query])
+    def top_k(self, query, k):
+        """Indices of the `k` museums closest to `query`, best first."""
+        if k <= 0:
+            return []
+        v = self.embed(query)
+        if not v.any():
+            return []
+        return _top_indices(self.vectors @ v, k)
 
-    sims = cosine_similarity(qv, X).ravel()
-    df["score"] = sims
-    top = df.sort_values("score", ascending=False).head(top_n)
+    def similar(self, i, k):
+        """[(index, cosine)] for the `k` museums most like museum `i`, excluding it."""
+        if k <= 0:
+            return []
+        sims = self.vectors @ self.vectors[i]
+        sims[i] = -np.inf
+        return [(j, float(sims[j])) for j in _top_indices(sims, min(k, len(sims) - 1))]
 
-    cols = [c for c in ["Name","City","State","Category","Type","Latitude","Longitude"] if c in df.columns]
-    return top[cols].to_dict(orient="records")
 
-def popular_exhibits(top_n=8):
+def _museum_keys(df):
+    if "_id" in df.columns:
+        return df["_id"].astype(str).tolist()
+    return [f"row:{i}" for i in range(len(df))]
+
+
+class MuseumCoordinates:
+    """
+    Museum coordinates as contiguous float64 radian arrays, so distances to
+    every museum come out of one NumPy expression. Rows without usable
+    coordinates are left out.
     """
-    If 'Visitors' column exists, sort by it; else return random top N.
+
+    def __init__(self, df):
+        if "Latitude" in df.columns and "Longitude" in df.columns:
+            lat = pd.to_numeric(df["Latitude"], errors="coerce").to_numpy(dtype=np.float64)
+            lon = pd.to_numeric(df["Longitude"], errors="coerce").to_numpy(dtype=np.float64)
+            keep = np.isfinite(lat) & np.isfinite(lon)
+        else:
+            lat = lon = np.empty(0)
+            keep = np.zeros(len(df), dtype=bool)
+        rows = df[keep]
+        self.keys = [k for k, ok in zip(_museum_keys(df), keep) if ok]
+        self.records = [
+            {k: r.get(k) for k in NEARBY_COLUMNS} for r in rows.to_dict(orient="records")
+        ]
+        self.lat = np.ascontiguousarray(np.radians(lat[keep]))
+        self.lon = np.ascontiguousarray(np.radians(lon[keep]))
+        self.cos_lat = np.cos(self.lat)
+
+    def __len__(self):
+        return len(self.records)
+
+    def distances_km(self, lat, lon):
+        """Great-circle distance from one point to every museum."""
+        lat, lon = radians(float(lat)), radians(float(lon))
+        a = (np.sin((self.lat - lat) / 2) ** 2
+             + cos(lat) * self.cos_lat * np.sin((self.lon - lon) / 2) ** 2)
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def distance_matrix_km(self, lats, lons):
+        """Distances from many points at once: shape (len(lats), len(self))."""
+        lat = np.radians(np.asarray(lats, dtype=np.float64))[:, None]
+        lon = np.radians(np.asarray(lons, dtype=np.float64))[:, None]
+        a = (np.sin((self.lat - lat) / 2) ** 2
+             + np.cos(lat) * self.cos_lat * np.sin((self.lon - lon) / 2) ** 2)
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def within(self, distances, radius_km, top_n):
+        """Records for the `top_n` closest entries of `distances` inside the radius."""
+        idx = np.flatnonzero(distances <= radius_km)
+        if top_n < len(idx):
+            idx = idx[np.argpartition(distances[idx], top_n - 1)[:top_n]]
+        idx = idx[np.argsort(distances[idx], kind="stable")]
+        out = []
+        for i in idx:
+            item = dict(self.records[i])
+            item["distance_km"] = round(float(distances[i]), 1)
+            out.append(item)
+        return out
+
+
+class RecommenderIndexes:
     """
-    df = _to_df()
+    The search structures for one catalog snapshot, swapped as a unit so a
+    request can pin everything it reads to a single version. None of them
+    is changed after construction.
+    """
+
+    def __init__(self, snapshot, tfidf, coordinates, spatial, lsa=None):
+        self.snapshot = snapshot
+        self.version = snapshot.version
+        self.tfidf = tfidf
+        self.lsa = lsa
+        self.coordinates = coordinates
+        self.spatial = spatial
+
+
+_indexes = None
+_index_lock = threading.RLock()
+
+
+def _on_catalog_change(snapshot, change=None):
+    """
+    Catalog listener: rebuild the search structures for a new snapshot.
+    The TF-IDF and LSA fits are reused from disk when the text is unchanged.
+    """
+    global _indexes
+    with _index_lock:
+        df = snapshot.frame
+        tfidf = TfidfIndex.build(df)
+        lsa = LsaIndex.build(tfidf)
+        coordinates = MuseumCoordinates(df)
+        spatial = SpatialIndex()
+        spatial.build(zip(
+            coordinates.keys, np.degrees(coordinates.lat), np.degrees(coordinates.lon), coordinates.records
+        ))
+        _indexes = RecommenderIndexes(snapshot, tfidf, coordinates, spatial, lsa)
+
+
+museum_catalog.subscribe(_on_catalog_change)
+
+
+def current_indexes():
+    """Indexes for the current catalog snapshot, building them on first use."""
+    snapshot = museum_catalog.snapshot()
+    indexes = _indexes
+    if indexes is None or indexes.version != snapshot.version:
+        with _index_lock:
+            if _indexes is None or _indexes.version != snapshot.version:
+                _on_catalog_change(snapshot)
+            indexes = _indexes
+    return indexes
+
+
+def personalized_suggestions(interests, top_n=8, indexes=None):
+    """
+    interests: list like ["Art","History","Science"]
+    Ranks museums by LSA similarity to the interests, so related words
+    match too; falls back to exact TF-IDF terms if the embedding finds nothing.
+    """
+    indexes = indexes or current_indexes()
+    index = indexes.tfidf
+    if not index.records:
+        return []
+    query = _interest_query(interests)
+    hits = indexes.lsa.top_k(query, top_n) if indexes.lsa is not None else []
+    if not hits:
+        hits = index.top_k(expand_query(query), top_n)
+    return [dict(index.records[i]) for i in hits]
+
+def _interest_query(interests):
+    return " ".join(interests) if interests else "museum art history science"
+
+def batch_personalized_suggestions(interest_lists, top_n=8, indexes=None, chunk_size=1024):
+    """
+    personalized_suggestions for many interest lists at once. Each chunk
+    of queries is embedded with one sparse x dense product and scored
+    against every museum with one dense product, so memory stays at
+    chunk_size x museums. Yields one result list per input, in order.
+    """
+    indexes = indexes or current_indexes()
+    index, lsa = indexes.tfidf, indexes.lsa
+    interest_lists = list(interest_lists)
+    for start in range(0, len(interest_lists), chunk_size):
+        queries = [_interest_query(i) for i in interest_lists[start:start + chunk_size]]
+        if not index.records:
+            yield from ([] for _ in queries)
+            continue
+        scores = lsa.embed_many(queries) @ lsa.vectors.T if lsa is not None else None
+        for row, query in enumerate(queries):
+            hits = []
+            if scores is not None and scores[row].any():
+                hits = _top_indices(scores[row], top_n)
+            if not hits:
+                hits = index.top_k(expand_query(query), top_n)
+            yield [dict(index.records[i]) for i in hits]
+
+def similar_museums(name, top_n=8, indexes=None):
+    """'More like this': museums closest to `name` in the LSA space, with a similarity score."""
+    indexes = indexes or current_indexes()
+    lsa = indexes.lsa
+    if lsa is None or name not in lsa.position:
+        return []
+    records = indexes.tfidf.records
+    # Over-fetch a little: the catalog can list the same museum more than once.
+    hits = [(j, sim) for j, sim in lsa.similar(lsa.position[name], top_n + 4) if records[j].get("Name") != name]
+    return [{**records[j], "similarity": round(sim, 4)} for j, sim in hits[:top_n]]
+
+def popular_exhibits(top_n=8, indexes=None, state=None, museum_type=None):
+    """
+    Most popular museums by time-decayed booking activity (see popularity.py),
+    optionally within one State or Type. Topped up from the catalog — by
+    'Visitors' if present, else a fixed shuffle — when bookings are sparse.
+    """
+    snapshot = (indexes or current_indexes()).snapshot
+    df = snapshot.frame
     if df.empty:
         return []
+    cols = [c for c in ["Name","City","State","Category","Type","Latitude","Longitude","Visitors"] if c in df.columns]
+    out = []
+    for name, score in museum_popularity.top(top_n, state=state, museum_type=museum_type):
+        record = snapshot.by_name.get(name)
+        if record is not None:
+            item = {c: record.get(c) for c in cols}
+            item["popularity"] = float(f"{score:.4g}")
+            out.append(item)
+    if len(out) >= top_n:
+        return out
+    if state:
+        df = df[df["State"] == state]
+    if museum_type:
+        df = df[df["Type"] == museum_type]
+    df = df[~df["Name"].isin([item["Name"] for item in out])]
     if "Visitors" in df.columns:
-        df["Visitors"] = pd.to_numeric(df["Visitors"], errors="coerce").fillna(0)
-        df = df.sort_values("Visitors", ascending=True if df["Visitors"].max()==0 else False)
+        visitors = pd.to_numeric(df["Visitors"], errors="coerce").fillna(0)
+        df = df.assign(Visitors=visitors).sort_values("Visitors", ascending=visitors.max() == 0)
     else:
         df = df.sample(frac=1, random_state=42)
-    cols = [c for c in ["Name","City","State","Category","Type","Latitude","Longitude","Visitors"] if c in df.columns]
-    return df.head(top_n)[cols].to_dict(orient="records")
+    return out + df.head(top_n - len(out))[cols].to_dict(orient="records")
 
-def nearby_museums(lat, lon, radius_km=25.0, top_n=12):
-    df = _to_df()
-    if df.empty or "Latitude" not in df.columns or "Longitude" not in df.columns:
-        return []
+def nearby_museums(lat, lon, radius_km=25.0, top_n=12, indexes=None):
     out = []
-    for _, r in df.iterrows():
-        try:
-            mlat = float(r["Latitude"])
-            mlon = float(r["Longitude"])
-        except Exception:
-            continue
-        d = _haversine_km(lat, lon, mlat, mlon)
-        if d <= radius_km:
-            item = {k: r.get(k) for k in ["Name","City","State","Category","Type","Latitude","Longitude"]}
-            item["distance_km"] = round(d, 1)
-            out.append(item)
-    out.sort(key=lambda x: x["distance_km"])
-    return out[:top_n]
+    for record, d in (indexes or current_indexes()).spatial.radius(lat, lon, radius_km, limit=top_n):
+        item = dict(record)
+        item["distance_km"] = round(d, 1)
+        out.append(item)
+    return out
+
+
+def nearest_museums(lat, lon, k=10, indexes=None):
+    spatial = (indexes or current_indexes()).spatial
+    return [{**record, "distance_km": round(d, 1)} for record, d in spatial.nearest(lat, lon, k)]
+
+
+def museums_in_bbox(min_lat, min_lon, max_lat, max_lon, indexes=None):
+    spatial = (indexes or current_indexes()).spatial
+    return [dict(r) for r in spatial.bbox(min_lat, min_lon, max_lat, max_lon)]
+
+
+def nearby_museums_batch(points, radius_km=25.0, top_n=12):
+    """nearby_museums for many (lat, lon) points, from one distance matrix."""
+    coords = current_indexes().coordinates
+    if not points:
+        return []
+    if not len(coords):
+        return [[] for _ in points]
+    lats, lons = zip(*points)
+    matrix = coords.distance_matrix_km(lats, lons)
+    return [coords.within(row, radius_km, top_n) for row in matrix]
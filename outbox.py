@@ -0,0 +1,251 @@
+import os
+import random
+import threading
+import time
+
+from bson import json_util
+from bson.errors import InvalidDocument
+from bson.objectid import ObjectId
+from pymongo import ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from file_lock import file_lock
+
+DUPLICATE_KEY = 11000
+
+
+class Outbox:
+    """
+    Durable queue of pending MongoDB writes.
+
+    Routes call `insert`/`update_one`/`update_many`, which append one JSON
+    line to a local file and return immediately. A background flusher
+    drains the file in batches with one `bulk_write` per collection,
+    retrying with exponential backoff while Mongo is unavailable. Every
+    queued operation is idempotent (inserts become upserts on a
+    pre-assigned `_id`, or on the collection's natural key from
+    `natural_keys`, leaving an existing document alone), so a batch that
+    half-applied before a failure is simply replayed.
+
+    Connection and timeout errors are retried. A single write Mongo
+    rejects (a duplicate-key insert counts as already applied) is appended
+    to the dead-letter file (`<path>.dead`) and skipped, so it cannot hold
+    up the writes behind it.
+    """
+
+    def __init__(self, path, get_db, batch_size=500, interval=1.0, max_backoff=60.0, natural_keys=None,
+                 on_flush=None):
+        self.path = path
+        self.offset_path = f"{path}.offset"
+        self.dead_letter_path = f"{path}.dead"
+        self.lock_path = f"{path}.lock"
+        self.flush_lock_path = f"{path}.flush.lock"
+        self.get_db = get_db
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.natural_keys = natural_keys or {}
+        # Called with the set of collections each flushed batch wrote to.
+        self.on_flush = on_flush
+
+        self.last_error = None
+        self.last_flush_at = None
+        self.flushed_total = 0
+        self.dead_lettered_total = 0
+        self._failures = 0
+        self._wake = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+
+        if not os.path.exists(self.path):
+            open(self.path, 'ab').close()
+
+    def _append(self, entries):
+        data = b''.join(
+            (json_util.dumps(e) + '\n').encode('utf-8') for e in entries
+        )
+        with file_lock(self.lock_path):
+            with open(self.path, 'ab') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        self._wake.set()
+
+    def insert(self, collection, documents):
+        """Queue inserts. Each document gets its `_id` now so replays cannot duplicate it."""
+        entries = []
+        for doc in documents:
+            doc = dict(doc)
+            doc.setdefault('_id', ObjectId())
+            entries.append({"c": collection, "op": "insert", "doc": doc})
+        if entries:
+            self._append(entries)
+
+    def update_one(self, collection, filter, update, upsert=False):
+        self._append([{"c": collection, "op": "update_one", "filter": filter, "update": update, "upsert": upsert}])
+
+    def update_many(self, collection, filter, update):
+        self._append([{"c": collection, "op": "update_many", "filter": filter, "update": update}])
+
+    def _read_offset(self):
+        try:
+            with open(self.offset_path, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _write_offset(self, offset):
+        tmp = f"{self.offset_path}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.offset_path)
+
+    def _read_pending(self, offset, limit=None):
+        entries = []
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            while limit is None or len(entries) < limit:
+                line = f.readline()
+                if not line.endswith(b'\n'):
+                    break
+                offset = f.tell()
+                try:
+                    entries.append(json_util.loads(line))
+                except ValueError:
+                    print("Warning: dropping corrupt outbox entry")
+        return entries, offset
+
+    def depth(self):
+        """Number of queued writes not yet applied to MongoDB."""
+        entries, _ = self._read_pending(self._read_offset())
+        return len(entries)
+
+    def _to_request(self, entry):
+        op = entry["op"]
+        if op == "insert":
+            doc = entry["doc"]
+            key = self.natural_keys.get(entry["c"])
+            if key and doc.get(key) is not None:
+                # The document may already be there under another `_id`
+                # (written before it went through the outbox); keep it.
+                return UpdateOne({key: doc[key]}, {"$setOnInsert": doc}, upsert=True)
+            return ReplaceOne({"_id": doc["_id"]}, doc, upsert=True)
+        if op == "update_one":
+            return UpdateOne(entry["filter"], entry["update"], upsert=entry.get("upsert", False))
+        return UpdateMany(entry["filter"], entry["update"])
+
+    def _dead_letter(self, entry, error):
+        print(f"Warning: outbox write to {entry['c']} rejected by MongoDB, moved to {self.dead_letter_path}: {error}")
+        line = json_util.dumps({"entry": entry, "error": str(error), "at": time.time()}) + '\n'
+        with file_lock(self.lock_path):
+            with open(self.dead_letter_path, 'ab') as f:
+                f.write(line.encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+        self.dead_lettered_total += 1
+
+    def _write_run(self, db, run):
+        """Write one collection's consecutive entries, skipping the ones Mongo rejects."""
+        while run:
+            try:
+                db[run[0]["c"]].bulk_write([self._to_request(e) for e in run], ordered=True)
+                return
+            except BulkWriteError as e:
+                write_errors = e.details.get("writeErrors") or []
+                if not write_errors:
+                    raise   # write concern only; the replay is idempotent
+                # Ordered: everything before the failed entry was applied.
+                error = write_errors[0]
+                failed = run[error["index"]]
+                if not (error.get("code") == DUPLICATE_KEY and failed["op"] == "insert"):
+                    self._dead_letter(failed, error.get("errmsg", error))
+                run = run[error["index"] + 1:]
+            except InvalidDocument as e:
+                # A document BSON cannot encode fails the whole request;
+                # find it by writing one entry at a time.
+                if len(run) == 1:
+                    self._dead_letter(run[0], e)
+                    return
+                for entry in run:
+                    self._write_run(db, [entry])
+                return
+
+    def _apply(self, entries):
+        db = self.get_db()
+        # Group consecutive entries per collection so ordering within and
+        # across collections is preserved.
+        run = []
+        for entry in entries + [None]:
+            if run and (entry is None or entry["c"] != run[0]["c"]):
+                self._write_run(db, run)
+                run = []
+            if entry is not None:
+                run.append(entry)
+
+    def flush(self):
+        """Push one batch to MongoDB. Returns the number of entries applied."""
+        with file_lock(self.flush_lock_path, blocking=False) as acquired:
+            if not acquired:
+                return 0
+            start = self._read_offset()
+            entries, end = self._read_pending(start, self.batch_size)
+            if not entries:
+                self._maybe_truncate(start)
+                return 0
+            self._apply(entries)
+            self._write_offset(end)
+            self.flushed_total += len(entries)
+            self.last_flush_at = time.time()
+            if self.on_flush is not None:
+                self.on_flush({e["c"] for e in entries})
+            self._maybe_truncate(end)
+            return len(entries)
+
+    def _maybe_truncate(self, offset):
+        if offset == 0:
+            return
+        with file_lock(self.lock_path):
+            if os.path.getsize(self.path) == offset:
+                # Offset first: a crash before the truncate only replays
+                # (idempotent) entries, while the reverse order would leave
+                # the offset past EOF and skip new appends.
+                self._write_offset(0)
+                open(self.path, 'wb').close()
+
+    def _run(self):
+        while True:
+            try:
+                while self.flush() >= self.batch_size:
+                    pass
+                self._failures = 0
+                self.last_error = None
+            except Exception as e:
+                self._failures += 1
+                self.last_error = str(e)
+                delay = min(self.max_backoff, self.interval * 2 ** self._failures) * random.uniform(0.5, 1.0)
+                print(f"Warning: outbox flush to MongoDB failed (attempt {self._failures}), retrying in {delay:.1f}s: {e}")
+            if self._failures:
+                time.sleep(delay)
+            else:
+                self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def start(self):
+        """Start the background flusher (again, if this process was forked)."""
+        if self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid():
+            return
+        self._thread_pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="outbox-flusher", daemon=True)
+        self._thread.start()
+
+    def status(self):
+        return {
+            "pending": self.depth(),
+            "flushed_total": self.flushed_total,
+            "dead_lettered_total": self.dead_lettered_total,
+            "consecutive_failures": self._failures,
+            "last_error": self.last_error,
+            "last_flush_at": self.last_flush_at,
+        }
@@ -0,0 +1,142 @@
+import base64
+import json
+import os
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+
+from cache_utils import LRUCache
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(payload):
+    """Opaque, URL-safe token for a pagination position."""
+    raw = json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, source=None):
+    """Inverse of encode_cursor. Rejects tokens issued by a different `source`."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(payload, dict) or (source is not None and payload.get('s') != source):
+        raise InvalidCursor("Invalid cursor")
+    return payload
+
+
+def parse_limit(value, default, maximum=100):
+    try:
+        limit = int(value) if value not in (None, '') else default
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, maximum))
+
+
+# Cursor pages share one response shape everywhere:
+#   {"items": [...], "next_cursor": token or None, "limit": n, "total": n}
+# `total` comes from cached_count and may lag writes by up to COUNT_TTL.
+
+COUNT_TTL = float(os.environ.get('PAGINATION_COUNT_TTL', 60))
+_counts = LRUCache(max_items=256, ttl=COUNT_TTL)
+
+
+def cached_count(key, compute):
+    """Total for a listing, recomputed at most every COUNT_TTL seconds (or after invalidate_count)."""
+    return _counts.get_or_compute(key, compute)
+
+
+def invalidate_count(key):
+    _counts.pop(key)
+
+
+def cursor_page(items, next_cursor, limit, total):
+    return {"items": items, "next_cursor": next_cursor, "limit": limit, "total": total}
+
+
+def _encode_key(value):
+    if isinstance(value, ObjectId):
+        return {"oid": str(value)}
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return {"v": value}
+
+
+def _decode_key(value):
+    try:
+        if "oid" in value:
+            return ObjectId(value["oid"])
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        return value["v"]
+    except (TypeError, KeyError, ValueError, InvalidId):
+        raise InvalidCursor("Invalid cursor")
+
+
+def mongo_keyset_page(collection, query, projection, sort_field, cursor, limit, source, descending=True):
+    """
+    One page of `collection` ordered by (sort_field, _id), newest first by
+    default. The cursor holds the last row's sort key and _id, so a page
+    is an index range scan however deep it is. Missing `sort_field` values
+    sort last and are paged by _id. Returns (docs, next_cursor); docs keep
+    their _id.
+    """
+    past = "$lt" if descending else "$gt"
+    query = dict(query)
+    if cursor:
+        key = decode_cursor(cursor, source).get("k")
+        if not isinstance(key, list) or len(key) != 2:
+            raise InvalidCursor("Invalid cursor")
+        value, last_id = (_decode_key(k) for k in key)
+        if sort_field == "_id":
+            query["_id"] = {past: last_id}
+        else:
+            # Nulls sort before every value: last when descending, first otherwise.
+            same = {sort_field: value, "_id": {past: last_id}}
+            if value is None:
+                after = [same] if descending else [same, {sort_field: {"$ne": None}}]
+            else:
+                after = [{sort_field: {past: value}}, same] + ([{sort_field: None}] if descending else [])
+            query["$or"] = after
+    direction = -1 if descending else 1
+    sort = [("_id", direction)] if sort_field == "_id" else [(sort_field, direction), ("_id", direction)]
+    if projection is not None and projection.get("_id") == 0:
+        projection = {k: v for k, v in projection.items() if k != "_id"} or None
+    docs = list(collection.find(query, projection).sort(sort).limit(limit + 1))
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        next_cursor = encode_cursor({"s": source, "k": [_encode_key(last.get(sort_field)), _encode_key(last["_id"])]})
+    return docs, next_cursor
+
+
+def sequence_page(items, cursor, limit, source, key):
+    """
+    Cursor paging over an in-memory list (the CSV/JSON fallbacks). The
+    cursor holds the last item's key, so the next page starts right after
+    it even if items were added or removed before it; the position is
+    kept as a hint for when that item itself is gone, in which case
+    everything after it has moved up one place.
+    """
+    start = 0
+    if cursor:
+        payload = decode_cursor(cursor, source)
+        hint, last = payload.get("o"), payload.get("k")
+        if not isinstance(hint, int) or hint < 0:
+            raise InvalidCursor("Invalid cursor")
+        start = hint
+        if not (0 < hint <= len(items) and key(items[hint - 1]) == last):
+            start = next((i + 1 for i, item in enumerate(items) if key(item) == last), max(min(hint - 1, len(items)), 0))
+    page = items[start:start + limit]
+    next_cursor = None
+    if start + limit < len(items):
+        end = start + len(page)
+        next_cursor = encode_cursor({"s": source, "k": key(page[-1]), "o": end})
+    return page, next_cursor
@@ -0,0 +1,265 @@
+import datetime
+import heapq
+import math
+import os
+import threading
+from collections import defaultdict
+
+from catalog import museum_catalog
+
+POPULARITY_HALF_LIFE_DAYS = float(os.environ.get('POPULARITY_HALF_LIFE_DAYS', 30))
+
+# Forward-decay landmark. Scores are stored relative to it and only ever
+# grow, so ranking never needs re-scoring as time passes; see PopularityEngine.
+_LANDMARK = datetime.date(2024, 1, 1).toordinal()
+# Rebase once stored exponents get this large, long before floats overflow.
+_MAX_EXPONENT = 500.0
+
+
+def _day(value):
+    try:
+        return datetime.date.fromisoformat(str(value)[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+def _event_day(row, today):
+    """Visit day of a booking, capped at today: a booking for a later visit counts as activity now."""
+    day = _day(row.get('Date'))
+    return None if day is None else min(day, today)
+
+
+def event_weight(row):
+    """
+    Popularity signal of one booking: 1 for the booking, +0.5 if the
+    visitor attended, and -0.5..+0.5 from its rating (3 stars is neutral).
+    Cancelled bookings count for nothing.
+    """
+    if not row.get('Museum') or row.get('Attended') == 'Cancelled':
+        return 0.0
+    weight = 1.0
+    if row.get('Attended') == 'Yes':
+        weight += 0.5
+    try:
+        rating = float(row.get('Rating'))
+    except (TypeError, ValueError):
+        rating = None
+    if rating is not None and rating == rating:
+        weight += (rating - 3.0) / 4.0
+    return weight
+
+
+class _LazyHeap:
+    """Max-heap of (score, museum) with stale entries skipped on read."""
+
+    def __init__(self):
+        self.heap = []
+        self.members = set()
+
+    def push(self, museum, score):
+        self.members.add(museum)
+        heapq.heappush(self.heap, (-score, museum))
+
+    def discard(self, museum):
+        self.members.discard(museum)
+
+    def top(self, n, scores):
+        out = []
+        popped = []
+        seen = set()
+        while self.heap and len(out) < n:
+            entry = heapq.heappop(self.heap)
+            neg, museum = entry
+            if museum in seen or museum not in self.members or scores.get(museum) != -neg:
+                continue   # superseded entry: drop it for good
+            seen.add(museum)
+            popped.append(entry)
+            out.append((museum, -neg))
+        for entry in popped:
+            heapq.heappush(self.heap, entry)
+        if len(self.heap) > 2 * len(self.members) + 64:
+            self.heap = [(-scores[m], m) for m in self.members if m in scores]
+            heapq.heapify(self.heap)
+        return out
+
+
+class PopularityEngine:
+    """
+    Exponentially time-decayed museum popularity from booking events.
+
+    Uses forward decay: an event at day t adds w * exp(lambda * (t - L))
+    for a fixed landmark L, and the decayed score at time `now` is that sum
+    times exp(-lambda * (now - L)). The factor is common to every museum,
+    so the stored sums rank correctly forever and each booking change
+    touches only its own museum. Rankings for the whole catalog, each
+    State and each Type live in lazy max-heaps, so a top-N query pops N
+    entries instead of scanning.
+
+    Events are dated by visit day, capped at today, so a far-future date
+    cannot drag the landmark forward. Because the cap moves, the amount
+    each ticket added is remembered and exactly that is taken back when
+    the booking changes.
+
+    Acts as a BookingStore listener (`rebuild` / `apply`). State and Type
+    come from the catalog; the booking's MuseumType is used for museums
+    the catalog does not know.
+    """
+
+    def __init__(self, half_life_days=POPULARITY_HALF_LIFE_DAYS, catalog=museum_catalog):
+        self.decay = math.log(2) / half_life_days
+        self.catalog = catalog
+        self.version = 0
+        self._refresh = lambda: None
+        self._lock = threading.Lock()
+        self._landmark = _LANDMARK
+        self._reset()
+        catalog.subscribe(self._on_catalog_change)
+
+    def attach(self, store):
+        """Follow `store`'s bookings, including ones journalled by other workers."""
+        self._refresh = store.refresh
+        store.subscribe(self)
+
+    def _reset(self):
+        self._scores = {}
+        self._applied = {}
+        self._booking_type = {}
+        self._groups = {}
+        self._heaps = defaultdict(_LazyHeap)
+
+    def _contribution(self, row, today):
+        w = event_weight(row)
+        if not w:
+            return 0.0
+        day = _event_day(row, today)
+        return w * math.exp(self.decay * ((day if day is not None else self._landmark) - self._landmark))
+
+    def _add(self, row, today):
+        """Contribution of `row`, remembered under its TicketID for `_remove`."""
+        c = self._contribution(row, today)
+        if c and row.get('TicketID'):
+            self._applied[row['TicketID']] = c
+        return c
+
+    def _remove(self, row, today):
+        if row.get('TicketID') in self._applied:
+            return self._applied.pop(row['TicketID'])
+        return self._contribution(row, today)
+
+    def _museum_groups(self, museum, by_name):
+        record = by_name.get(museum) or {}
+        kind = record.get('Type') or self._booking_type.get(museum)
+        keys = [None]
+        if record.get('State'):
+            keys.append(('state', record['State']))
+        if kind:
+            keys.append(('type', kind))
+        return keys
+
+    def _set(self, museum, score, by_name):
+        if score <= 1e-12:
+            self._scores.pop(museum, None)
+            for key in self._groups.pop(museum, ()):
+                self._heaps[key].discard(museum)
+            return
+        self._scores[museum] = score
+        groups = self._groups.get(museum)
+        if groups is None:
+            groups = self._groups[museum] = self._museum_groups(museum, by_name)
+        for key in groups:
+            self._heaps[key].push(museum, score)
+
+    def _maybe_rebase(self, row, by_name, today):
+        day = _event_day(row, today)
+        if day is None or self.decay * (day - self._landmark) < _MAX_EXPONENT:
+            return
+        factor = math.exp(-self.decay * (day - self._landmark))
+        self._landmark = day
+        self._applied = {t: c * factor for t, c in self._applied.items()}
+        self._regroup({m: s * factor for m, s in self._scores.items()}, by_name)
+
+    def _regroup(self, scores, by_name):
+        booking_type, applied = self._booking_type, self._applied
+        self._reset()
+        self._booking_type, self._applied = booking_type, applied
+        for museum, score in scores.items():
+            self._set(museum, score, by_name)
+
+    # Listener interface. The catalog snapshot is taken before locking:
+    # loading it may notify _on_catalog_change, which takes the lock too.
+
+    def rebuild(self, rows):
+        rows = list(rows)
+        by_name = self.catalog.snapshot().by_name
+        today = datetime.date.today().toordinal()
+        days = [d for d in (_event_day(r, today) for r in rows) if d is not None]
+        with self._lock:
+            self._landmark = _LANDMARK
+            if days and self.decay * (max(days) - _LANDMARK) >= _MAX_EXPONENT:
+                self._landmark = max(days)
+            self._reset()
+            scores = defaultdict(float)
+            for row in rows:
+                c = self._add(row, today)
+                if c:
+                    scores[row['Museum']] += c
+                    if row.get('MuseumType'):
+                        self._booking_type[row['Museum']] = row['MuseumType']
+            for museum, score in scores.items():
+                self._set(museum, score, by_name)
+            self.version += 1
+
+    def apply(self, old, new):
+        by_name = self.catalog.snapshot().by_name
+        today = datetime.date.today().toordinal()
+        with self._lock:
+            if new is not None:
+                self._maybe_rebase(new, by_name, today)
+            touched = {}
+            if old is not None:
+                c = self._remove(old, today)
+                if c:
+                    touched[old['Museum']] = touched.get(old['Museum'], self._scores.get(old['Museum'], 0.0)) - c
+            if new is not None:
+                c = self._add(new, today)
+                if c:
+                    if new.get('MuseumType'):
+                        self._booking_type.setdefault(new['Museum'], new['MuseumType'])
+                    touched[new['Museum']] = touched.get(new['Museum'], self._scores.get(new['Museum'], 0.0)) + c
+            for museum, score in touched.items():
+                if score != self._scores.get(museum):
+                    self._set(museum, score, by_name)
+            if touched:
+                self.version += 1
+
+    def _on_catalog_change(self, snapshot, change=None):
+        # State/Type of a museum may have changed: re-file every scored museum.
+        with self._lock:
+            self._regroup(dict(self._scores), snapshot.by_name)
+            self.version += 1
+
+    def current_version(self):
+        """Counter bumped on every change, after picking up other workers' bookings."""
+        self._refresh()
+        return self.version
+
+    def top(self, n=10, state=None, museum_type=None):
+        """[(museum, decayed score)] best first, overall or within one State or Type."""
+        self._refresh()
+        key = ('state', state) if state else (('type', museum_type) if museum_type else None)
+        now = datetime.date.today().toordinal()
+        with self._lock:
+            if key is not None and key not in self._heaps:
+                return []
+            ranked = self._heaps[key].top(n, self._scores)
+            factor = math.exp(-self.decay * (now - self._landmark))
+        return [(museum, score * factor) for museum, score in ranked]
+
+    def score(self, museum):
+        self._refresh()
+        now = datetime.date.today().toordinal()
+        with self._lock:
+            return self._scores.get(museum, 0.0) * math.exp(-self.decay * (now - self._landmark))
+
+
+museum_popularity = PopularityEngine()
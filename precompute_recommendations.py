@@ -0,0 +1,93 @@
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from pymongo import ReplaceOne
+
+from ml_recommendations import batch_personalized_suggestions, current_indexes
+
+COLLECTION = "user_recommendations"
+TOP_N = 10
+INTEREST_TYPES = 3
+
+
+def booked_types(rows):
+    """Email -> the museum types a visitor booked most, as a stand-in for stated interests."""
+    counts = defaultdict(Counter)
+    for row in rows:
+        email = (row.get('VisitorEmail') or '').strip().lower()
+        if email and row.get('MuseumType') and row.get('Attended') != 'Cancelled':
+            counts[email][row['MuseumType']] += 1
+    return {email: [t for t, _ in c.most_common(INTEREST_TYPES)] for email, c in counts.items()}
+
+
+def user_interests(user, types_by_email):
+    """A user's `interests` field if set, else the types they book, else nothing."""
+    interests = user.get('interests')
+    if isinstance(interests, str):
+        interests = [interests]
+    if interests:
+        return [str(i) for i in interests]
+    return types_by_email.get((user.get('email') or '').strip().lower(), [])
+
+
+def precompute(db, booking_rows, top_n=TOP_N, chunk_size=1024, write_batch=1000):
+    """
+    Score every user in `users` and store the lists in `user_recommendations`
+    (one document per user, keyed by the user's _id). Users with the same
+    interests share one scoring row. Returns counts and throughput.
+    """
+    start = time.perf_counter()
+    indexes = current_indexes()
+    types_by_email = booked_types(booking_rows)
+    users = list(db.users.find({}, {"email": 1, "interests": 1}))
+    keys = [tuple(user_interests(u, types_by_email)) for u in users]
+    distinct = list(dict.fromkeys(keys))
+    results = dict(zip(distinct, batch_personalized_suggestions(
+        [list(k) for k in distinct], top_n=top_n, indexes=indexes, chunk_size=chunk_size)))
+    scored = time.perf_counter()
+
+    generated_at = datetime.now().isoformat()
+    ops = []
+    written = 0
+    for user, key in zip(users, keys):
+        ops.append(ReplaceOne({"_id": user["_id"]}, {
+            "email": user.get("email"),
+            "interests": list(key),
+            "recommendations": results[key],
+            "catalog_version": indexes.snapshot.fingerprint,
+            "generated_at": generated_at,
+        }, upsert=True))
+        if len(ops) >= write_batch:
+            db[COLLECTION].bulk_write(ops, ordered=False)
+            written += len(ops)
+            ops = []
+    if ops:
+        db[COLLECTION].bulk_write(ops, ordered=False)
+        written += len(ops)
+    elapsed = time.perf_counter() - start
+    return {
+        "users": len(users),
+        "distinct_interest_lists": len(distinct),
+        "written": written,
+        "scoring_seconds": round(scored - start, 3),
+        "total_seconds": round(elapsed, 3),
+        "users_per_second": round(len(users) / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    from booking_store import BookingStore
+    from db_utils import get_db
+
+    parser = argparse.ArgumentParser(description="Precompute museum recommendations for every registered user")
+    parser.add_argument("--top-n", type=int, default=TOP_N)
+    parser.add_argument("--chunk-size", type=int, default=1024, help="queries scored per matrix product")
+    parser.add_argument("--write-batch", type=int, default=1000, help="documents per bulk_write")
+    args = parser.parse_args()
+    store = BookingStore("bookingDB")
+    print(json.dumps(precompute(get_db(), store.rows(), top_n=args.top_n,
+                                chunk_size=args.chunk_size, write_batch=args.write_batch), indent=2))
@@ -0,0 +1,63 @@
+import hashlib
+import io
+import os
+
+import qrcode
+import qrcode.image.svg
+
+from cache_utils import LRUCache
+
+QR_CACHE_BYTES = int(os.environ.get('QR_CACHE_BYTES', 16 * 1024 * 1024))
+
+QR_MIMETYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+_qr_cache = LRUCache(max_items=4096, max_bytes=QR_CACHE_BYTES)
+
+
+def ticket_qr_text(booking):
+    return f"""Ticket ID: {booking['TicketID']}
+Museum: {booking['Museum']}
+Date: {booking['Date']}
+Time: {booking['Time']}
+People: {booking['People']}
+Tour Type: {booking['TourType']}
+Visitor: {booking['VisitorName']}
+Contact: {booking['VisitorEmail']}"""
+
+
+def _render(text, fmt):
+    buf = io.BytesIO()
+    if fmt == 'svg':
+        qrcode.make(text, image_factory=qrcode.image.svg.SvgPathImage).save(buf)
+    else:
+        qrcode.make(text).save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def ticket_qr_etag(booking, fmt='png'):
+    """Strong ETag for a ticket image; depends only on the encoded text and format."""
+    return hashlib.sha1(f"{fmt}:{ticket_qr_text(booking)}".encode('utf-8')).hexdigest()
+
+
+def render_ticket_qr(booking, fmt='png'):
+    """
+    Return `(image_bytes, etag)` for a booking's ticket QR code.
+
+    Images are rendered on first request and kept in a size-bounded LRU
+    keyed by their ETag.
+    """
+    if fmt not in QR_MIMETYPES:
+        raise ValueError(f"Unsupported QR format: {fmt}")
+    etag = ticket_qr_etag(booking, fmt)
+    data = _qr_cache.get(etag)
+    if data is None:
+        data = _render(ticket_qr_text(booking), fmt)
+        _qr_cache.set(etag, data)
+    return data, etag
+
+
+def qr_cache_stats():
+    return _qr_cache.stats()
@@ -0,0 +1,142 @@
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_utils import LRUCache
+from catalog import museum_catalog
+from ml_recommendations import current_indexes, personalized_suggestions, popular_exhibits, nearby_museums
+from popularity import museum_popularity
+
+RECOMMENDATION_CACHE_TTL = float(os.environ.get('RECOMMENDATION_CACHE_TTL', 300))
+RECOMMENDATION_CACHE_ITEMS = int(os.environ.get('RECOMMENDATION_CACHE_ITEMS', 4096))
+# About 1.1 km of latitude per cell.
+GEO_CELL_DEG = float(os.environ.get('RECOMMENDATION_GEO_CELL_DEG', 0.01))
+RADIUS_BUCKETS_KM = (5, 10, 25, 50, 100, 250, 500, 1000)
+RECOMMENDATION_WORKERS = int(os.environ.get('RECOMMENDATION_WORKERS', 3))
+
+PERSONALIZED_TOP_N = 10
+POPULAR_TOP_N = 10
+NEARBY_TOP_N = 12
+
+# Each list is cached under its own key so that, say, two visitors with the
+# same interests in different cities still share the personalized list.
+_cache = LRUCache(max_items=RECOMMENDATION_CACHE_ITEMS, ttl=RECOMMENDATION_CACHE_TTL)
+
+
+def normalize_interests(interests):
+    if isinstance(interests, str):
+        interests = [interests]
+    return tuple(sorted({str(i).strip().lower() for i in interests or () if str(i).strip()}))
+
+
+def geo_cell(lat, lon):
+    return math.floor(lat / GEO_CELL_DEG), math.floor(lon / GEO_CELL_DEG)
+
+
+def _cell_center(cell):
+    return (cell[0] + 0.5) * GEO_CELL_DEG, (cell[1] + 0.5) * GEO_CELL_DEG
+
+
+def radius_bucket(radius_km):
+    """Smallest bucket that covers `radius_km` (whole km beyond the last one)."""
+    for bucket in RADIUS_BUCKETS_KM:
+        if radius_km <= bucket:
+            return bucket
+    return math.ceil(radius_km)
+
+
+def _on_catalog_change(snapshot, change=None):
+    # Keys carry the catalog version, so this only frees memory early.
+    _cache.clear()
+
+
+museum_catalog.subscribe(_on_catalog_change)
+
+
+def cached_personalized(interests, indexes):
+    key = normalize_interests(interests)
+    return _cache.get_or_compute(
+        ("personalized", indexes.version, key),
+        lambda: personalized_suggestions(list(key), top_n=PERSONALIZED_TOP_N, indexes=indexes),
+    )
+
+
+def cached_popular(indexes):
+    # Keyed by the popularity version too, so a booking change is seen at once.
+    return _cache.get_or_compute(
+        ("popular", indexes.version, museum_popularity.current_version()),
+        lambda: popular_exhibits(top_n=POPULAR_TOP_N, indexes=indexes),
+    )
+
+
+def cached_nearby(lat, lon, radius_km, indexes):
+    """
+    Nearby museums for the request's geo cell. The list is computed once
+    per cell for the covering radius bucket; the closest museums within
+    the requested radius are always a prefix of it, so trimming by
+    distance gives the same answer as an exact query from the cell centre.
+    """
+    cell = geo_cell(lat, lon)
+    bucket = radius_bucket(radius_km)
+    center_lat, center_lon = _cell_center(cell)
+    items = _cache.get_or_compute(
+        ("nearby", indexes.version, cell, bucket),
+        lambda: nearby_museums(center_lat, center_lon, radius_km=bucket, top_n=NEARBY_TOP_N, indexes=indexes),
+    )
+    return [item for item in items if item["distance_km"] <= radius_km]
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    """Per-process worker pool (a forked worker gets its own threads)."""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=RECOMMENDATION_WORKERS, thread_name_prefix="recommend")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def recommendations(interests, lat=None, lon=None, radius_km=25.0, debug=False):
+    """
+    The personalized, popular and nearby lists for one request, all read
+    from the same catalog snapshot and computed concurrently. With
+    `debug`, the response also carries per-stage wall times in ms.
+    """
+    start = time.perf_counter()
+    indexes = current_indexes()
+    pool = _pool()
+    stages = {
+        "personalized": pool.submit(_timed, cached_personalized, interests, indexes),
+        "popular": pool.submit(_timed, cached_popular, indexes),
+    }
+    if lat is not None and lon is not None:
+        stages["nearby"] = pool.submit(_timed, cached_nearby, lat, lon, radius_km, indexes)
+    results = {name: future.result() for name, future in stages.items()}
+
+    response = {
+        "personalized": results["personalized"][0],
+        "popular": results["popular"][0],
+        "nearby": results["nearby"][0] if "nearby" in results else [],
+    }
+    if debug:
+        timings = {name: round(ms, 3) for name, (_, ms) in results.items()}
+        timings["total"] = round((time.perf_counter() - start) * 1000, 3)
+        response["debug"] = {"catalog_version": indexes.version, "timings_ms": timings}
+    return response
+
+
+def recommendation_cache_stats():
+    return _cache.stats()
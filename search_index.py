@@ -0,0 +1,242 @@
+import heapq
+import re
+import threading
+import unicodedata
+
+from catalog import museum_catalog
+from facet_index import FacetIndex
+from fuzzy_index import build_catalog_index
+
+SEARCH_COLUMNS = ['Name', 'City', 'State', 'Type']
+# Field weights for a matching token. A name that starts with the query is
+# the best autocomplete hit, then any word of the name, then city, state
+# and type.
+NAME_START, NAME, CITY, STATE, TYPE = 5, 4, 3, 2, 1
+# Best documents kept per trie node; bounds the size of an autocomplete list.
+TRIE_TOP_K = 50
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text):
+    """Lower-cased ASCII word tokens ("Salar Jung Museum, Hyderabad" -> ["salar", "jung", ...])."""
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode("ascii")
+    return _TOKEN.findall(text.lower())
+
+
+class _Node:
+    __slots__ = ("children", "postings", "top")
+
+    def __init__(self):
+        self.children = {}
+        self.postings = None    # {doc: weight} if a whole token ends here
+        self.top = ()           # best (-weight, sort_key, doc) among tokens below
+
+
+class SearchIndex:
+    """
+    Token inverted index plus prefix trie over the catalog's Name, City,
+    State and Type, for type-ahead search.
+
+    Every query token but the last must match a whole word; the last one
+    matches as a prefix. A document must match all of them. Ranking is by
+    the summed field weight of the matched words, then name, then catalog
+    order, so the same query always gives the same list.
+
+    Each trie node stores its best TRIE_TOP_K documents, so a one-word
+    prefix is answered by walking the prefix and reading that list.
+    """
+
+    def __init__(self, records, top_k=TRIE_TOP_K):
+        self.records = records
+        self.top_k = top_k
+        self.sort_keys = [((r.get('Name') or '').lower(), i) for i, r in enumerate(records)]
+        self.doc_tokens = []
+        self.postings = {}
+        self.root = _Node()
+        for doc, record in enumerate(records):
+            weights = {}
+            for token_no, token in enumerate(normalize(record.get('Name'))):
+                weights[token] = max(weights.get(token, 0), NAME_START if token_no == 0 else NAME)
+            for column, weight in (('City', CITY), ('State', STATE), ('Type', TYPE)):
+                for token in normalize(record.get(column)):
+                    weights[token] = max(weights.get(token, 0), weight)
+            self.doc_tokens.append(weights)
+            for token, weight in weights.items():
+                self.postings.setdefault(token, {})[doc] = weight
+        for token, postings in self.postings.items():
+            node = self.root
+            for ch in token:
+                node = node.children.setdefault(ch, _Node())
+            node.postings = postings
+        self._rank(self.root)
+
+    def _rank(self, node):
+        # A document's weight under a node is its best weight among the
+        # tokens below, so the node's top-k is within its children's top-k.
+        for child in node.children.values():
+            self._rank(child)
+        if len(node.children) == 1 and not node.postings:
+            node.top = next(iter(node.children.values())).top
+            return
+        candidates = {}
+        for child in node.children.values():
+            for neg, _, doc in child.top:
+                candidates[doc] = min(candidates.get(doc, 0), neg)
+        if node.postings:
+            for doc, weight in node.postings.items():
+                candidates[doc] = min(candidates.get(doc, 0), -weight)
+        node.top = tuple(heapq.nsmallest(
+            self.top_k, ((neg, self.sort_keys[doc], doc) for doc, neg in candidates.items())))
+
+    def _node(self, prefix):
+        node = self.root
+        for ch in prefix:
+            node = node.children.get(ch)
+            if node is None:
+                return None
+        return node
+
+    def _prefix_weight(self, doc, prefix):
+        return max((w for t, w in self.doc_tokens[doc].items() if t.startswith(prefix)), default=0)
+
+    def matches(self, query):
+        """Every document `search` would accept for `query`, unranked."""
+        tokens = normalize(query)
+        if not tokens:
+            return set()
+        *words, prefix = tokens
+        lists = [self.postings.get(w) for w in words]
+        if not all(lists):
+            return set()
+        if not words:
+            docs = set()
+            node = self._node(prefix)
+            stack = [node] if node is not None else []
+            while stack:
+                node = stack.pop()
+                if node.postings:
+                    docs.update(node.postings)
+                stack.extend(node.children.values())
+            return docs
+        docs = set(min(lists, key=len))
+        for postings in lists:
+            docs.intersection_update(postings)
+        return {doc for doc in docs if self._prefix_weight(doc, prefix)}
+
+    def search(self, query, limit=10):
+        """Indices of the best `limit` documents for `query`, best first."""
+        tokens = normalize(query)
+        if not tokens or limit <= 0:
+            return []
+        *words, prefix = tokens
+        if not words:
+            node = self._node(prefix)
+            return [doc for _, _, doc in node.top[:limit]] if node is not None else []
+
+        lists = [self.postings.get(w) for w in words]
+        if not all(lists):
+            return []
+        lists.sort(key=len)
+        scores = dict(lists[0])
+        for postings in lists[1:]:
+            scores = {doc: s + postings[doc] for doc, s in scores.items() if doc in postings}
+            if not scores:
+                return []
+        ranked = []
+        for doc, score in scores.items():
+            weight = self._prefix_weight(doc, prefix)
+            if weight:
+                ranked.append((-(score + weight), self.sort_keys[doc], doc))
+        return [doc for _, _, doc in heapq.nsmallest(limit, ranked)]
+
+
+class CatalogIndexes:
+    """Search structures for one catalog snapshot; document ids are positions in snapshot.records."""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.version = snapshot.version
+        records = [{c: r.get(c) for c in SEARCH_COLUMNS} for r in snapshot.records]
+        self.search = SearchIndex(records)
+        self.fuzzy = build_catalog_index(records)
+        self.facets = FacetIndex(records)
+        self.keys = self._row_keys(snapshot.records)
+
+    @staticmethod
+    def _row_keys(records):
+        # Unique, stable row keys for cursors: the Mongo id, or for CSV rows
+        # Name|City|State plus the occurrence number, since the CSV repeats
+        # whole rows.
+        keys = []
+        seen = {}
+        for r in records:
+            if r.get('_id'):
+                keys.append(str(r['_id']))
+                continue
+            base = f"{r.get('Name')}|{r.get('City')}|{r.get('State')}"
+            n = seen[base] = seen.get(base, 0) + 1
+            keys.append(base if n == 1 else f"{base}#{n}")
+        return keys
+
+
+class MuseumSearch:
+    """
+    The prefix, trigram and facet indexes for the current catalog snapshot,
+    rebuilt together on every catalog change.
+    """
+
+    def __init__(self, catalog=museum_catalog):
+        self.catalog = catalog
+        self._lock = threading.Lock()
+        self._indexes = None
+        catalog.subscribe(self._on_catalog_change)
+
+    def _on_catalog_change(self, snapshot, change=None):
+        indexes = CatalogIndexes(snapshot)
+        with self._lock:
+            if self._indexes is None or snapshot.version >= self._indexes.version:
+                self._indexes = indexes
+
+    def indexes(self):
+        snapshot = self.catalog.snapshot()
+        if self._indexes is None or self._indexes.version < snapshot.version:
+            self._on_catalog_change(snapshot)
+        return self._indexes
+
+    @staticmethod
+    def _unique(records, docs, limit):
+        # The catalog can list the same museum more than once.
+        out = []
+        seen = set()
+        for doc in docs:
+            record = records[doc]
+            key = (record.get('Name'), record.get('City'))
+            if key not in seen:
+                seen.add(key)
+                out.append(dict(record))
+                if len(out) == limit:
+                    break
+        return out
+
+    def search(self, query, limit=10):
+        """Matching museums as {Name, City, State, Type}, one per name and city."""
+        index = self.indexes().search
+        return self._unique(index.records, index.search(query, limit * 2), limit)
+
+    def fuzzy(self, query, limit=10):
+        """Museums whose name or city is within a few typos of `query`, closest first."""
+        indexes = self.indexes()
+        hits = indexes.fuzzy.lookup(query, limit * 4)
+        return self._unique(indexes.search.records, (doc for (doc, _), _ in hits), limit)
+
+    def search_or_fuzzy(self, query, limit=10):
+        """Prefix matches first, topped up with typo-tolerant ones."""
+        out = self.search(query, limit)
+        if len(out) < limit:
+            seen = {(m.get('Name'), m.get('City')) for m in out}
+            out.extend(m for m in self.fuzzy(query, limit) if (m.get('Name'), m.get('City')) not in seen)
+        return out[:limit]
+
+
+museum_search = MuseumSearch()
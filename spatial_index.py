@@ -0,0 +1,190 @@
+import threading
+
+import numpy as np
+from sklearn.neighbors import BallTree
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def _haversine_km(lat, lon, lats, lons):
+    """Distances in km from one point (radians) to arrays of points (radians)."""
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class _Base:
+    """Immutable bulk-built part of the index."""
+
+    def __init__(self, keys, lats, lons, records, leaf_size):
+        self.keys = keys
+        self.records = records
+        self.position = {k: i for i, k in enumerate(keys)}
+        coords = np.column_stack([np.radians(lats), np.radians(lons)]) if keys else np.empty((0, 2))
+        self.tree = BallTree(coords, metric="haversine", leaf_size=leaf_size) if keys else None
+        # Latitude-sorted copy for bounding-box scans.
+        order = np.argsort(lats, kind="stable")
+        self.by_lat = order
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.sorted_lats = self.lats[order]
+
+
+class SpatialIndex:
+    """
+    Museum locations indexed for radius, k-nearest and bounding-box queries.
+
+    The bulk of the points live in a haversine BallTree built by `build`.
+    `upsert` and `remove` do not touch the tree: removed or moved points are
+    tombstoned and new positions go to a small delta buffer that is scanned
+    linearly. Once the delta and tombstones grow past `rebuild_ratio` of the
+    tree, everything is folded into a fresh tree.
+
+    Keys are arbitrary hashable ids; records are returned as given.
+    """
+
+    def __init__(self, leaf_size=40, rebuild_ratio=0.1, min_rebuild=256):
+        self.leaf_size = leaf_size
+        self.rebuild_ratio = rebuild_ratio
+        self.min_rebuild = min_rebuild
+        self._lock = threading.Lock()
+        self._base = _Base([], [], [], [], leaf_size)
+        self._tombstones = set()
+        self._delta = {}
+        self._view = None
+
+    def build(self, items):
+        """Replace the index with `items`: iterable of (key, lat, lon, record)."""
+        latest = {}
+        for key, lat, lon, record in items:
+            latest[key] = (float(lat), float(lon), record)
+        base = self._make_base(latest)
+        with self._lock:
+            self._base = base
+            self._tombstones = set()
+            self._delta = {}
+            self._view = None
+
+    def _make_base(self, points):
+        keys = list(points)
+        lats = [points[k][0] for k in keys]
+        lons = [points[k][1] for k in keys]
+        records = [points[k][2] for k in keys]
+        return _Base(keys, lats, lons, records, self.leaf_size)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._base.keys) - len(self._tombstones) + len(self._delta)
+
+    def upsert(self, key, lat, lon, record):
+        lat, lon = float(lat), float(lon)
+        if not (np.isfinite(lat) and np.isfinite(lon)):
+            self.remove(key)
+            return
+        with self._lock:
+            if key in self._base.position:
+                self._tombstones.add(key)
+            self._delta[key] = (lat, lon, record)
+            self._view = None
+            self._maybe_rebuild()
+
+    def remove(self, key):
+        with self._lock:
+            self._delta.pop(key, None)
+            if key in self._base.position:
+                self._tombstones.add(key)
+            self._view = None
+            self._maybe_rebuild()
+
+    def _maybe_rebuild(self):
+        pending = len(self._delta) + len(self._tombstones)
+        if pending < max(self.min_rebuild, self.rebuild_ratio * len(self._base.keys)):
+            return
+        base = self._base
+        points = {}
+        for i, key in enumerate(base.keys):
+            if key not in self._tombstones:
+                points[key] = (float(base.lats[i]), float(base.lons[i]), base.records[i])
+        points.update(self._delta)
+        self._base = self._make_base(points)
+        self._tombstones = set()
+        self._delta = {}
+        self._view = None
+
+    def _state(self):
+        """
+        Consistent read view: the base, the base positions that are
+        tombstoned (sorted array) and the delta as arrays. Rebuilt only after
+        a write, so queries do not copy the pending changes each time.
+        """
+        with self._lock:
+            if self._view is None:
+                base = self._base
+                dead = np.sort(np.fromiter((base.position[k] for k in self._tombstones), dtype=np.intp, count=len(self._tombstones)))
+                keys = list(self._delta)
+                lats = np.fromiter((self._delta[k][0] for k in keys), dtype=np.float64, count=len(keys))
+                lons = np.fromiter((self._delta[k][1] for k in keys), dtype=np.float64, count=len(keys))
+                records = [self._delta[k][2] for k in keys]
+                self._view = (base, dead, (lats, lons, np.radians(lats), np.radians(lons), records))
+            return self._view
+
+    @staticmethod
+    def _alive(idx, dead):
+        if not len(dead):
+            return np.ones(len(idx), dtype=bool)
+        return ~np.isin(idx, dead)
+
+    def radius(self, lat, lon, radius_km, limit=None):
+        """[(record, distance_km)] within `radius_km`, closest first."""
+        base, dead, (_, _, d_lat, d_lon, d_records) = self._state()
+        point = np.radians([[float(lat), float(lon)]])
+        hits = []
+        if base.tree is not None:
+            idx, dist = base.tree.query_radius(point, r=radius_km / EARTH_RADIUS_KM, return_distance=True, sort_results=True)
+            idx, dist = idx[0], dist[0]
+            keep = self._alive(idx, dead)
+            hits.extend(zip((dist[keep] * EARTH_RADIUS_KM).tolist(), (base.records[i] for i in idx[keep])))
+        if d_records:
+            dist = _haversine_km(point[0, 0], point[0, 1], d_lat, d_lon)
+            hits.extend((float(d), r) for d, r in zip(dist, d_records) if d <= radius_km)
+            hits.sort(key=lambda h: h[0])
+        if limit is not None:
+            hits = hits[:limit]
+        return [(record, d) for d, record in hits]
+
+    def nearest(self, lat, lon, k):
+        """[(record, distance_km)] for the `k` closest points, closest first."""
+        base, dead, (_, _, d_lat, d_lon, d_records) = self._state()
+        point = np.radians([[float(lat), float(lon)]])
+        hits = []
+        if base.tree is not None and k > 0:
+            # Ask for enough extra neighbours to cover any tombstoned ones.
+            want = min(k + len(dead), len(base.keys))
+            dist, idx = base.tree.query(point, k=want, sort_results=True)
+            idx, dist = idx[0], dist[0]
+            keep = self._alive(idx, dead)
+            hits.extend(zip((dist[keep] * EARTH_RADIUS_KM).tolist(), (base.records[i] for i in idx[keep])))
+        if d_records:
+            dist = _haversine_km(point[0, 0], point[0, 1], d_lat, d_lon)
+            hits.extend((float(d), r) for d, r in zip(dist, d_records))
+            hits.sort(key=lambda h: h[0])
+        return [(record, d) for d, record in hits[:k]]
+
+    def bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """Records inside a lat/lon box. `min_lon > max_lon` wraps across the antimeridian."""
+        base, dead, (d_lats, d_lons, _, _, d_records) = self._state()
+
+        def lon_ok(lons):
+            if min_lon <= max_lon:
+                return (lons >= min_lon) & (lons <= max_lon)
+            return (lons >= min_lon) | (lons <= max_lon)
+
+        lo = np.searchsorted(base.sorted_lats, min_lat, side="left")
+        hi = np.searchsorted(base.sorted_lats, max_lat, side="right")
+        idx = base.by_lat[lo:hi]
+        idx = idx[lon_ok(base.lons[idx])]
+        idx = idx[self._alive(idx, dead)]
+        out = [base.records[i] for i in idx]
+        if d_records:
+            hit = (d_lats >= min_lat) & (d_lats <= max_lat) & lon_ok(d_lons)
+            out.extend(d_records[i] for i in np.flatnonzero(hit))
+        return out
@@ -638,26 +638,63 @@ class MuseumBookingSystem {
   }
 
   async init() {
-    await this.loadMuseums();
     await this.loadFilters();
+    await this.loadMuseums();
     this.setupEventListeners();
     this.setMinDate();
   }
 
-  async loadMuseums() {
+  // Museums matching the current search box and filters, fetched from the
+  // server (which also returns per-value counts) instead of filtering the
+  // whole catalog in the browser. Results come 100 at a time; `append`
+  // follows the previous response's cursor for the next 100.
+  async loadMuseums({ append = false } = {}) {
+    const params = new URLSearchParams({ limit: '100' });
+    if (append) {
+      if (!this.nextCursor) return;
+      params.append('cursor', this.nextCursor);
+    } else {
+      params.append('facets', '1');
+    }
+    const typeFilter = document.getElementById('typeFilter')?.value || '';
+    const cityFilter = document.getElementById('cityFilter')?.value || '';
+    const searchTerm = document.getElementById('museumSearchInput')?.value.trim() || '';
+    if (typeFilter) params.append('type', typeFilter);
+    if (cityFilter) params.append('city', cityFilter);
+    if (searchTerm) params.append('q', searchTerm);
+
+    const requestId = (this.requestId = (this.requestId || 0) + 1);
     try {
-      const response = await fetch('/api/exhibitions');
+      const response = await fetch(`/api/exhibitions?${params}`);
       if (!response.ok) throw new Error('Failed to load museums');
-      
-      this.museums = await response.json();
+
+      const payload = await response.json();
+      if (requestId !== this.requestId) return;  // a newer query is in flight
+      this.museums = append ? this.museums.concat(payload.items || []) : (payload.items || []);
       this.filteredMuseums = [...this.museums];
-      console.log(`Loaded ${this.museums.length} museums`);
+      this.totalMatches = payload.total || this.museums.length;
+      this.nextCursor = payload.next_cursor || null;
+      this.updateFacetCounts(payload.facets);
     } catch (error) {
       console.log('Error loading museums:', error);
       this.showError('Failed to load museums. Please try again later.');
     }
   }
 
+  updateFacetCounts(facets) {
+    if (!facets) return;
+    [['typeFilter', facets.Type], ['cityFilter', facets.City]].forEach(([id, counts]) => {
+      const select = document.getElementById(id);
+      if (!select || !counts) return;
+      Array.from(select.options).forEach(option => {
+        if (!option.value) return;
+        const n = counts[option.value] || 0;
+        option.textContent = `${option.value} (${n})`;
+        option.disabled = n === 0 && option.value !== select.value;
+      });
+    });
+  }
+
   async loadFilters() {
     try {
       const response = await fetch('/api/museum-filters');
@@ -764,51 +801,17 @@ class MuseumBookingSystem {
   }
 
   handleSearch(query) {
-    const searchTerm = query.toLowerCase().trim();
-    
-    if (searchTerm === '') {
-      this.filteredMuseums = [...this.museums];
-    } else {
-      this.filteredMuseums = this.museums.filter(museum =>
-        museum.Name.toLowerCase().includes(searchTerm) ||
-        museum.City.toLowerCase().includes(searchTerm) ||
-        museum.State.toLowerCase().includes(searchTerm) ||
-        museum.Type.toLowerCase().includes(searchTerm)
-      );
-    }
+    clearTimeout(this.searchTimer);
+    this.searchTimer = setTimeout(() => this.applyFilters(), 200);
+  }
 
-    this.applyFilters();
+  async applyFilters() {
+    await this.loadMuseums();
     this.displaySearchResults();
   }
 
-  applyFilters() {
-    const typeFilter = document.getElementById('typeFilter')?.value || '';
-    const cityFilter = document.getElementById('cityFilter')?.value || '';
-    const searchTerm = document.getElementById('museumSearchInput')?.value.toLowerCase().trim() || '';
-
-    let filtered = this.museums;
-
-    // Apply search filter
-    if (searchTerm) {
-      filtered = filtered.filter(museum =>
-        museum.Name.toLowerCase().includes(searchTerm) ||
-        museum.City.toLowerCase().includes(searchTerm) ||
-        museum.State.toLowerCase().includes(searchTerm) ||
-        museum.Type.toLowerCase().includes(searchTerm)
-      );
-    }
-
-    // Apply type filter
-    if (typeFilter) {
-      filtered = filtered.filter(museum => museum.Type === typeFilter);
-    }
-
-    // Apply city filter
-    if (cityFilter) {
-      filtered = filtered.filter(museum => museum.City === cityFilter);
-    }
-
-    this.filteredMuseums = filtered;
+  async loadMoreMuseums() {
+    await this.loadMuseums({ append: true });
     this.displaySearchResults();
   }
 
@@ -824,7 +827,8 @@ class MuseumBookingSystem {
       return;
     }
 
-    resultsCount.textContent = `${this.filteredMuseums.length} result${this.filteredMuseums.length !== 1 ? 's' : ''}`;
+    const total = this.totalMatches || this.filteredMuseums.length;
+    resultsCount.textContent = `${total} result${total !== 1 ? 's' : ''}`;
     
     resultsList.innerHTML = this.filteredMuseums.map(museum => `
       <div class="museum-result-item" data-museum-id="${museum.Name}" 
@@ -842,7 +846,13 @@ class MuseumBookingSystem {
           <i class="fas fa-check"></i> Select
         </button>
       </div>
-    `).join('');
+    `).join('') + (this.nextCursor ? `
+      <div class="results-footer">
+        <button type="button" class="load-more-btn" onclick="bookingSystem.loadMoreMuseums()">
+          <i class="fas fa-chevron-down"></i> Load more (showing ${this.filteredMuseums.length} of ${total})
+        </button>
+      </div>
+    ` : '');
 
     resultsContainer.style.display = 'block';
   }
@@ -884,8 +894,7 @@ class MuseumBookingSystem {
     document.getElementById('typeFilter').value = '';
     document.getElementById('cityFilter').value = '';
     
-    this.filteredMuseums = [...this.museums];
-    this.displaySearchResults();
+    this.loadMuseums().then(() => this.displaySearchResults());
     
     // Clear selected museum
     this.selectedMuseum = null;
@@ -0,0 +1,206 @@
+"""
+Shared fixtures: an in-memory stand-in for the slice of the pymongo
+collection API the app uses, so the Mongo code paths run without a server.
+
+    python -m pytest -q
+"""
+import copy
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+from bson.objectid import ObjectId
+from pymongo import InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, ServerSelectionTimeoutError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_COMPARE = {
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+}
+
+
+def _matches(doc, filter):
+    for key, cond in filter.items():
+        if key == "$or":
+            if not any(_matches(doc, f) for f in cond):
+                return False
+            continue
+        value = doc.get(key)
+        if isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+            for op, arg in cond.items():
+                if op in _COMPARE:
+                    # Like Mongo, a range never matches null or another type.
+                    if value is None or arg is None or type(value) is not type(arg) or not _COMPARE[op](value, arg):
+                        return False
+                elif op == "$ne" and value == arg:
+                    return False
+                elif op == "$in" and value not in arg:
+                    return False
+                elif op == "$nin" and value in arg:
+                    return False
+        elif value != cond:
+            return False
+    return True
+
+
+def _sort_key(value):
+    return (0, "") if value is None else (1, value)
+
+
+def _apply_update(doc, update, inserting):
+    for op, fields in update.items():
+        for field, value in fields.items():
+            if op == "$set" or (op == "$setOnInsert" and inserting):
+                doc[field] = copy.deepcopy(value)
+            elif op == "$inc":
+                doc[field] = doc.get(field, 0) + value
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def sort(self, key, direction=None):
+        keys = key if isinstance(key, list) else [(key, direction or 1)]
+        for field, direction in reversed(keys):
+            self._docs.sort(key=lambda d: _sort_key(d.get(field)), reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        if n:
+            self._docs = self._docs[:n]
+        return self
+
+    def __iter__(self):
+        return iter(self._docs)
+
+
+class FakeCollection:
+    """Documents in insertion order; `unique` lists fields with a unique index besides _id."""
+
+    def __init__(self, unique=()):
+        self.docs = []
+        self.unique = unique
+        self.down = False
+
+    def _check_up(self):
+        if self.down:
+            raise ServerSelectionTimeoutError("fake mongo is down")
+
+    def _conflict(self, doc, ignore=None):
+        for other in self.docs:
+            if other is ignore:
+                continue
+            if other["_id"] == doc["_id"] or any(
+                    doc.get(f) is not None and other.get(f) == doc.get(f) for f in self.unique):
+                return True
+        return False
+
+    def _insert(self, doc):
+        doc = copy.deepcopy(doc)
+        doc.setdefault("_id", ObjectId())
+        if self._conflict(doc):
+            raise DuplicateKeyError("E11000 duplicate key error")
+        self.docs.append(doc)
+        return doc
+
+    def insert_one(self, doc):
+        self._check_up()
+        return SimpleNamespace(inserted_id=self._insert(doc)["_id"])
+
+    def update_one(self, filter, update, upsert=False):
+        self._check_up()
+        for doc in self.docs:
+            if _matches(doc, filter):
+                before = copy.deepcopy(doc)
+                _apply_update(doc, update, inserting=False)
+                return SimpleNamespace(matched_count=1, modified_count=int(doc != before), upserted_id=None)
+        if upsert:
+            doc = {k: v for k, v in filter.items() if not k.startswith("$") and not isinstance(v, dict)}
+            _apply_update(doc, update, inserting=True)
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=self._insert(doc)["_id"])
+        return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+
+    def update_many(self, filter, update):
+        self._check_up()
+        n = 0
+        for doc in self.docs:
+            if _matches(doc, filter):
+                _apply_update(doc, update, inserting=False)
+                n += 1
+        return SimpleNamespace(matched_count=n, modified_count=n)
+
+    def replace_one(self, filter, replacement, upsert=False):
+        self._check_up()
+        for i, doc in enumerate(self.docs):
+            if _matches(doc, filter):
+                new = {**copy.deepcopy(replacement), "_id": doc["_id"]}
+                if self._conflict(new, ignore=doc):
+                    raise DuplicateKeyError("E11000 duplicate key error")
+                self.docs[i] = new
+                return SimpleNamespace(matched_count=1)
+        if upsert:
+            self._insert({**({"_id": filter["_id"]} if "_id" in filter else {}), **replacement})
+        return SimpleNamespace(matched_count=0)
+
+    def bulk_write(self, requests, ordered=True):
+        self._check_up()
+        for i, request in enumerate(requests):
+            try:
+                if isinstance(request, ReplaceOne):
+                    self.replace_one(request._filter, request._doc, upsert=request._upsert)
+                elif isinstance(request, UpdateOne):
+                    self.update_one(request._filter, request._doc, upsert=request._upsert)
+                elif isinstance(request, UpdateMany):
+                    self.update_many(request._filter, request._doc)
+                elif isinstance(request, InsertOne):
+                    self._insert(request._doc)
+            except DuplicateKeyError as e:
+                raise BulkWriteError({"writeErrors": [{"index": i, "code": 11000, "errmsg": str(e)}]})
+        return SimpleNamespace(acknowledged=True)
+
+    def delete_many(self, filter):
+        self._check_up()
+        self.docs = [d for d in self.docs if not _matches(d, filter)]
+
+    def find(self, filter=None, projection=None):
+        self._check_up()
+        docs = [copy.deepcopy(d) for d in self.docs if _matches(d, filter or {})]
+        if projection:
+            keep = {k for k, v in projection.items() if v}
+            if keep and projection.get("_id", 1):
+                keep.add("_id")
+            docs = [{k: v for k, v in d.items() if (k in keep if keep else projection.get(k, 1))} for d in docs]
+        return FakeCursor(docs)
+
+    def find_one(self, filter=None, projection=None):
+        return next(iter(self.find(filter, projection)), None)
+
+    def estimated_document_count(self):
+        self._check_up()
+        return len(self.docs)
+
+
+class FakeDB:
+    def __init__(self, unique=None):
+        self.collections = {}
+        self.unique = unique or {}
+        self.down = False
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(self.unique.get(name, ()))
+        self.collections[name].down = self.down
+        return self.collections[name]
+
+    __getattr__ = __getitem__
+
+
+@pytest.fixture
+def fake_db():
+    return FakeDB(unique={"bookings": ("TicketID",)})
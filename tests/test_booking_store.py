@@ -0,0 +1,65 @@
+import threading
+
+from booking_store import BookingStore
+
+
+def booking(ticket_id, **fields):
+    return {"TicketID": ticket_id, "Museum": "National Museum", "Date": "2026-11-02", "Time": "10:00",
+            "People": "2", "Attended": "No", **fields}
+
+
+def test_transition_reports_only_real_changes(tmp_path):
+    store = BookingStore(str(tmp_path / "bookingDB"))
+    store.add(booking("T1"))
+
+    old, new = store.transition("T1", {"Attended": "Cancelled"})
+    assert old["Attended"] == "No"
+    assert new["Attended"] == "Cancelled"
+
+    old, new = store.transition("T1", {"Attended": "Cancelled"})
+    assert old["Attended"] == "Cancelled"
+    assert new is None
+
+
+def test_transition_unknown_ticket(tmp_path):
+    store = BookingStore(str(tmp_path / "bookingDB"))
+    assert store.transition("missing", {"Attended": "Yes"}) == (None, None)
+
+
+def test_transition_respects_expect(tmp_path):
+    store = BookingStore(str(tmp_path / "bookingDB"))
+    store.add(booking("T1", Attended="Cancelled"))
+
+    old, new = store.transition("T1", {"Attended": "Yes"}, expect=lambda r: r["Attended"] == "No")
+    assert old["Attended"] == "Cancelled"
+    assert new is None
+    assert store.get("T1")["Attended"] == "Cancelled"
+
+
+def test_concurrent_transitions_change_once(tmp_path):
+    store = BookingStore(str(tmp_path / "bookingDB"), fsync=False)
+    store.add(booking("T1"))
+    results = []
+    start = threading.Barrier(8)
+
+    def cancel():
+        start.wait()
+        results.append(store.transition("T1", {"Attended": "Cancelled"})[1])
+
+    threads = [threading.Thread(target=cancel) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(new is not None for new in results) == 1
+
+
+def test_transition_sees_other_workers_changes(tmp_path):
+    path = str(tmp_path / "bookingDB")
+    first, second = BookingStore(path), BookingStore(path)
+    first.add(booking("T1"))
+
+    assert first.transition("T1", {"Attended": "Cancelled"})[1] is not None
+    old, new = second.transition("T1", {"Attended": "Cancelled"})
+    assert old["Attended"] == "Cancelled"
+    assert new is None
@@ -0,0 +1,108 @@
+import pytest
+from pymongo.errors import ServerSelectionTimeoutError
+
+from booking_store import BookingStore
+from capacity import SlotCapacity, slot_key
+
+DATE, TIME = "2026-11-02", "10:00"
+
+
+def booking(ticket_id, people, status="No"):
+    return {"TicketID": ticket_id, "Museum": "National Museum", "Date": DATE, "Time": TIME,
+            "People": str(people), "Attended": status}
+
+
+@pytest.fixture
+def capacity(tmp_path, fake_db):
+    def get_db():
+        if fake_db.down:
+            raise ServerSelectionTimeoutError("fake mongo is down")
+        return fake_db
+    slots = SlotCapacity(get_db, capacity=50)
+    slots.attach(BookingStore(str(tmp_path / "bookingDB")))
+    return slots
+
+
+def book(capacity, ticket_id, people, status="No"):
+    if not capacity.reserve("National Museum", DATE, TIME, people, ticket_id):
+        return False
+    capacity._store.add(booking(ticket_id, people, status))
+    return True
+
+
+def remaining(capacity):
+    return next(s["remaining"] for s in capacity.availability("National Museum", DATE, DATE) if s["time"] == TIME)
+
+
+def mongo_booked(fake_db):
+    doc = fake_db.slots.find_one({"_id": slot_key("National Museum", DATE, TIME)})
+    return doc["booked"] if doc else 0
+
+
+def test_reserve_while_mongo_down_is_counted_when_it_comes_back(capacity, fake_db):
+    fake_db.down = True
+    assert book(capacity, "T1", 30)
+    assert not book(capacity, "T2", 30)
+    assert remaining(capacity) == 20
+
+    fake_db.down = False
+    capacity.reconcile(fake_db)
+    assert mongo_booked(fake_db) == 30
+    assert not book(capacity, "T2", 30)
+    assert book(capacity, "T3", 20)
+    assert remaining(capacity) == 0
+
+
+def test_pending_reservation_holds_seats_in_memory(capacity, fake_db):
+    fake_db.down = True
+    assert capacity.reserve("National Museum", DATE, TIME, 30, "T1")
+    assert not capacity.reserve("National Museum", DATE, TIME, 30, "T2")
+
+
+def test_release_while_down_then_reconcile(capacity, fake_db):
+    assert book(capacity, "T1", 30)
+    assert mongo_booked(fake_db) == 30
+
+    fake_db.down = True
+    capacity.set_status("T1", "Cancelled")
+    assert remaining(capacity) == 50
+
+    # The release never reached Mongo; the reconnect recount fixes it.
+    fake_db.down = False
+    assert mongo_booked(fake_db) == 30
+    capacity.reconcile(fake_db)
+    assert mongo_booked(fake_db) == 0
+    assert book(capacity, "T2", 50)
+
+
+def test_cancel_releases_seats_once(capacity, fake_db):
+    assert book(capacity, "T1", 30)
+
+    old, new = capacity.set_status("T1", "Cancelled")
+    assert new["Attended"] == "Cancelled"
+    assert mongo_booked(fake_db) == 0
+
+    old, new = capacity.set_status("T1", "Cancelled")
+    assert new is None
+    assert mongo_booked(fake_db) == 0
+
+    capacity.set_status("T1", "No")
+    assert mongo_booked(fake_db) == 30
+
+
+def test_attend_skips_cancelled_and_waitlisted(capacity, fake_db):
+    assert book(capacity, "T1", 10)
+    assert book(capacity, "T2", 5)
+    capacity._store.add(booking("T3", 4, "Waitlisted"))
+    capacity.set_status("T2", "Cancelled")
+    assert mongo_booked(fake_db) == 10
+
+    matched, changed = capacity.attend(DATE, TIME)
+    assert matched == changed == ["T1"]
+    assert {r["TicketID"]: r["Attended"] for r in capacity._store.rows()} == {
+        "T1": "Yes", "T2": "Cancelled", "T3": "Waitlisted"}
+    assert mongo_booked(fake_db) == 10
+
+    matched, changed = capacity.attend(DATE, TIME)
+    assert matched == ["T1"]
+    assert changed == []
@@ -0,0 +1,139 @@
+import os
+
+import pytest
+from bson import json_util
+from pymongo.errors import BulkWriteError, ServerSelectionTimeoutError
+
+from outbox import Outbox
+
+
+def make_outbox(tmp_path, db, **kwargs):
+    def get_db():
+        if db.down:
+            raise ServerSelectionTimeoutError("fake mongo is down")
+        return db
+    return Outbox(str(tmp_path / "queue"), get_db, **kwargs)
+
+
+def booking(ticket_id, **fields):
+    return {"TicketID": ticket_id, "Museum": "National Museum", "Attended": "No", **fields}
+
+
+def test_failed_flush_keeps_entries_for_replay(tmp_path, fake_db):
+    outbox = make_outbox(tmp_path, fake_db)
+    outbox.insert("bookings", [booking("T1")])
+    outbox.update_one("bookings", {"TicketID": "T1"}, {"$set": {"Attended": "Yes"}})
+
+    fake_db.down = True
+    with pytest.raises(ServerSelectionTimeoutError):
+        outbox.flush()
+    assert outbox._read_offset() == 0
+    assert outbox.depth() == 2
+
+    fake_db.down = False
+    assert outbox.flush() == 2
+    assert [d["Attended"] for d in fake_db.bookings.docs] == ["Yes"]
+    assert outbox.depth() == 0
+
+
+def test_half_applied_batch_replays_idempotently(tmp_path, fake_db):
+    outbox = make_outbox(tmp_path, fake_db)
+    outbox.insert("bookings", [booking("T1"), booking("T2")])
+    outbox.update_one("bookings", {"TicketID": "T1"}, {"$set": {"Attended": "Cancelled"}})
+
+    # The batch reached Mongo but the worker died before recording the offset.
+    entries, _ = outbox._read_pending(0)
+    outbox._apply(entries)
+    assert outbox.flush() == 3
+
+    docs = fake_db.bookings.docs
+    assert sorted(d["TicketID"] for d in docs) == ["T1", "T2"]
+    assert outbox.dead_lettered_total == 0
+    assert not os.path.exists(outbox.dead_letter_path)
+
+
+def test_natural_key_insert_keeps_existing_document(tmp_path, fake_db):
+    fake_db.bookings.insert_one(booking("T1", Attended="Yes"))
+    outbox = make_outbox(tmp_path, fake_db, natural_keys={"bookings": "TicketID"})
+    outbox.insert("bookings", [booking("T1"), booking("T2")])
+
+    assert outbox.flush() == 2
+    assert {d["TicketID"]: d["Attended"] for d in fake_db.bookings.docs} == {"T1": "Yes", "T2": "No"}
+
+
+def test_duplicate_key_insert_counts_as_applied(tmp_path, fake_db):
+    fake_db.bookings.insert_one(booking("T1"))
+    outbox = make_outbox(tmp_path, fake_db)
+    outbox.insert("bookings", [booking("T1"), booking("T2")])
+
+    assert outbox.flush() == 2
+    assert sorted(d["TicketID"] for d in fake_db.bookings.docs) == ["T1", "T2"]
+    assert outbox.dead_lettered_total == 0
+
+
+def test_rejected_write_is_dead_lettered_and_skipped(tmp_path, fake_db):
+    reviews = fake_db.reviews
+    write = reviews.bulk_write
+
+    def bulk_write(requests, ordered=True):
+        for i, request in enumerate(requests):
+            if request._doc.get("rating") == "bad":
+                raise BulkWriteError({"writeErrors": [{"index": i, "code": 121, "errmsg": "Document failed validation"}]})
+            write([request], ordered=ordered)
+
+    reviews.bulk_write = bulk_write
+    flushed = []
+    outbox = make_outbox(tmp_path, fake_db, on_flush=flushed.append)
+    outbox.insert("reviews", [{"rating": 5}, {"rating": "bad"}, {"rating": 4}])
+
+    assert outbox.flush() == 3
+    assert [d["rating"] for d in reviews.docs] == [5, 4]
+    assert outbox.dead_lettered_total == 1
+    with open(outbox.dead_letter_path, "rb") as f:
+        dead = [json_util.loads(line) for line in f]
+    assert [d["entry"]["doc"]["rating"] for d in dead] == ["bad"]
+    assert "validation" in dead[0]["error"]
+    assert flushed == [{"reviews"}]
+    assert outbox.depth() == 0
+
+
+def test_write_concern_error_is_retried(tmp_path, fake_db):
+    def bulk_write(requests, ordered=True):
+        raise BulkWriteError({"writeErrors": [], "writeConcernErrors": [{"errmsg": "waiting for replication"}]})
+
+    fake_db.bookings.bulk_write = bulk_write
+    outbox = make_outbox(tmp_path, fake_db)
+    outbox.insert("bookings", [booking("T1")])
+
+    with pytest.raises(BulkWriteError):
+        outbox.flush()
+    assert outbox.depth() == 1
+    assert outbox.dead_lettered_total == 0
+
+
+def test_drained_queue_is_truncated_and_keeps_accepting_writes(tmp_path, fake_db):
+    outbox = make_outbox(tmp_path, fake_db, batch_size=2)
+    outbox.insert("bookings", [booking("T1"), booking("T2"), booking("T3")])
+
+    assert outbox.flush() == 2
+    assert os.path.getsize(outbox.path) > 0
+    assert outbox.flush() == 1
+    assert os.path.getsize(outbox.path) == 0
+    assert outbox._read_offset() == 0
+
+    outbox.insert("bookings", [booking("T4")])
+    assert outbox.depth() == 1
+    assert outbox.flush() == 1
+    assert sorted(d["TicketID"] for d in fake_db.bookings.docs) == ["T1", "T2", "T3", "T4"]
+
+
+def test_crash_between_offset_reset_and_truncate_only_replays(tmp_path, fake_db):
+    outbox = make_outbox(tmp_path, fake_db)
+    outbox.insert("bookings", [booking("T1")])
+    outbox.flush()
+
+    # Offset reset to 0 but the file was never truncated.
+    outbox.insert("bookings", [booking("T1")])
+    outbox._write_offset(0)
+    assert outbox.flush() == 1
+    assert [d["TicketID"] for d in fake_db.bookings.docs] == ["T1"]
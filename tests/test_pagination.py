@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson.objectid import ObjectId
+
+from pagination import InvalidCursor, decode_cursor, encode_cursor, mongo_keyset_page, sequence_page
+
+
+def test_cursor_round_trip():
+    payload = {"s": "history", "k": ["T9", 3]}
+    assert decode_cursor(encode_cursor(payload), "history") == payload
+
+
+@pytest.mark.parametrize("token", ["", "not-base64!", encode_cursor([1, 2]), encode_cursor({"s": "reviews"})])
+def test_bad_or_foreign_cursor_is_rejected(token):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, "history")
+
+
+def walk_sequence(items, limit):
+    pages, cursor = [], None
+    while True:
+        page, cursor = sequence_page(items, cursor, limit, "seq", key=lambda x: x)
+        pages.append(page)
+        if cursor is None:
+            return pages
+
+
+def test_sequence_page_walks_every_item_once():
+    items = list(range(25))
+    pages = walk_sequence(items, 10)
+    assert [len(p) for p in pages] == [10, 10, 5]
+    assert sum(pages, []) == items
+
+
+@pytest.mark.parametrize("change", [
+    lambda items: items.insert(0, -1),
+    lambda items: items.remove(2),
+    lambda items: items.remove(9),
+])
+def test_sequence_page_resumes_after_last_item(change):
+    items = list(range(25))
+    _, cursor = sequence_page(items, None, 10, "seq", key=lambda x: x)
+    change(items)
+    page, _ = sequence_page(items, cursor, 10, "seq", key=lambda x: x)
+    assert page[0] == 10
+
+
+def keyset_collection(fake_db):
+    base = datetime(2026, 1, 1)
+    col = fake_db.reviews
+    for i in range(12):
+        # Ties on created_at, and a few documents without one.
+        created = None if i % 5 == 0 else base + timedelta(hours=i // 3)
+        col.insert_one({"_id": ObjectId(), "n": i, **({"created_at": created} if created else {})})
+    return col
+
+
+def walk_keyset(col, limit, descending):
+    seen, cursor = [], None
+    while True:
+        docs, cursor = mongo_keyset_page(col, {}, {"n": 1, "created_at": 1}, "created_at", cursor, limit,
+                                         "reviews", descending=descending)
+        seen.extend(docs)
+        if cursor is None:
+            return seen
+
+
+@pytest.mark.parametrize("descending", [True, False])
+@pytest.mark.parametrize("limit", [1, 3, 5, 12])
+def test_keyset_pages_cover_ties_and_nulls_in_order(fake_db, descending, limit):
+    col = keyset_collection(fake_db)
+    expected = sorted(col.docs, key=lambda d: (d.get("created_at") is not None, d.get("created_at") or datetime.min, d["_id"]),
+                      reverse=descending)
+    seen = walk_keyset(col, limit, descending)
+    assert [d["n"] for d in seen] == [d["n"] for d in expected]
+
+
+def test_keyset_cursor_from_another_listing_is_rejected(fake_db):
+    col = keyset_collection(fake_db)
+    _, cursor = mongo_keyset_page(col, {}, None, "created_at", None, 3, "reviews")
+    with pytest.raises(InvalidCursor):
+        mongo_keyset_page(col, {}, None, "created_at", cursor, 3, "museums")